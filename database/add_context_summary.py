@@ -0,0 +1,54 @@
+"""
+数据库迁移脚本：为conversation表添加context_summary和summary_message_id字段
+目的：保存长对话的滚动摘要，聊天请求只发送最近若干轮原文加摘要
+"""
+
+import os
+import sys
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.models import db
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    'context_summary': 'TEXT',
+    'summary_message_id': 'INTEGER'
+}
+
+
+def migrate_context_summary():
+    """为conversation表添加滚动摘要字段，已存在的字段会被跳过"""
+    try:
+        inspector = db.inspect(db.engine)
+        if not inspector.has_table('conversation'):
+            logger.info("⚠️ conversation表不存在，跳过迁移（db.create_all()会创建完整的表）")
+            return
+
+        existing = {c['name'] for c in inspector.get_columns('conversation')}
+        with db.engine.connect() as connection:
+            for name, column_type in COLUMNS.items():
+                if name in existing:
+                    logger.info(f"⚠️ conversation.{name}字段已存在，跳过")
+                    continue
+                logger.info(f"添加conversation.{name}字段...")
+                connection.execute(text(f"ALTER TABLE conversation ADD COLUMN {name} {column_type}"))
+            connection.commit()
+        logger.info("✅ conversation表滚动摘要字段迁移完成")
+
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    # 需要Flask应用上下文
+    from main import app
+    with app.app_context():
+        migrate_context_summary()
@@ -0,0 +1,125 @@
+"""
+数据库迁移脚本：为conversation表添加冗余统计字段（message_count、last_message_preview、last_message_at）
+目的：会话列表直接读取会话表，不再为每个会话查询message表
+
+用法:
+    python database/add_conversation_stats.py            添加字段并回填已有会话
+    python database/add_conversation_stats.py --check    检查冗余统计与message表是否一致
+    python database/add_conversation_stats.py --check --fix  重新计算不一致的会话
+"""
+
+import argparse
+import os
+import sys
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.models import db
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    'message_count': 'INTEGER NOT NULL DEFAULT 0',
+    'last_message_preview': 'VARCHAR(60)',
+    'last_message_at': 'TIMESTAMP'
+}
+
+# 回填时每个事务处理的会话数，避免长时间锁住整张表
+BACKFILL_BATCH_SIZE = 1000
+
+
+def migrate_conversation_stats():
+    """为conversation表添加冗余统计字段，已存在的字段会被跳过"""
+    try:
+        inspector = db.inspect(db.engine)
+        if not inspector.has_table('conversation'):
+            logger.info("⚠️ conversation表不存在，跳过迁移（db.create_all()会创建完整的表）")
+            return
+
+        existing = {c['name'] for c in inspector.get_columns('conversation')}
+        with db.engine.connect() as connection:
+            for name, column_type in COLUMNS.items():
+                if name in existing:
+                    logger.info(f"⚠️ conversation.{name}字段已存在，跳过")
+                    continue
+                logger.info(f"添加conversation.{name}字段...")
+                connection.execute(text(f"ALTER TABLE conversation ADD COLUMN {name} {column_type}"))
+            connection.commit()
+        logger.info("✅ conversation表冗余统计字段迁移完成")
+
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {str(e)}")
+        raise
+
+
+def backfill_conversation_stats():
+    """按message表重新计算所有会话的冗余统计，可重复执行"""
+    from src.models.conversation import Conversation
+    from src.services.conversation_service import ConversationService
+
+    last_id, total = 0, 0
+    while True:
+        ids = [row[0] for row in db.session.query(Conversation.id)
+               .filter(Conversation.id > last_id)
+               .order_by(Conversation.id).limit(BACKFILL_BATCH_SIZE).all()]
+        if not ids:
+            break
+        ConversationService.refresh_conversation_stats(ids)
+        db.session.commit()
+        total += len(ids)
+        last_id = ids[-1]
+        logger.info(f"已回填 {total} 个会话")
+    logger.info(f"✅ 回填完成，共 {total} 个会话")
+
+
+def check_conversation_stats(fix: bool = False) -> int:
+    """检查冗余统计与message表是否一致，返回不一致的会话数；fix为True时重新计算这些会话"""
+    from src.services.conversation_service import ConversationService
+
+    found, fixed = 0, set()
+    while True:
+        mismatches = ConversationService.find_inconsistent_stats(limit=BACKFILL_BATCH_SIZE)
+        if fix:
+            # 重新计算后仍不一致的会话不再重复处理
+            mismatches = [item for item in mismatches if item['conversation_id'] not in fixed]
+        if not mismatches:
+            break
+        for item in mismatches:
+            logger.warning(f"会话 {item['conversation_id']} 不一致（已保存, 实际）: "
+                           f"message_count={item['message_count']}, "
+                           f"last_message_preview={item['last_message_preview']}, "
+                           f"last_message_at={item['last_message_at']}")
+        found += len(mismatches)
+        if not fix:
+            break
+        ids = [item['conversation_id'] for item in mismatches]
+        ConversationService.refresh_conversation_stats(ids)
+        db.session.commit()
+        fixed.update(ids)
+
+    if found == 0:
+        logger.info("✅ 所有会话的冗余统计与message表一致")
+    elif fix:
+        logger.info(f"✅ 已修复 {found} 个会话")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="会话冗余统计字段的迁移、回填和一致性检查")
+    parser.add_argument('--check', action='store_true', help='只检查一致性，不执行迁移和回填')
+    parser.add_argument('--fix', action='store_true', help='与--check一起使用，重新计算不一致的会话')
+    args = parser.parse_args()
+
+    # 需要Flask应用上下文
+    from main import app
+    with app.app_context():
+        if args.check:
+            inconsistent = check_conversation_stats(fix=args.fix)
+            sys.exit(1 if inconsistent and not args.fix else 0)
+        migrate_conversation_stats()
+        backfill_conversation_stats()
@@ -0,0 +1,63 @@
+"""
+数据库迁移脚本：把message.conversation_id外键改为ON DELETE CASCADE（可重复执行）
+目的：删除会话时由数据库级联删除消息，应用不再逐条加载和删除消息
+SQLite无法修改已有外键且默认不启用外键约束，应用在SQLite上会先用一条DELETE删除消息，这里跳过
+"""
+
+import os
+import sys
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.models import db
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONSTRAINT_NAME = 'message_conversation_id_fkey'
+
+
+def migrate_message_cascade():
+    """把message表指向conversation的外键改为ON DELETE CASCADE，已是级联时跳过"""
+    try:
+        if db.engine.dialect.name != 'postgresql':
+            logger.info(f"⚠️ {db.engine.dialect.name}不需要此迁移，删除会话时会显式删除消息，跳过")
+            return
+
+        inspector = db.inspect(db.engine)
+        if not inspector.has_table('message'):
+            logger.info("⚠️ message表不存在，跳过迁移（db.create_all()会创建完整的表）")
+            return
+
+        foreign_keys = [fk for fk in inspector.get_foreign_keys('message')
+                        if fk['referred_table'] == 'conversation']
+        if any((fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE' for fk in foreign_keys):
+            logger.info("⚠️ message外键已是ON DELETE CASCADE，跳过迁移")
+            return
+
+        with db.engine.connect() as connection:
+            # 删除旧约束和添加新约束在同一事务中完成
+            for fk in foreign_keys:
+                logger.info(f"删除外键约束 {fk['name']}...")
+                connection.execute(text(f'ALTER TABLE message DROP CONSTRAINT "{fk["name"]}"'))
+            logger.info(f"添加外键约束 {CONSTRAINT_NAME}（ON DELETE CASCADE）...")
+            connection.execute(text(
+                f"ALTER TABLE message ADD CONSTRAINT {CONSTRAINT_NAME} "
+                f"FOREIGN KEY (conversation_id) REFERENCES conversation (id) ON DELETE CASCADE"))
+            connection.commit()
+        logger.info("✅ message外键级联删除迁移完成")
+
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    # 需要Flask应用上下文
+    from main import app
+    with app.app_context():
+        migrate_message_cascade()
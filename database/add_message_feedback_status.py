@@ -0,0 +1,49 @@
+"""
+数据库迁移脚本：为message表添加feedback_status字段
+目的：支持延迟反馈模式，记录纠错和优化结果是否已在后台生成
+"""
+
+import os
+import sys
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.models import db
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_message_feedback_status():
+    """为message表添加feedback_status字段，字段已存在时跳过"""
+    try:
+        inspector = db.inspect(db.engine)
+        if not inspector.has_table('message'):
+            logger.info("⚠️ message表不存在，跳过迁移（db.create_all()会创建完整的表）")
+            return
+
+        columns = {c['name'] for c in inspector.get_columns('message')}
+        if 'feedback_status' in columns:
+            logger.info("⚠️ message.feedback_status字段已存在，跳过迁移")
+            return
+
+        with db.engine.connect() as connection:
+            logger.info("添加message.feedback_status字段...")
+            connection.execute(text("ALTER TABLE message ADD COLUMN feedback_status VARCHAR(20)"))
+            connection.commit()
+        logger.info("✅ message表feedback_status字段迁移完成")
+
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    # 需要Flask应用上下文
+    from main import app
+    with app.app_context():
+        migrate_message_feedback_status()
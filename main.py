@@ -21,6 +21,7 @@ from src.api.chat import chat_bp
 from src.api.exercise import exercise_bp
 from src.api.models import models_bp
 from src.api.word_query import word_query_bp
+from src.api.diagnostics import diagnostics_bp
 import logging
 
 # 根据环境设置日志级别
@@ -55,7 +56,8 @@ else:
 # 启用CORS支持
 CORS(app, 
      origins=['*'] if not IS_PRODUCTION else ['https://*.vercel.app', 'https://your-domain.com'],
-     allow_headers=['Content-Type', 'Authorization'],
+     allow_headers=['Content-Type', 'Authorization', 'Idempotency-Key'],
+     expose_headers=['Idempotent-Replayed'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 
 app.register_blueprint(user_bp, url_prefix='/api')
@@ -64,6 +66,7 @@ app.register_blueprint(chat_bp, url_prefix='/api')
 app.register_blueprint(exercise_bp, url_prefix='/api')
 app.register_blueprint(models_bp, url_prefix='/api')
 app.register_blueprint(word_query_bp, url_prefix='/api')
+app.register_blueprint(diagnostics_bp, url_prefix='/api')
 
 # 应用数据库配置
 from src.config.database_config import DatabaseConfig
@@ -1,17 +1,81 @@
-from flask import Blueprint, request, jsonify
+import json
+import os
+import queue
+import time
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from src.utils.decorators import auth_required
 from src.utils.auth import get_current_user
 from src.services.chat_service import ChatService
+from src.services.batch_chat_service import BatchChatService, CHAT_BATCH_MAX_ITEMS
 from src.services.conversation_service import ConversationService
 from src.config.api_config import ApiConfig, ApiConfigFactory
+from src.utils.async_runtime import run_coroutine
+from src.utils.event_bus import UserEventBus
+from src.utils.idempotency import idempotent
+from src.utils.sse import format_sse
 import logging
 
 logger = logging.getLogger(__name__)
 chat_bp = Blueprint("chat_api", __name__)
 
+# 启用后 /chat 的LLM调用在进程共享的事件循环上并发执行
+CHAT_ASYNC_PIPELINE = os.environ.get('CHAT_ASYNC_PIPELINE', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+# /chat 单次请求的总时间预算（秒），0表示不限制
+CHAT_DEADLINE_SECONDS = float(os.environ.get('CHAT_DEADLINE_SECONDS', 45))
+
+# 纠错和优化的返回方式：inline随回复一起返回，deferred后台生成后推送（请求体中的feedback_mode可覆盖）
+CHAT_FEEDBACK_MODE = os.environ.get('CHAT_FEEDBACK_MODE', 'inline').lower()
+
+# 反馈事件流的心跳间隔（秒），防止代理关闭空闲连接
+FEEDBACK_STREAM_HEARTBEAT_SECONDS = float(os.environ.get('FEEDBACK_STREAM_HEARTBEAT_SECONDS', 15))
+
+# 反馈事件流查询数据库的间隔（秒），用于接收worker进程或其他Web进程写入的结果
+FEEDBACK_STREAM_POLL_SECONDS = float(os.environ.get('FEEDBACK_STREAM_POLL_SECONDS', 3))
+
+# 会话列表分页时每页的最大数量
+CONVERSATION_PAGE_MAX = 100
+
+# 会话消息分页时每页的最大数量
+MESSAGE_PAGE_MAX = 200
+
+# 批量删除会话时单次请求的最大数量
+BULK_DELETE_MAX = 100
+
+
+def _resolve_api_config(config):
+    """根据请求中的用户配置创建API配置，不完整时回退到环境变量配置"""
+    api_key = config.get("apiKey")
+    api_base = config.get("apiBase")
+    model = config.get("model")
+
+    if api_key and api_base and model:
+        # 用户提供了完整配置
+        return ApiConfig(api_base=api_base, api_key=api_key, model=model)
+
+    # 用户配置不完整，尝试使用环境变量
+    env_config = ApiConfigFactory.get_env_config_safe()
+    if env_config:
+        logger.info("使用环境变量配置")
+    return env_config
+
+
+def _sse_response(events):
+    """把SSE事件生成器包装为流式响应"""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 
 @chat_bp.route("/chat", methods=["POST"])
 @auth_required
+@idempotent("chat")
 def chat():
     """聊天API端点"""
     data = request.get_json()
@@ -24,37 +88,33 @@ def chat():
     if not user_message or not user_message.strip():
         return jsonify({"success": False, "error": "Message content is required."}), 400
 
-    api_key = config.get("apiKey")
-    api_base = config.get("apiBase")
-    model = config.get("model")
     language_preference = config.get("languagePreference")
-
-    # 尝试从用户配置创建API配置
-    api_config = None
-    if api_key and api_base and model:
-        # 用户提供了完整配置
-        api_config = ApiConfig(api_base=api_base, api_key=api_key, model=model)
-    else:
-        # 用户配置不完整，尝试使用环境变量
-        env_config = ApiConfigFactory.get_env_config_safe()
-        if env_config:
-            api_config = env_config
-            logger.info("使用环境变量配置")
-        else:
-            return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
+    api_config = _resolve_api_config(config)
+    if not api_config:
+        return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
 
     current_user = get_current_user()
 
     try:
         chat_service = ChatService(api_config)
-        result = chat_service.process_chat_message(
+        chat_kwargs = dict(
             user_id=current_user.id,
             user_message=user_message,
             conversation_id=conversation_id,
             language_preference=language_preference,
             mode=mode,
-            mode_config=mode_config
+            mode_config=mode_config,
+            deadline_seconds=CHAT_DEADLINE_SECONDS
         )
+        feedback_mode = (data.get("feedback_mode") or CHAT_FEEDBACK_MODE).lower()
+        if feedback_mode == 'deferred':
+            result = chat_service.process_chat_message_deferred(
+                app=current_app._get_current_object(), **chat_kwargs)
+        elif CHAT_ASYNC_PIPELINE:
+            result = run_coroutine(chat_service.process_chat_message_async(
+                app=current_app._get_current_object(), **chat_kwargs))
+        else:
+            result = chat_service.process_chat_message(**chat_kwargs)
         return jsonify({"success": True, **result})
 
     except Exception as e:
@@ -62,15 +122,191 @@ def chat():
         return jsonify({"success": False, "error": f"Internal server error: {str(e)}"}), 500
 
 
+@chat_bp.route("/chat/stream", methods=["POST"])
+@auth_required
+def chat_stream():
+    """流式聊天API端点（Server-Sent Events）"""
+    data = request.get_json()
+    user_message = data.get("message")
+    config = data.get("config", {})
+
+    if not user_message or not user_message.strip():
+        return jsonify({"success": False, "error": "Message content is required."}), 400
+
+    language_preference = config.get("languagePreference")
+    api_config = _resolve_api_config(config)
+    if not api_config:
+        return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
+
+    current_user = get_current_user()
+    chat_service = ChatService(api_config)
+    return _sse_response(chat_service.stream_chat_message(
+        user_id=current_user.id,
+        user_message=user_message,
+        conversation_id=data.get("conversation_id"),
+        language_preference=language_preference,
+        mode=data.get("mode", "free_chat"),
+        mode_config=data.get("mode_config", {})
+    ))
+
+
+@chat_bp.route("/chat/batch", methods=["POST"])
+@auth_required
+def chat_batch():
+    """
+    批量聊天API端点，以NDJSON逐行返回每条消息的结果（按完成顺序，index对应请求中的位置），
+    最后一行为汇总；单条消息失败只在该行中报告，不影响其他消息
+    """
+    data = request.get_json() or {}
+    items = data.get("items")
+    config = data.get("config", {})
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "items must be a non-empty list."}), 400
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        return jsonify({"success": False, "error": f"At most {CHAT_BATCH_MAX_ITEMS} items per batch."}), 400
+    if not all(isinstance(item, dict) for item in items):
+        return jsonify({"success": False, "error": "Each item must be an object."}), 400
+
+    api_config = _resolve_api_config(config)
+    if not api_config:
+        return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
+
+    batch_service = BatchChatService(api_config)
+    results = batch_service.run(
+        app=current_app._get_current_object(),
+        user_id=get_current_user().id,
+        items=items,
+        language_preference=config.get("languagePreference"),
+        deadline_seconds=CHAT_DEADLINE_SECONDS
+    )
+
+    def lines():
+        succeeded = 0
+        for result in results:
+            succeeded += 1 if result["success"] else 0
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+        yield json.dumps({"done": True, "total": len(items), "succeeded": succeeded,
+                          "failed": len(items) - succeeded}) + "\n"
+
+    return Response(
+        stream_with_context(lines()),
+        mimetype="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@chat_bp.route("/feedback/stream", methods=["GET"])
+@auth_required
+def feedback_stream():
+    """
+    当前用户的反馈事件流（Server-Sent Events），推送延迟生成的纠错和优化结果。
+    本进程产生的结果通过事件总线即时推送，其他进程（worker.py等）写入的结果通过定期查询数据库补齐
+    """
+    user_id = get_current_user().id
+
+    def poll_updates(since):
+        from src.models import db
+        # 结束当前事务，确保能读到其他进程新提交的数据
+        db.session.commit()
+        return ConversationService.get_feedback_updates(user_id, since)
+
+    def events():
+        subscription = UserEventBus.subscribe(user_id)
+        since = datetime.utcnow()
+        delivered = set()
+        last_sent = time.monotonic()
+        last_polled = time.monotonic()
+        try:
+            yield format_sse('ready', {"user_id": user_id})
+            while True:
+                timeout = max(0.0, FEEDBACK_STREAM_POLL_SECONDS - (time.monotonic() - last_polled))
+                try:
+                    updates = [UserEventBus.next_event(subscription, timeout)]
+                except queue.Empty:
+                    updates = []
+
+                # 按固定间隔查询数据库，事件总线持续有事件时也不会推迟其他进程写入的结果
+                if time.monotonic() - last_polled >= FEEDBACK_STREAM_POLL_SECONDS:
+                    last_polled = time.monotonic()
+                    for update in poll_updates(since):
+                        since = max(since, update.pop('updated_at'))
+                        updates.append(('feedback', update))
+
+                for event, payload in updates:
+                    if event == 'feedback':
+                        # 同一条结果可能同时来自事件总线和数据库查询，只推送一次
+                        if payload["user_message_id"] in delivered:
+                            continue
+                        if len(delivered) > 1000:
+                            delivered.clear()
+                        delivered.add(payload["user_message_id"])
+                    yield format_sse(event, payload)
+                    last_sent = time.monotonic()
+
+                if time.monotonic() - last_sent >= FEEDBACK_STREAM_HEARTBEAT_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            UserEventBus.unsubscribe(user_id, subscription)
+
+    return _sse_response(events())
+
+
+@chat_bp.route("/messages/feedback", methods=["GET"])
+@auth_required
+def get_messages_feedback():
+    """轮询接口：按消息ID批量获取纠错状态和结果，供无法保持SSE连接的客户端使用"""
+    raw_ids = request.args.get("ids", "")
+    try:
+        message_ids = [int(value) for value in raw_ids.split(",") if value.strip()]
+    except ValueError:
+        return jsonify({"success": False, "error": "ids must be a comma-separated list of message IDs."}), 400
+    if len(message_ids) > 100:
+        return jsonify({"success": False, "error": "At most 100 message IDs per request."}), 400
+
+    current_user = get_current_user()
+    try:
+        feedback = ConversationService.get_message_feedback(message_ids, current_user.id)
+        return jsonify({"success": True, "feedback": feedback})
+    except Exception as e:
+        logger.error(f"Failed to get message feedback: {e}")
+        return jsonify({"success": False, "error": "Failed to retrieve feedback."}), 500
+
+
 @chat_bp.route("/conversations", methods=["GET"])
 @auth_required
 def get_conversations():
-    """获取用户的会话列表"""
+    """
+    获取用户的会话列表，按创建时间倒序。
+    可选分页参数：limit（每页数量，最大100）和before（上一页返回的next_before），不传limit时返回全部会话
+    """
     current_user = get_current_user()
+    limit = request.args.get("limit", type=int)
+    before = request.args.get("before", type=int)
+    if limit is not None and not 1 <= limit <= CONVERSATION_PAGE_MAX:
+        return jsonify({"success": False, "error": f"limit must be between 1 and {CONVERSATION_PAGE_MAX}."}), 400
+
     try:
+        if limit is None:
+            conversations_data = ConversationService.get_conversations_by_user_id(
+                current_user.id, before=before)
+            return jsonify({"success": True, "conversations": conversations_data})
+
+        # 多取一条用于判断是否还有下一页
         conversations_data = ConversationService.get_conversations_by_user_id(
-            current_user.id)
-        return jsonify({"success": True, "conversations": conversations_data})
+            current_user.id, limit=limit + 1, before=before)
+        has_more = len(conversations_data) > limit
+        conversations_data = conversations_data[:limit]
+        return jsonify({
+            "success": True,
+            "conversations": conversations_data,
+            "has_more": has_more,
+            "next_before": conversations_data[-1]["id"] if has_more else None
+        })
     except Exception as e:
         logger.error(f"Failed to get conversation list: {e}")
         return jsonify({"success": False, "error": "Failed to retrieve conversations."}), 500
@@ -79,18 +315,38 @@ def get_conversations():
 @chat_bp.route("/conversations/<int:conversation_id>/messages", methods=["GET"])
 @auth_required
 def get_conversation_messages(conversation_id):
-    """获取指定会话的历史消息"""
+    """
+    获取指定会话的历史消息。
+    可选分页参数：limit（每页数量，最大200）和before_id（上一页返回的next_before_id），
+    分页时先返回最新的limit条消息（页内按时间正序），不传limit时返回全部消息
+    """
     current_user = get_current_user()
+    limit = request.args.get("limit", type=int)
+    before_id = request.args.get("before_id", type=int)
+    if limit is not None and not 1 <= limit <= MESSAGE_PAGE_MAX:
+        return jsonify({"success": False, "error": f"limit must be between 1 and {MESSAGE_PAGE_MAX}."}), 400
+
     try:
-        messages, error = ConversationService.get_messages_by_conversation_id(
-            conversation_id, current_user.id)
-        if error:
-            return jsonify({"success": False, "error": error}), 404
+        page_info = {}
+        if limit is None:
+            messages, error = ConversationService.get_messages_by_conversation_id(
+                conversation_id, current_user.id)
+            if error:
+                return jsonify({"success": False, "error": error}), 404
 
-        # 获取会话信息
-        from src.models.conversation import Conversation
-        conversation = Conversation.query.filter_by(
-            id=conversation_id, user_id=current_user.id).first()
+            # 获取会话信息
+            from src.models.conversation import Conversation
+            conversation = Conversation.query.filter_by(
+                id=conversation_id, user_id=current_user.id).first()
+        else:
+            conversation, messages, has_more, error = ConversationService.get_message_page(
+                conversation_id, current_user.id, limit, before_id)
+            if error:
+                return jsonify({"success": False, "error": error}), 404
+            page_info = {
+                "has_more": has_more,
+                "next_before_id": messages[0].id if has_more else None
+            }
         
         # 格式化消息以适应前端
         messages_data = []
@@ -101,6 +357,7 @@ def get_conversation_messages(conversation_id):
                 'content': message.content,
                 'corrections': message.corrections,
                 'optimization': message.optimization,
+                'feedback_status': message.feedback_status,
                 'timestamp': message.created_at.strftime('%H:%M:%S'),
                 'created_at': message.created_at.isoformat()
             }
@@ -114,7 +371,8 @@ def get_conversation_messages(conversation_id):
         return jsonify({
             "success": True, 
             "messages": messages_data,
-            "conversation": conversation.to_dict() if conversation else None
+            "conversation": conversation.to_dict() if conversation else None,
+            **page_info
         })
     except Exception as e:
         logger.error(
@@ -138,6 +396,32 @@ def delete_conversation(conversation_id):
         return jsonify({"success": False, "error": "Failed to delete conversation."}), 500
 
 
+@chat_bp.route("/conversations/bulk-delete", methods=["POST"])
+@auth_required
+def bulk_delete_conversations():
+    """批量删除会话，只删除属于当前用户的会话；不存在或无权访问的ID在not_found中返回"""
+    data = request.get_json() or {}
+    conversation_ids = data.get("ids")
+    if not isinstance(conversation_ids, list) or not conversation_ids or \
+            not all(isinstance(value, int) and not isinstance(value, bool) for value in conversation_ids):
+        return jsonify({"success": False, "error": "ids must be a non-empty list of conversation IDs."}), 400
+    if len(conversation_ids) > BULK_DELETE_MAX:
+        return jsonify({"success": False, "error": f"At most {BULK_DELETE_MAX} conversations per request."}), 400
+
+    current_user = get_current_user()
+    deleted, error = ConversationService.delete_conversations(conversation_ids, current_user.id)
+    if error:
+        logger.error(f"Failed to bulk delete conversations: {error}")
+        return jsonify({"success": False, "error": "Failed to delete conversations."}), 500
+
+    deleted_set = set(deleted)
+    return jsonify({
+        "success": True,
+        "deleted": deleted,
+        "not_found": [value for value in dict.fromkeys(conversation_ids) if value not in deleted_set]
+    })
+
+
 @chat_bp.route("/messages/<int:message_id>", methods=["PUT"])
 @auth_required
 def edit_message(message_id):
@@ -185,6 +469,7 @@ def delete_message(message_id):
 
 @chat_bp.route("/messages/<int:message_id>/regenerate", methods=["POST"])
 @auth_required
+@idempotent("regenerate")
 def regenerate_from_message(message_id):
     """编辑消息后重新生成AI回复"""
     data = request.get_json()
@@ -194,52 +479,27 @@ def regenerate_from_message(message_id):
     if not new_content or not new_content.strip():
         return jsonify({"success": False, "error": "Message content is required."}), 400
     
-    api_key = config.get("apiKey")
-    api_base = config.get("apiBase")
-    model = config.get("model")
     language_preference = config.get("languagePreference")
-
-    # 尝试从用户配置创建API配置
-    api_config = None
-    if api_key and api_base and model:
-        # 用户提供了完整配置
-        api_config = ApiConfig(api_base=api_base, api_key=api_key, model=model)
-    else:
-        # 用户配置不完整，尝试使用环境变量
-        env_config = ApiConfigFactory.get_env_config_safe()
-        if env_config:
-            api_config = env_config
-            logger.info("使用环境变量配置")
-        else:
-            return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
+    api_config = _resolve_api_config(config)
+    if not api_config:
+        return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
 
     current_user = get_current_user()
     
     try:
-        # 首先更新消息内容
-        message, error = ConversationService.update_message(
+        # 编辑消息并删除其后的所有消息（同一事务），同时取回截断后的历史
+        turn, error = ConversationService.edit_and_truncate(
             message_id, current_user.id, new_content.strip())
-        
         if error:
             return jsonify({"success": False, "error": error}), 404
-        
-        # 获取会话ID
-        conversation_id = message.conversation_id
-        
-        # 删除该消息之后的所有消息（AI回复等）
-        ConversationService.delete_messages_after(message_id, current_user.id)
-        
+
         # 重新生成AI回复
         chat_service = ChatService(api_config)
-        result = chat_service.regenerate_from_message(
-            user_id=current_user.id,
-            conversation_id=conversation_id,
-            language_preference=language_preference
-        )
-        
+        result = chat_service.regenerate_from_message(turn, language_preference=language_preference)
+
         return jsonify({
             "success": True, 
-            "message": message.to_dict(),
+            "message": turn["message"],
             **result
         })
     except Exception as e:
@@ -247,6 +507,38 @@ def regenerate_from_message(message_id):
         return jsonify({"success": False, "error": f"Internal server error: {str(e)}"}), 500
 
 
+@chat_bp.route("/messages/<int:message_id>/regenerate/stream", methods=["POST"])
+@auth_required
+def regenerate_from_message_stream(message_id):
+    """编辑消息后以流式方式重新生成AI回复（Server-Sent Events）"""
+    data = request.get_json()
+    new_content = data.get("content")
+    config = data.get("config", {})
+
+    if not new_content or not new_content.strip():
+        return jsonify({"success": False, "error": "Message content is required."}), 400
+
+    language_preference = config.get("languagePreference")
+    api_config = _resolve_api_config(config)
+    if not api_config:
+        return jsonify({"success": False, "error": "API Key, Base URL, or Model is missing."}), 400
+
+    current_user = get_current_user()
+
+    try:
+        turn, error = ConversationService.edit_and_truncate(
+            message_id, current_user.id, new_content.strip())
+        if error:
+            return jsonify({"success": False, "error": error}), 404
+    except Exception as e:
+        logger.error(f"Failed to prepare regenerate for message {message_id}: {e}")
+        return jsonify({"success": False, "error": f"Internal server error: {str(e)}"}), 500
+
+    chat_service = ChatService(api_config)
+    return _sse_response(chat_service.stream_regenerate_from_message(
+        turn, language_preference=language_preference))
+
+
 @chat_bp.route("/config/server-defaults", methods=["GET"])
 def get_server_defaults():
     """获取服务器默认配置状态"""
@@ -0,0 +1,78 @@
+import hashlib
+from typing import Dict, Set
+
+from flask import Blueprint, jsonify
+from src.config.api_config import ApiConfigFactory
+from src.utils.decorators import auth_required
+from src.utils.http_transport import HttpTransport
+from src.utils.response_cache import get_response_cache
+from src.utils.resilience import ResilienceRegistry
+from src.utils.hedging import HedgeRegistry
+from src.utils.singleflight import SingleFlight
+from src.utils.provider_router import ProviderRouter
+from src.utils.rate_limiter import RateLimiter
+from src.utils.json_extractor import JsonExtractionStats
+from src.utils.event_bus import UserEventBus
+from src.services.job_queue import JobQueue
+import logging
+
+logger = logging.getLogger(__name__)
+diagnostics_bp = Blueprint("diagnostics_api", __name__)
+
+
+def _server_bases(router) -> Set[str]:
+    """服务器自己配置的API地址（默认配置和多提供商后端池），诊断输出中原样展示"""
+    configs = [ApiConfigFactory.get_env_config_safe()]
+    if router:
+        configs.extend(backend.config for backend in router.backends)
+    return {config.api_base.rstrip('/') for config in configs if config is not None}
+
+
+def _redact_base(api_base: str, server_bases: Set[str]) -> str:
+    """
+    熔断器和对冲统计按API地址区分，其中包括用户自带配置的地址；
+    诊断接口对所有登录用户开放，非服务器配置的地址只展示哈希
+    """
+    normalized = (api_base or '').rstrip('/')
+    if normalized in server_bases:
+        return normalized
+    return "custom:" + hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:12]
+
+
+def _redact_keys(entries: Dict[str, Dict], server_bases: Set[str]) -> Dict[str, Dict]:
+    """按API地址（或"地址|模型"）为键的统计，替换其中的地址部分"""
+    redacted = {}
+    for key, value in entries.items():
+        api_base, sep, model = key.partition('|')
+        redacted[_redact_base(api_base, server_bases) + sep + model] = value
+    return redacted
+
+
+@diagnostics_bp.route("/diagnostics/llm", methods=["GET"])
+@auth_required
+def llm_diagnostics():
+    """查看当前进程的LLM调用基础设施状态（连接池、响应缓存、熔断器与重试预算、对冲请求、相同请求合并、多提供商路由、出站限流、JSON解析失败率、反馈事件订阅数、后台任务队列）"""
+    try:
+        response_cache = get_response_cache()
+        router = ProviderRouter.default()
+        server_bases = _server_bases(router)
+        resilience = ResilienceRegistry.snapshot()
+        resilience["breakers"] = _redact_keys(resilience["breakers"], server_bases)
+        hedging = HedgeRegistry.snapshot()
+        hedging["delays"] = _redact_keys(hedging["delays"], server_bases)
+        return jsonify({
+            "success": True,
+            "transport": HttpTransport.stats(),
+            "cache": response_cache.stats() if response_cache else {"backend": None},
+            "resilience": resilience,
+            "hedging": hedging,
+            "coalescing": SingleFlight.snapshot(),
+            "providers": router.snapshot() if router else [],
+            "rate_limit": RateLimiter.snapshot(),
+            "json_extraction": JsonExtractionStats.snapshot(),
+            "feedback_stream": UserEventBus.snapshot(),
+            "jobs": JobQueue.stats()
+        })
+    except Exception as e:
+        logger.error(f"Failed to collect LLM diagnostics: {e}")
+        return jsonify({"success": False, "error": "Failed to collect diagnostics."}), 500
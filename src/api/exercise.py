@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.services.exercise_service import ExerciseService
 from src.config.api_config import ApiConfig
+from src.utils.idempotency import idempotent
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,6 +9,7 @@ exercise_bp = Blueprint("exercise_api", __name__)
 
 
 @exercise_bp.route("/generate-grammar-exercises", methods=["POST"])
+@idempotent("generate_grammar_exercises")
 def generate_grammar_exercises():
     """生成AI语法练习题"""
     data = request.get_json()
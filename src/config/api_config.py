@@ -144,6 +144,14 @@ class ApiConfigFactory:
             logger.warning("环境变量配置无效")
         return None
     
+    @staticmethod
+    def is_server_config(api_config: ApiConfig) -> bool:
+        """判断配置是否就是服务器默认配置；持久化任务队列只接收这类任务，用户自带的API密钥不落库"""
+        server_config = ApiConfigFactory.get_env_config_safe()
+        return server_config is not None and \
+            (api_config.api_base, api_config.api_key, api_config.model) == \
+            (server_config.api_base, server_config.api_key, server_config.model)
+
     @staticmethod
     def create_default() -> ApiConfig:
         """创建默认配置（仅用于开发/测试）"""
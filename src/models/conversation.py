@@ -9,8 +9,21 @@ class Conversation(db.Model):
     mode = db.Column(db.String(50), default='free_chat', nullable=False)
     mode_config = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 滚动摘要：较早的历史消息折叠后的内容，以及摘要已覆盖到的最后一条消息ID
+    context_summary = db.Column(db.Text, nullable=True)
+    summary_message_id = db.Column(db.Integer, nullable=True)
+    # 冗余统计：未删除的消息数、最后一条消息的预览和时间，随消息写入在同一事务中维护，会话列表无需查询message表
+    message_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    last_message_preview = db.Column(db.String(60), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    # passive_deletes：删除会话时不加载消息，由数据库的ON DELETE CASCADE（或显式的集合DELETE）删除
     messages = db.relationship(
-        'Message', backref='conversation', lazy=True, cascade="all, delete-orphan")
+        'Message', backref='conversation', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # 会话列表：按用户过滤并按创建时间倒序分页
+        db.Index('idx_conversation_user_created', 'user_id', 'created_at', 'id'),
+    )
 
     def to_dict(self):
         return {
@@ -19,14 +32,17 @@ class Conversation(db.Model):
             'title': self.title,
             'mode': self.mode,
             'mode_config': self.mode_config,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'message_count': self.message_count,
+            'last_message_preview': self.last_message_preview,
+            'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None
         }
 
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey(
-        'conversation.id'), nullable=False)
+        'conversation.id', ondelete='CASCADE'), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
     corrections = db.Column(db.JSON, nullable=True)
@@ -34,6 +50,16 @@ class Message(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_deleted = db.Column(db.Boolean, default=False, nullable=False)
+    # 纠错和优化结果的状态：pending（后台生成中）、complete、skipped、failed；旧数据为空
+    feedback_status = db.Column(db.String(20), nullable=True)
+
+    __table_args__ = (
+        # 历史加载、消息分页、截断和统计都按会话过滤未删除的消息并按时间排序；
+        # PostgreSQL和SQLite上是只包含未删除消息的部分索引，其他数据库上是普通复合索引
+        db.Index('idx_message_conversation_live', 'conversation_id', 'created_at', 'id',
+                 postgresql_where=db.text('is_deleted = false'),
+                 sqlite_where=db.text('is_deleted = 0')),
+    )
 
     def to_dict(self):
         return {
@@ -45,5 +71,6 @@ class Message(db.Model):
             'optimization': self.optimization,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'is_deleted': self.is_deleted
+            'is_deleted': self.is_deleted,
+            'feedback_status': self.feedback_status
         }
@@ -0,0 +1,22 @@
+from . import db
+from datetime import datetime
+
+
+class IdempotencyRecord(db.Model):
+    """带Idempotency-Key的请求及其首次响应，过期后可被清理"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(64), nullable=False)  # 用户ID，未登录请求不使用幂等记录
+    endpoint = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default='in_progress', nullable=False)  # in_progress / completed
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'endpoint', 'key', name='uq_idempotency_scope_endpoint_key'),
+        db.Index('idx_idempotency_expires_at', 'expires_at'),
+    )
@@ -0,0 +1,38 @@
+from . import db
+from datetime import datetime
+
+
+class Job(db.Model):
+    """数据库持久化的后台任务，由worker.py领取执行"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=True)
+    priority = db.Column(db.Integer, default=0, nullable=False)  # 数值越大越先执行
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued / running / done / failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # 最早可执行时间（重试退避）
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)  # 可见性超时，过期后其他worker可以重新领取
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_job_claim', 'status', 'priority', 'run_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'locked_by': self.locked_by,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -1,7 +1,8 @@
-import requests
 import logging
 from typing import List, Dict, Optional
 
+from ..utils.ai_client import AIApiClient
+
 logger = logging.getLogger(__name__)
 
 
@@ -118,7 +119,7 @@ class ApiProviderService:
                     'Content-Type': 'application/json'
                 }
 
-            response = requests.get(models_url, headers=headers, timeout=10)
+            response = AIApiClient.get_url(api_base, models_url, headers=headers, timeout=10)
             response.raise_for_status()
 
             data = response.json()
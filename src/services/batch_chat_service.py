@@ -0,0 +1,111 @@
+"""
+批量聊天服务 - 一次提交多条消息（可分属不同会话），以有限并发执行完整的聊天+纠错流程
+同一会话的消息按提交顺序串行执行，保证每一轮都能看到上一轮的历史；不同会话之间并发执行。
+结果按完成顺序逐条产出，单条失败不影响其他消息
+"""
+
+import os
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from src.models import db
+from src.services.chat_service import ChatService
+from ..config.api_config import ApiConfig
+
+logger = logging.getLogger(__name__)
+
+# 单次批量请求同时执行的会话数
+CHAT_BATCH_CONCURRENCY = int(os.getenv('CHAT_BATCH_CONCURRENCY', 4))
+
+# 单次批量请求允许的最大消息数
+CHAT_BATCH_MAX_ITEMS = int(os.getenv('CHAT_BATCH_MAX_ITEMS', 100))
+
+
+class BatchChatService:
+    """按会话分组、有限并发地执行一批聊天消息"""
+
+    def __init__(self, api_config: ApiConfig, concurrency: int = None):
+        self.chat_service = ChatService(api_config)
+        self.concurrency = max(1, concurrency or CHAT_BATCH_CONCURRENCY)
+
+    @staticmethod
+    def _group_by_conversation(items: List[Dict]) -> List[List[int]]:
+        """按会话分组，返回每组消息在items中的下标；未指定会话的消息各自新建会话，单独成组"""
+        groups: Dict[object, List[int]] = {}
+        for index, item in enumerate(items):
+            conversation_id = item.get("conversation_id")
+            key = ("conversation", conversation_id) if conversation_id else ("new", index)
+            groups.setdefault(key, []).append(index)
+        return list(groups.values())
+
+    def run(self, app, user_id: int, items: List[Dict], language_preference: str = 'en',
+            deadline_seconds: float = None) -> Iterator[Dict]:
+        """
+        执行一批消息并按完成顺序产出每条结果
+
+        Args:
+            app: Flask应用，工作线程在其应用上下文中访问数据库
+            items: 消息列表，每项包含message，可选conversation_id、mode、mode_config和客户端自定义的id
+            deadline_seconds: 每条消息各自的时间预算
+
+        Yields:
+            每条消息的结果：index、id、success，成功时附带聊天结果，失败时附带error
+        """
+        results: "queue.Queue[Dict]" = queue.Queue()
+        stop_event = threading.Event()
+
+        def run_group(indexes: List[int]) -> None:
+            with app.app_context():
+                try:
+                    for index in indexes:
+                        if stop_event.is_set():
+                            return
+                        try:
+                            result = self._run_item(index, items[index], user_id, language_preference,
+                                                    deadline_seconds)
+                        except Exception as e:
+                            # 每条消息都必须产出结果，否则调用方会一直等待
+                            result = {"index": index, "id": items[index].get("id"),
+                                      "success": False, "error": str(e)}
+                        results.put(result)
+                finally:
+                    db.session.remove()
+
+        groups = self._group_by_conversation(items)
+        executor = ThreadPoolExecutor(max_workers=min(self.concurrency, len(groups)) or 1,
+                                      thread_name_prefix='chat-batch')
+        try:
+            for indexes in groups:
+                executor.submit(run_group, indexes)
+            for _ in range(len(items)):
+                yield results.get()
+        finally:
+            # 客户端断开时不再开始新的消息，已在执行的消息完成后自然结束
+            stop_event.set()
+            executor.shutdown(wait=False)
+
+    def _run_item(self, index: int, item: Dict, user_id: int, language_preference: str,
+                  deadline_seconds: Optional[float]) -> Dict:
+        base = {"index": index, "id": item.get("id")}
+        user_message = item.get("message")
+        if not isinstance(user_message, str) or not user_message.strip():
+            return {**base, "success": False, "error": "Message content is required."}
+
+        try:
+            result = self.chat_service.process_chat_message(
+                user_id=user_id,
+                user_message=user_message,
+                conversation_id=item.get("conversation_id"),
+                language_preference=language_preference,
+                mode=item.get("mode", "free_chat"),
+                mode_config=item.get("mode_config", {}),
+                deadline_seconds=deadline_seconds
+            )
+            return {**base, "success": True, **result}
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Batch chat item {index} failed: {e}")
+            return {**base, "success": False, "error": str(e)}
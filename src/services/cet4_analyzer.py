@@ -2,13 +2,12 @@
 CET4优化分析器 - 专门处理详细分析功能
 """
 
-import requests
-import json
-import re
 import logging
 from typing import Optional, Dict
 
 from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.async_ai_client import AsyncAIApiClient
 from .cet4_prompts import CET4PromptTemplates
 
 logger = logging.getLogger(__name__)
@@ -19,6 +18,8 @@ class CET4Analyzer:
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.async_client = AsyncAIApiClient(api_config)
 
     def get_detailed_analysis(self, text: str) -> Optional[Dict]:
         """
@@ -27,7 +28,6 @@ class CET4Analyzer:
         """
         print(f"[DEBUG] 开始四级详细分析，文本: {text}")
 
-        headers = self.api_config.get_headers()
         system_prompt = CET4PromptTemplates.get_detailed_analysis_prompt()
 
         payload = {
@@ -47,45 +47,16 @@ class CET4Analyzer:
         }
 
         try:
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=40)
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip()
-            print(f"[DEBUG] 四级详细分析原始响应: {content}")
-
-            # 提取并解析JSON
-            json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-            if json_match:
-                json_str = json_match.group(1).strip()
-                try:
-                    analysis_data = json.loads(json_str)
-                    print(f"[DEBUG] 四级详细分析结果: {analysis_data}")
-                    return analysis_data
-                except json.JSONDecodeError as e:
-                    print(f"[ERROR] JSON解析失败: {e}")
-                    return None
-            else:
-                # 如果没有JSON格式，尝试直接解析
-                try:
-                    analysis_data = json.loads(content)
-                    return analysis_data
-                except json.JSONDecodeError:
-                    print(f"[ERROR] 无法从响应中提取有效JSON: {content}")
-                    return None
+            analysis_data = self.ai_client.complete_json(payload, timeout=40, label='cet4_detailed')
+            print(f"[DEBUG] 四级详细分析结果: {analysis_data}")
+            return analysis_data
 
         except Exception as e:
             print(f"[ERROR] 四级详细分析失败: {e}")
             return None
 
-    def analyze_context_optimization(self, text: str, context_info: str) -> Optional[str]:
-        """
-        根据上下文进行CET4优化分析
-        """
-        print(f"[DEBUG] 开始上下文CET4优化，文本: {text}")
-
-        headers = self.api_config.get_headers()
-
+    def _build_context_optimization_payload(self, text: str, context_info: str) -> Dict:
+        """构建上下文CET4优化请求载荷"""
         context_prompt = f"""
 **对话上下文信息:**
 {context_info}
@@ -94,7 +65,7 @@ class CET4Analyzer:
         system_prompt = CET4PromptTemplates.get_context_aware_prompt()
         full_prompt = system_prompt + context_prompt
 
-        payload = {
+        return {
             "model": self.api_config.model,
             "messages": [
                 {
@@ -110,14 +81,31 @@ class CET4Analyzer:
             "temperature": 0.1
         }
 
+    def analyze_context_optimization(self, text: str, context_info: str) -> Optional[str]:
+        """
+        根据上下文进行CET4优化分析
+        """
+        print(f"[DEBUG] 开始上下文CET4优化，文本: {text}")
+
+        payload = self._build_context_optimization_payload(text, context_info)
+
         try:
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=15)
-            response.raise_for_status()
-            result = response.json()
-            optimized = result["choices"][0]["message"]["content"].strip()
-            return optimized
+            return self.ai_client.complete(payload, timeout=15, cache=True, hedge=True)
+
+        except Exception as e:
+            print(f"[ERROR] 上下文CET4优化失败: {e}")
+            return text
 
+    async def analyze_context_optimization_async(self, text: str, context_info: str) -> Optional[str]:
+        """
+        根据上下文进行CET4优化分析（异步版本）
+        """
+        print(f"[DEBUG] 开始上下文CET4优化(async)，文本: {text}")
+
+        payload = self._build_context_optimization_payload(text, context_info)
+
+        try:
+            return await self.async_client.complete(payload, timeout=15, cache=True, hedge=True)
         except Exception as e:
             print(f"[ERROR] 上下文CET4优化失败: {e}")
-            return text
\ No newline at end of file
+            return text
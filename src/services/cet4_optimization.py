@@ -3,11 +3,12 @@ CET4优化服务 - 重构后的简化版本
 负责按照四级考试标准优化英文表达
 """
 
-import requests
 import logging
 from typing import Optional, Dict
 
 from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.async_ai_client import AsyncAIApiClient
 from .cet4_prompts import CET4PromptTemplates
 from .cet4_analyzer import CET4Analyzer
 
@@ -19,17 +20,15 @@ class CET4Optimization:
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.async_client = AsyncAIApiClient(api_config)
         self.analyzer = CET4Analyzer(api_config)
 
-    def optimize_for_cet4(self, text: str) -> Optional[Dict]:
-        """
-        根据四级考试写作评分标准优化用户输入文本
-        评分要点：清晰表达、文字连贯、语言错误少、切合题意
-        """
-        headers = self.api_config.get_headers()
+    def _build_basic_optimization_payload(self, text: str) -> Dict:
+        """构建基础CET4优化请求载荷"""
         system_prompt = CET4PromptTemplates.get_basic_optimization_prompt()
 
-        payload = {
+        return {
             "model": self.api_config.model,
             "messages": [
                 {
@@ -45,33 +44,37 @@ class CET4Optimization:
             "temperature": 0.1
         }
 
+    @staticmethod
+    def _wrap_basic_optimization(text: str, optimized_text: str) -> Optional[Dict]:
+        """包装基础CET4优化结果，无实际优化时返回None"""
+        # 检查是否有实际优化
+        if optimized_text and optimized_text != text:
+            return {
+                "original_sentence": text,
+                "optimized_sentence": optimized_text,
+                "optimization_type": "cet4_writing",
+                "explanation": "根据四级考试写作评分标准进行优化，提升清晰度、连贯性和准确性"
+            }
+        return None
+
+    def optimize_for_cet4(self, text: str) -> Optional[Dict]:
+        """
+        根据四级考试写作评分标准优化用户输入文本
+        评分要点：清晰表达、文字连贯、语言错误少、切合题意
+        """
+        payload = self._build_basic_optimization_payload(text)
+
         try:
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            result = response.json()
-            optimized_text = result["choices"][0]["message"]["content"].strip()
-
-            # 检查是否有实际优化
-            if optimized_text and optimized_text != text:
-                return {
-                    "original_sentence": text,
-                    "optimized_sentence": optimized_text,
-                    "optimization_type": "cet4_writing",
-                    "explanation": "根据四级考试写作评分标准进行优化，提升清晰度、连贯性和准确性"
-                }
-            return None
+            optimized_text = self.ai_client.complete(payload, timeout=30, cache=True)
+            return self._wrap_basic_optimization(text, optimized_text)
 
         except Exception as e:
             print(f"[ERROR] 四级优化失败: {e}")
             return None
 
-    def optimize_with_context(self, text: str, context_info: str) -> Optional[Dict]:
-        """
-        根据上下文进行CET4优化
-        """
-        optimized_text = self.analyzer.analyze_context_optimization(text, context_info)
-        
+    @staticmethod
+    def _wrap_context_optimization(text: str, optimized_text: str) -> Optional[Dict]:
+        """包装上下文CET4优化结果，无实际优化时返回None"""
         # 检查是否有实际优化
         if optimized_text and optimized_text != text:
             return {
@@ -83,8 +86,32 @@ class CET4Optimization:
         
         return None
 
+    def optimize_with_context(self, text: str, context_info: str) -> Optional[Dict]:
+        """
+        根据上下文进行CET4优化
+        """
+        optimized_text = self.analyzer.analyze_context_optimization(text, context_info)
+        
+        return self._wrap_context_optimization(text, optimized_text)
+
     def get_detailed_analysis(self, text: str) -> Optional[Dict]:
         """
         获取详细的CET4分析结果
         """
-        return self.analyzer.get_detailed_analysis(text)
\ No newline at end of file
+        return self.analyzer.get_detailed_analysis(text)
+
+    async def optimize_for_cet4_async(self, text: str) -> Optional[Dict]:
+        """基础CET4优化（异步版本）"""
+        payload = self._build_basic_optimization_payload(text)
+
+        try:
+            optimized_text = await self.async_client.complete(payload, timeout=30, cache=True)
+            return self._wrap_basic_optimization(text, optimized_text)
+        except Exception as e:
+            print(f"[ERROR] 四级优化失败: {e}")
+            return None
+
+    async def optimize_with_context_async(self, text: str, context_info: str) -> Optional[Dict]:
+        """上下文CET4优化（异步版本）"""
+        optimized_text = await self.analyzer.analyze_context_optimization_async(text, context_info)
+        return self._wrap_context_optimization(text, optimized_text)
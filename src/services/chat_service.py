@@ -1,138 +1,457 @@
+import asyncio
+import os
 import requests
 import logging
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Iterator, Generator, Optional, Tuple
 from src.services.conversation_service import ConversationService
 from src.services.translation_client import TranslationClient
+from src.services.context_window import ContextWindowManager
+from src.services.feedback_service import DeferredFeedback
+from src.services.summary_service import ConversationSummarizer
 from src.config.prompts import build_system_prompt
 from ..config.api_config import ApiConfig, ApiConfigFactory
+from ..utils.ai_client import AIApiClient
+from ..utils.async_ai_client import AsyncAIApiClient
+from ..utils.async_runtime import get_event_loop
+from ..utils.sse import format_sse, BilingualStreamSplitter
+from ..utils.deadline import Deadline, deadline_scope, run_in_context
 
 logger = logging.getLogger(__name__)
 
+# 聊天回复的max_tokens，历史消息本身的长度由ContextWindowManager按预算控制
+CHAT_MAX_TOKENS = int(os.environ.get('CHAT_MAX_TOKENS', 100000))
+
+# 流式回复结束后等待纠错和优化结果的最长时间（秒），超时则跳过，保证done事件及时发送
+CHAT_STREAM_FEEDBACK_WAIT_SECONDS = float(os.environ.get('CHAT_STREAM_FEEDBACK_WAIT_SECONDS', 15))
+
 
 class ChatService:
     """编排聊天流程的服务"""
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.async_client = AsyncAIApiClient(api_config)
         self.translation_client = TranslationClient(api_config)
+        self.context_window = ContextWindowManager(api_config)
 
-    def process_chat_message(self, user_id: int, user_message: str, conversation_id: int = None, language_preference: str = 'en', mode: str = 'free_chat', mode_config: dict = None):
+    def process_chat_message(self, user_id: int, user_message: str, conversation_id: int = None, language_preference: str = 'en', mode: str = 'free_chat', mode_config: dict = None, deadline_seconds: float = None):
         """
         处理用户聊天消息的完整流程。
-        1. 获取或创建会话。
-        2. 获取历史消息作为上下文。
-        3. 处理用户输入（带上下文的翻译和语法纠错）。
-        4. 保存用户消息。
-        5. 获取历史消息并请求 AI。
-        6. 保存 AI 回复。
-        """
-        # 1. 获取或创建会话，传入模式信息
+        1. 获取或创建会话，加载一次历史消息并保存用户消息。
+        2. 在后台线程处理用户输入（带上下文的翻译和语法纠错）。
+        3. 同时把新消息追加到内存中的历史后请求 AI。
+        4. 等待辅助阶段结束，回写纠错结果并保存 AI 回复。
+
+        发送给AI的是用户原始消息，辅助阶段的结果只用于反馈，因此两者并发执行，
+        一轮对话的耗时接近两者中较慢的一个而不是两者之和。
+        传入deadline_seconds时，整个流程共享这一时间预算，剩余预算会传递给所有下游LLM调用；
+        聊天回复完成后辅助阶段最多等到截止时间，超出时被放弃，返回结果中的feedback_status为"skipped"。
+        """
+        with deadline_scope(deadline_seconds) as deadline:
+            # 1. 历史消息只加载一次，上下文构建和聊天请求共用同一份列表
+            turn = self._prepare_turn(user_id, user_message, conversation_id, mode, mode_config)
+            conversation_context = turn["history"]
+            system_prompt = build_system_prompt(language_preference, turn["mode"], turn["mode_config"])
+
+            # 2. 辅助阶段只调用LLM、不访问数据库，在后台线程与聊天请求并发执行
+            executor = ThreadPoolExecutor(max_workers=1)
+            aux_future = executor.submit(run_in_context(
+                self.translation_client.process_user_input, user_message, conversation_context))
+            try:
+                # 3. 新用户消息直接追加到内存中的历史，不再重新查询，再按token预算裁剪
+                messages_for_api = self._context_messages(
+                    turn["conversation_id"], self._with_user_message(turn, user_message),
+                    turn["context_summary"], turn["summary_message_id"], system_prompt)
+                ai_response_content = self._send_chat_request(
+                    messages_for_api, system_prompt)
+
+                grammar_correction_result, optimization_result, feedback_status = self._join_preprocess(
+                    aux_future, deadline)
+            finally:
+                aux_future.cancel()
+                executor.shutdown(wait=False)
+
+            # 4. 回写纠错结果并保存AI回复
+            ai_message_id = self._finish_turn(
+                turn["conversation_id"], turn["user_message_id"],
+                grammar_correction_result, optimization_result, ai_response_content, feedback_status)
+
+            return {
+                "response": ai_response_content,
+                "grammar_corrections": grammar_correction_result,
+                "optimization": optimization_result,
+                "feedback_status": feedback_status,
+                "conversation_id": turn["conversation_id"],
+                "user_message_id": turn["user_message_id"],
+                "ai_message_id": ai_message_id
+            }
+
+    def process_chat_message_deferred(self, app, user_id: int, user_message: str, conversation_id: int = None, language_preference: str = 'en', mode: str = 'free_chat', mode_config: dict = None, deadline_seconds: float = None):
+        """
+        延迟反馈模式：只等待聊天回复，纠错和CET4优化提交到后台执行。
+        返回结构与process_chat_message一致，其中feedback_status为"pending"、纠错结果为空；
+        结果生成后写入用户消息并通过feedback事件推送，也可以通过轮询接口获取。
+        """
+        with deadline_scope(deadline_seconds):
+            turn = self._prepare_turn(
+                user_id, user_message, conversation_id, mode, mode_config, feedback_status="pending")
+            system_prompt = build_system_prompt(language_preference, turn["mode"], turn["mode_config"])
+            messages_for_api = self._context_messages(
+                turn["conversation_id"], self._with_user_message(turn, user_message),
+                turn["context_summary"], turn["summary_message_id"], system_prompt)
+
+            try:
+                ai_response_content = self._send_chat_request(messages_for_api, system_prompt)
+            except Exception:
+                # 没有回复时不再生成反馈，避免消息一直停留在pending状态
+                ConversationService.update_message_feedback(turn["user_message_id"], feedback_status="skipped")
+                raise
+
+        ai_message_obj = ConversationService.add_message(
+            conversation_id=turn["conversation_id"],
+            role='assistant',
+            content=ai_response_content
+        )
+        DeferredFeedback.submit(
+            app, self.api_config, user_id, turn["user_message_id"], user_message, turn["history"])
+
+        return {
+            "response": ai_response_content,
+            "grammar_corrections": None,
+            "optimization": None,
+            "feedback_status": "pending",
+            "conversation_id": turn["conversation_id"],
+            "user_message_id": turn["user_message_id"],
+            "ai_message_id": ai_message_obj.id
+        }
+
+    @staticmethod
+    def _join_preprocess(aux_future, deadline: Optional[Deadline]) -> Tuple[Optional[Dict], Optional[Dict], str]:
+        """
+        等待后台辅助阶段的结果，设置了截止时间时最多等到截止时间
+        返回: (纠错结果, 优化结果, feedback_status)
+        """
+        timeout = max(0.0, deadline.remaining()) if deadline else None
+        try:
+            _, grammar_correction_result, optimization_result = aux_future.result(timeout=timeout)
+            return grammar_correction_result, optimization_result, "complete"
+        except FutureTimeoutError:
+            logger.warning("Grammar/CET4 stages exceeded the request deadline, skipping them")
+            return None, None, "skipped"
+        except Exception as e:
+            logger.error(f"Input preprocessing failed: {e}")
+            return None, None, "failed"
+
+    async def process_chat_message_async(self, user_id: int, user_message: str, conversation_id: int = None, language_preference: str = 'en', mode: str = 'free_chat', mode_config: dict = None, app=None, deadline_seconds: float = None):
+        """
+        process_chat_message的异步版本。
+        语法纠错、CET4优化和聊天请求在同一个事件循环上并发执行，
+        数据库操作在线程中执行（传入app时会推入应用上下文），避免阻塞事件循环。
+        返回结构与process_chat_message一致；聊天回复完成后辅助阶段最多等到截止时间，
+        未完成的会被取消并标记为"skipped"。
+        """
+        with deadline_scope(deadline_seconds) as deadline:
+            turn = await self._run_db(
+                app, self._prepare_turn, user_id, user_message, conversation_id, mode, mode_config)
+
+            conversation_context = turn["history"]
+            system_prompt = build_system_prompt(language_preference, turn["mode"], turn["mode_config"])
+
+            preprocess_task = asyncio.ensure_future(
+                self.translation_client.process_user_input_async(user_message, conversation_context))
+            try:
+                messages_for_api = await self._context_messages_async(
+                    app, turn["conversation_id"], self._with_user_message(turn, user_message),
+                    turn["context_summary"], turn["summary_message_id"], system_prompt)
+                ai_response_content = await self._send_chat_request_async(messages_for_api, system_prompt)
+                _, grammar_correction_result, optimization_result = await asyncio.wait_for(
+                    preprocess_task, timeout=deadline.remaining() if deadline else None)
+                feedback_status = "complete"
+            except asyncio.TimeoutError:
+                logger.warning("Grammar/CET4 stages exceeded the request deadline, skipping them")
+                grammar_correction_result, optimization_result = None, None
+                feedback_status = "skipped"
+            finally:
+                if not preprocess_task.done():
+                    preprocess_task.cancel()
+
+        ai_message_id = await self._run_db(
+            app, self._finish_turn, turn["conversation_id"], turn["user_message_id"],
+            grammar_correction_result, optimization_result, ai_response_content, feedback_status)
+
+        return {
+            "response": ai_response_content,
+            "grammar_corrections": grammar_correction_result,
+            "optimization": optimization_result,
+            "feedback_status": feedback_status,
+            "conversation_id": turn["conversation_id"],
+            "user_message_id": turn["user_message_id"],
+            "ai_message_id": ai_message_id
+        }
+
+    @staticmethod
+    async def _run_db(app, func, *args):
+        """在线程中执行数据库操作；未传入app时直接在当前上下文中执行"""
+        if app is None:
+            return func(*args)
+
+        def call():
+            with app.app_context():
+                return func(*args)
+
+        return await asyncio.to_thread(call)
+
+    @staticmethod
+    def _prepare_turn(user_id: int, user_message: str, conversation_id: int, mode: str, mode_config: dict, feedback_status: str = None) -> Dict:
+        """获取会话和历史消息并保存用户消息，只返回普通数据，便于跨线程使用"""
         conversation = ConversationService.create_or_get_conversation(
             user_id, conversation_id, user_message, mode, mode_config)
+        if not conversation:
+            raise Exception("Conversation not found or access denied.")
 
-        # 2. 获取历史消息作为上下文（在处理用户输入前）
         messages_history, error = ConversationService.get_messages_by_conversation_id(
             conversation.id, user_id)
         if error:
             raise Exception(error)
 
-        # 构建对话历史用于上下文感知
-        conversation_context = []
-        if messages_history:
-            for msg in messages_history:
-                conversation_context.append({
-                    'role': msg.role,
-                    'content': msg.content
-                })
-
-        # 3. 处理用户输入（带上下文感知）
-        message_for_ai, grammar_correction_result, optimization_result = self.translation_client.process_user_input(
-            user_message, conversation_context)
+        history = [{"id": msg.id, "role": msg.role, "content": msg.content} for msg in messages_history]
 
-        # 4. 保存用户消息
         user_message_obj = ConversationService.add_message(
             conversation_id=conversation.id,
             role='user',
             content=user_message,
-            corrections=grammar_correction_result,
-            optimization=optimization_result
+            feedback_status=feedback_status
         )
 
-        # 5. 重新获取包含新用户消息的历史消息并发送给AI
-        messages_history, error = ConversationService.get_messages_by_conversation_id(
-            conversation.id, user_id)
-        if error:
-            raise Exception(error)
+        return {
+            "conversation_id": conversation.id,
+            "mode": conversation.mode,
+            "mode_config": conversation.mode_config,
+            "history": history,
+            "context_summary": conversation.context_summary,
+            "summary_message_id": conversation.summary_message_id,
+            "user_message_id": user_message_obj.id
+        }
+
+    @staticmethod
+    def _with_user_message(turn: Dict, user_message: str) -> List[Dict]:
+        """历史消息加上本轮刚保存的用户消息"""
+        return turn["history"] + [{"id": turn["user_message_id"], "role": "user", "content": user_message}]
+
+    def _context_messages(self, conversation_id: int, history: List[Dict], summary: Optional[str], summary_message_id: Optional[int], system_prompt: str) -> List[Dict]:
+        """
+        按token预算组织发送给模型的历史消息，只使用已保存的摘要，不在请求路径上调用LLM；
+        较早的消息超出窗口时提交后台刷新摘要，刷新完成前在预算内补发摘要尚未覆盖的消息
+        """
+        reserved_tokens = self.context_window.counter.count_text(system_prompt)
+        plan = self.context_window.plan(history, summary, summary_message_id, reserved_tokens)
+        if not plan.fold:
+            return self.context_window.render(plan.summary, plan.tail)
+        ConversationSummarizer.submit(self.api_config, conversation_id, reserved_tokens)
+        return self.context_window.render(plan.summary, self.context_window.backfill(plan, reserved_tokens))
+
+    async def _context_messages_async(self, app, conversation_id: int, history: List[Dict], summary: Optional[str], summary_message_id: Optional[int], system_prompt: str) -> List[Dict]:
+        """_context_messages的异步版本，提交摘要刷新在线程中执行"""
+        reserved_tokens = self.context_window.counter.count_text(system_prompt)
+        plan = self.context_window.plan(history, summary, summary_message_id, reserved_tokens)
+        if not plan.fold:
+            return self.context_window.render(plan.summary, plan.tail)
+        await self._run_db(
+            app, ConversationSummarizer.submit, self.api_config, conversation_id, reserved_tokens, app)
+        return self.context_window.render(plan.summary, self.context_window.backfill(plan, reserved_tokens))
+
+    @staticmethod
+    def _finish_turn(conversation_id: int, user_message_id: int, corrections, optimization, ai_response_content: str, feedback_status: str = "complete") -> int:
+        """写入用户消息的纠错结果并保存AI回复，返回AI消息ID"""
+        ConversationService.update_message_feedback(
+            user_message_id, corrections=corrections, optimization=optimization, feedback_status=feedback_status)
+        ai_message_obj = ConversationService.add_message(
+            conversation_id=conversation_id,
+            role='assistant',
+            content=ai_response_content
+        )
+        return ai_message_obj.id
 
-        messages_for_api = [{"role": msg.role, "content": msg.content}
-                            for msg in messages_history]
-        system_prompt = build_system_prompt(language_preference, conversation.mode, conversation.mode_config)
+    def regenerate_from_message(self, turn: Dict, language_preference: str = 'en'):
+        """
+        编辑消息后重新生成AI回复
+        turn为ConversationService.edit_and_truncate的返回值，其中的历史直接用于请求，不再重新查询
+        """
+        system_prompt = build_system_prompt(language_preference, turn["mode"], turn["mode_config"])
+        messages_for_api = self._context_messages(
+            turn["conversation_id"], turn["history"], turn["context_summary"], turn["summary_message_id"],
+            system_prompt)
         ai_response_content = self._send_chat_request(
             messages_for_api, system_prompt)
 
-        # 6. 保存AI回复
+        # 保存AI回复
         ai_message_obj = ConversationService.add_message(
-            conversation_id=conversation.id,
+            conversation_id=turn["conversation_id"],
             role='assistant',
             content=ai_response_content
         )
 
         return {
             "response": ai_response_content,
-            "grammar_corrections": grammar_correction_result,
-            "optimization": optimization_result,
-            "conversation_id": conversation.id,
-            "user_message_id": user_message_obj.id,
             "ai_message_id": ai_message_obj.id
         }
 
-    def regenerate_from_message(self, user_id: int, conversation_id: int, language_preference: str = 'en'):
+    def stream_chat_message(self, user_id: int, user_message: str, conversation_id: int = None, language_preference: str = 'en', mode: str = 'free_chat', mode_config: dict = None) -> Iterator[str]:
         """
-        从指定会话重新生成AI回复
+        process_chat_message的流式版本，按SSE格式逐条产出事件：
+        meta -> delta... -> feedback -> done，出错时产出error。
+        纠错和优化在后台并发执行，不影响首个token的返回时间。
+        回复出错或客户端在回复完成前断开时取消纠错和优化，用户消息的反馈标记为"skipped"。
         """
-        # 获取会话对象
-        from src.models.conversation import Conversation
-        conversation = Conversation.query.filter_by(id=conversation_id, user_id=user_id).first()
-        if not conversation:
-            raise Exception(f"Conversation {conversation_id} not found")
-        
-        # 获取会话历史消息
-        messages_history, error = ConversationService.get_messages_by_conversation_id(
-            conversation_id, user_id)
-        if error:
-            raise Exception(error)
+        try:
+            turn = self._prepare_turn(
+                user_id, user_message, conversation_id, mode, mode_config, feedback_status="pending")
+        except Exception as e:
+            logger.error(f"Failed to prepare streaming chat turn: {e}")
+            yield format_sse('error', {"error": str(e)})
+            return
 
-        # 构建消息历史用于AI请求
-        messages_for_api = [{"role": msg.role, "content": msg.content}
-                            for msg in messages_history]
-        system_prompt = build_system_prompt(language_preference, conversation.mode, conversation.mode_config)
-        ai_response_content = self._send_chat_request(
-            messages_for_api, system_prompt)
+        aux_future = None
+        try:
+            yield format_sse('meta', {
+                "conversation_id": turn["conversation_id"],
+                "user_message_id": turn["user_message_id"]
+            })
+
+            aux_future = asyncio.run_coroutine_threadsafe(
+                self.translation_client.process_user_input_async(user_message, turn["history"]),
+                get_event_loop()
+            )
+
+            system_prompt = build_system_prompt(language_preference, turn["mode"], turn["mode_config"])
+            messages_for_api = self._context_messages(
+                turn["conversation_id"], self._with_user_message(turn, user_message),
+                turn["context_summary"], turn["summary_message_id"], system_prompt)
+
+            ai_response_content = yield from self._stream_reply(messages_for_api, system_prompt)
+        except GeneratorExit:
+            # 客户端断开时在yield处抛出GeneratorExit，不会被except Exception捕获
+            logger.info(f"Client disconnected before the streamed reply for message {turn['user_message_id']} finished")
+            self._abandon_stream_turn(turn["user_message_id"], aux_future)
+            raise
+        except Exception as e:
+            logger.error(f"Streaming chat request failed: {e}")
+            self._abandon_stream_turn(turn["user_message_id"], aux_future)
+            yield format_sse('error', {"error": f"An error occurred in the chat service: {str(e)}"})
+            return
+
+        feedback_status = "complete"
+        try:
+            _, grammar_correction_result, optimization_result = aux_future.result(
+                timeout=CHAT_STREAM_FEEDBACK_WAIT_SECONDS)
+        except FutureTimeoutError:
+            aux_future.cancel()
+            logger.warning("Grammar/CET4 stages did not finish after the streamed reply, skipping them")
+            grammar_correction_result, optimization_result = None, None
+            feedback_status = "skipped"
+        except Exception as e:
+            logger.error(f"Input preprocessing failed: {e}")
+            grammar_correction_result, optimization_result = None, None
+            feedback_status = "failed"
+
+        ai_message_id = self._finish_turn(
+            turn["conversation_id"], turn["user_message_id"],
+            grammar_correction_result, optimization_result, ai_response_content, feedback_status)
+
+        yield format_sse('feedback', {
+            "user_message_id": turn["user_message_id"],
+            "grammar_corrections": grammar_correction_result,
+            "optimization": optimization_result
+        })
+        yield format_sse('done', {
+            "response": ai_response_content,
+            "conversation_id": turn["conversation_id"],
+            "user_message_id": turn["user_message_id"],
+            "ai_message_id": ai_message_id
+        })
+
+    @staticmethod
+    def _abandon_stream_turn(user_message_id: int, aux_future) -> None:
+        """流式回复没有完成：取消仍在执行的纠错和优化，并把反馈标记为skipped，避免消息一直停留在pending状态"""
+        if aux_future is not None:
+            aux_future.cancel()
+        try:
+            ConversationService.update_message_feedback(user_message_id, feedback_status="skipped")
+        except Exception as e:
+            logger.error(f"Failed to mark feedback of message {user_message_id} as skipped: {e}")
+
+    def stream_regenerate_from_message(self, turn: Dict, language_preference: str = 'en') -> Iterator[str]:
+        """
+        regenerate_from_message的流式版本，事件格式与stream_chat_message一致
+        客户端在回复完成前断开时不保存部分回复，会话停留在编辑后的用户消息，可以再次重新生成
+        """
+        conversation_id = turn["conversation_id"]
+        system_prompt = build_system_prompt(language_preference, turn["mode"], turn["mode_config"])
+        messages_for_api = self._context_messages(
+            conversation_id, turn["history"], turn["context_summary"], turn["summary_message_id"], system_prompt)
+
+        try:
+            yield format_sse('meta', {"conversation_id": conversation_id, "message": turn["message"]})
+            ai_response_content = yield from self._stream_reply(messages_for_api, system_prompt)
+        except GeneratorExit:
+            # 关闭_stream_reply时会一并关闭上游的流式请求，不再继续消耗token
+            logger.info(f"Client disconnected before the regenerated reply for message {turn['message']['id']} finished")
+            raise
+        except Exception as e:
+            logger.error(f"Streaming regenerate request failed: {e}")
+            yield format_sse('error', {"error": f"An error occurred in the chat service: {str(e)}"})
+            return
 
-        # 保存AI回复
         ai_message_obj = ConversationService.add_message(
             conversation_id=conversation_id,
             role='assistant',
             content=ai_response_content
         )
 
-        return {
+        yield format_sse('done', {
             "response": ai_response_content,
+            "conversation_id": conversation_id,
             "ai_message_id": ai_message_obj.id
-        }
+        })
 
-    def _send_chat_request(self, messages: List[Dict], system_prompt: str) -> str:
-        """发送聊天请求到AI API（内部方法）"""
-        headers = self.api_config.get_headers()
+    def _stream_reply(self, messages: List[Dict], system_prompt: str) -> Generator[str, None, str]:
+        """
+        流式请求AI回复，按 "|||" 分隔符拆分为content/translation的delta事件，
+        流结束后返回完整的原始回复文本（与非流式接口保存的格式一致）
+        """
+        chat_payload = self._build_chat_payload(messages, system_prompt)
+        splitter = BilingualStreamSplitter()
+        chunks = []
+
+        for delta in self.ai_client.stream_chat_completion(chat_payload, timeout=30):
+            chunks.append(delta)
+            for field, text in splitter.feed(delta):
+                yield format_sse('delta', {field: text})
+
+        for field, text in splitter.flush():
+            yield format_sse('delta', {field: text})
 
-        chat_payload = self.api_config.get_request_payload([
+        ai_response_content = "".join(chunks).strip()
+        if not ai_response_content:
+            raise Exception("AI returned an empty response")
+        logger.info(f"Successfully streamed AI response.")
+        return ai_response_content
+
+    def _build_chat_payload(self, messages: List[Dict], system_prompt: str) -> Dict:
+        """构建聊天请求载荷"""
+        return self.api_config.get_request_payload([
             {"role": "system", "content": system_prompt},
             *messages
-        ], max_tokens=100000)
+        ], max_tokens=CHAT_MAX_TOKENS)
+
+    def _send_chat_request(self, messages: List[Dict], system_prompt: str) -> str:
+        """发送聊天请求到AI API（内部方法）"""
+        chat_payload = self._build_chat_payload(messages, system_prompt)
 
         try:
-            chat_response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=chat_payload, timeout=30)
+            chat_response = self.ai_client.send_chat_completion(chat_payload, timeout=30)
             chat_response.raise_for_status()
             chat_result = chat_response.json()
             ai_response_content = chat_result["choices"][0]["message"]["content"].strip(
@@ -147,3 +466,15 @@ class ChatService:
         except Exception as e:
             logger.error(f"Chat service error: {e}")
             raise Exception(f"An error occurred in the chat service: {str(e)}")
+
+    async def _send_chat_request_async(self, messages: List[Dict], system_prompt: str) -> str:
+        """发送聊天请求到AI API（异步版本）"""
+        chat_payload = self._build_chat_payload(messages, system_prompt)
+
+        try:
+            ai_response_content = await self.async_client.complete(chat_payload, timeout=30)
+            logger.info(f"Successfully received AI response.")
+            return ai_response_content
+        except Exception as e:
+            logger.error(f"Async chat request failed: {e}")
+            raise Exception(f"An error occurred in the chat service: {str(e)}")
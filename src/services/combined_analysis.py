@@ -0,0 +1,114 @@
+"""
+合并分析服务 - 一次LLM调用同时完成翻译、语法纠错和CET4改写
+由TranslationClient在启用TRANSLATION_COMBINED_ANALYSIS时使用，
+返回结果会被拆分为与原有各服务完全一致的结果字典
+"""
+
+import logging
+from typing import Optional, Dict, Tuple
+
+from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.async_ai_client import AsyncAIApiClient
+from .cet4_optimization import CET4Optimization
+
+logger = logging.getLogger(__name__)
+
+
+class CombinedAnalysis:
+    """合并分析服务 - 负责单次调用的提示构建和结果拆分"""
+
+    def __init__(self, api_config: ApiConfig):
+        self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.async_client = AsyncAIApiClient(api_config)
+
+    def _build_payload(self, text: str, is_chinese: bool, context_info: Optional[str]) -> Dict:
+        """构建合并分析请求载荷"""
+        if is_chinese:
+            task = """用户输入是中文。请:
+1. 把它翻译成地道、自然、切合对话语境的英文，作为 `english_sentence`。
+2. `corrections` 中只包含一项 type 为 "translation" 的说明。
+3. 再按四级写作评分标准优化这句英文译文，作为 `cet4_sentence`。"""
+        else:
+            task = """用户输入是英文。请:
+1. 在宽容标准下检查翻译（夹杂的中文）、语法和拼写错误，修正后的句子作为 `english_sentence`；
+   忽略单纯的大小写错误和常见的句末标点遗漏。没有错误时 `english_sentence` 与原句相同，`corrections` 为空 `[]`。
+2. 再按四级写作评分标准优化用户的原句，作为 `cet4_sentence`。"""
+
+        context_section = f"""
+**对话上下文信息:**
+{context_info}
+""" if context_info else ""
+
+        system_prompt = f"""你是一位顶级的英语语法、翻译专家和四级考试写作指导老师。请一次性分析用户输入，并返回一个JSON对象。
+{context_section}
+**任务:**
+{task}
+
+**JSON结构要求:**
+1.  `english_sentence`: 翻译或修正后的英文句子。
+2.  `overall_comment`: (可选) 一句中文总结，对句子进行总体评价或给予鼓励。
+3.  `corrections`: 修改项列表，每项包含 `type`, `original`, `corrected`, `explanation`；
+    `type` 必须是 "translation", "grammar", "spelling" 或 "context" 之一，`explanation` 用中文详细解释。
+4.  `cet4_sentence`: 符合四级高分要求的改写（清楚表达、文字连贯、词汇和句式更丰富），只包含英文句子本身。
+
+**重要指令:**
+*   **必须返回JSON:** 绝对不要在JSON对象之外返回任何文本、注释或解释。
+*   如果有对话上下文，表达方式要与对话主题和语气保持一致。"""
+
+        return self.api_config.get_request_payload([
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ], max_tokens=2000, temperature=0.1)
+
+    @staticmethod
+    def _split_result(user_message: str, is_chinese: bool, has_context: bool, data: Dict) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """
+        把合并结果拆分为原有格式
+        返回: (处理后的消息, 纠错结果, 优化结果)
+        """
+        english_sentence = (data.get("english_sentence") or "").strip() or user_message
+        corrections = data.get("corrections") or []
+        cet4_sentence = (data.get("cet4_sentence") or "").strip()
+
+        grammar_correction_result = None
+        message_for_ai = user_message
+        if english_sentence != user_message or corrections:
+            grammar_correction_result = {
+                "original_sentence": user_message,
+                "corrected_sentence": english_sentence,
+                "overall_comment": data.get("overall_comment") or ("中文翻译成功" if is_chinese else ""),
+                "corrections": corrections
+            }
+            message_for_ai = english_sentence
+
+        # 中文输入优化的是译文，英文输入优化的是用户原句，与分开调用时一致
+        optimization_base = english_sentence if is_chinese else user_message
+        if has_context:
+            optimization_result = CET4Optimization._wrap_context_optimization(optimization_base, cet4_sentence)
+        else:
+            optimization_result = CET4Optimization._wrap_basic_optimization(optimization_base, cet4_sentence)
+
+        return message_for_ai, grammar_correction_result, optimization_result
+
+    def analyze(self, user_message: str, is_chinese: bool, context_info: Optional[str] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """
+        一次调用完成翻译/纠错和CET4优化，请求或解析失败时抛出异常
+        返回: (处理后的消息, 纠错结果, 优化结果)
+        """
+        payload = self._build_payload(user_message, is_chinese, context_info)
+        data = self.ai_client.complete_json(payload, timeout=40, cache=True, label='combined_analysis')
+        return self._split_result(user_message, is_chinese, bool(context_info), data)
+
+    async def analyze_async(self, user_message: str, is_chinese: bool, context_info: Optional[str] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """analyze的异步版本"""
+        payload = self._build_payload(user_message, is_chinese, context_info)
+        data = await self.async_client.complete_json(payload, timeout=40, cache=True, label='combined_analysis')
+        return self._split_result(user_message, is_chinese, bool(context_info), data)
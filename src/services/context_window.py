@@ -0,0 +1,206 @@
+"""
+对话上下文窗口管理 - 按token预算组织发送给模型的历史消息
+最近若干轮对话原样保留，更早的消息折叠进滚动摘要；
+摘要保存在Conversation行上，由后台任务把新移出窗口的消息增量合并进去，请求路径上不调用LLM
+"""
+
+import json
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+
+logger = logging.getLogger(__name__)
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+# 每条消息在对话格式中的固定开销（角色标记等）
+_MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    """统计消息的token数，安装了tiktoken时精确计数，否则按字符估算"""
+
+    def __init__(self, model: str):
+        self._encoding = None
+        try:
+            import tiktoken
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            pass
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        # 中文字符大约一个token，其余字符大约四个一个token
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count_message(self, message: Dict) -> int:
+        return self.count_text(message.get('content', '')) + _MESSAGE_OVERHEAD
+
+
+@dataclass
+class ContextSettings:
+    """上下文窗口配置"""
+
+    max_tokens: int = 6000                      # 默认的历史消息token预算
+    model_budgets: Dict[str, int] = field(default_factory=dict)  # 按模型覆盖预算，支持前缀匹配
+    keep_turns: int = 6                         # 原样保留的最近轮数（一问一答为一轮）
+    summary_batch: int = 6                      # 窗口外累计多少条未摘要的消息后才更新摘要
+    summary_max_tokens: int = 600               # 摘要本身的长度上限
+
+    @classmethod
+    def from_env(cls) -> 'ContextSettings':
+        model_budgets = {}
+        raw_budgets = os.getenv('CHAT_CONTEXT_MODEL_BUDGETS', '').strip()
+        if raw_budgets:
+            try:
+                model_budgets = {str(k): int(v) for k, v in json.loads(raw_budgets).items()}
+            except (ValueError, AttributeError) as e:
+                logger.error(f"CHAT_CONTEXT_MODEL_BUDGETS不是有效的JSON对象，已忽略: {e}")
+
+        return cls(
+            max_tokens=int(os.getenv('CHAT_CONTEXT_MAX_TOKENS', cls.max_tokens)),
+            model_budgets=model_budgets,
+            keep_turns=int(os.getenv('CHAT_CONTEXT_KEEP_TURNS', cls.keep_turns)),
+            summary_batch=int(os.getenv('CHAT_CONTEXT_SUMMARY_BATCH', cls.summary_batch)),
+            summary_max_tokens=int(os.getenv('CHAT_CONTEXT_SUMMARY_MAX_TOKENS', cls.summary_max_tokens))
+        )
+
+    def budget_for(self, model: str) -> int:
+        """精确匹配优先，其次取最长的前缀匹配"""
+        model = model or ''
+        if model in self.model_budgets:
+            return self.model_budgets[model]
+        prefixes = [name for name in self.model_budgets if model.startswith(name)]
+        if prefixes:
+            return self.model_budgets[max(prefixes, key=len)]
+        return self.max_tokens
+
+
+@dataclass
+class ContextPlan:
+    """一次请求的上下文组织结果"""
+
+    tail: List[Dict]                # 原样发送的最近消息
+    fold: List[Dict]                # 需要合并进摘要的消息，为空表示摘要无需更新
+    summary: Optional[str]          # 当前（更新前的）摘要
+
+
+class ContextWindowManager:
+    """
+    历史消息按token预算分为两部分：最近keep_turns轮原样发送，更早的折叠为摘要。
+    history中的消息需要带id，摘要记录到哪条消息为止由Conversation.summary_message_id保存。
+    """
+
+    _settings: Optional[ContextSettings] = None
+
+    def __init__(self, api_config: ApiConfig):
+        self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.counter = TokenCounter(api_config.model)
+
+    @classmethod
+    def settings(cls) -> ContextSettings:
+        if cls._settings is None:
+            cls._settings = ContextSettings.from_env()
+        return cls._settings
+
+    def plan(self, history: List[Dict], summary: Optional[str], summary_message_id: Optional[int],
+             reserved_tokens: int = 0) -> ContextPlan:
+        """
+        决定哪些消息原样发送、哪些需要合并进摘要
+
+        Args:
+            history: 按时间排序、带id的消息（包含本轮用户消息）
+            summary: 已保存的摘要
+            summary_message_id: 摘要已覆盖到的最后一条消息ID
+            reserved_tokens: 系统提示词等固定部分占用的token数
+        """
+        settings = self.settings()
+        covered = summary_message_id or 0
+        pending = [msg for msg in history if msg.get('id') is None or msg['id'] > covered]
+        if not summary:
+            pending = list(history)
+
+        budget = settings.budget_for(self.api_config.model) - reserved_tokens - self.counter.count_text(summary or '')
+        keep_messages = max(1, settings.keep_turns * 2)
+
+        # 从最新的消息开始，在预算和轮数限制内尽量多地原样保留
+        tail_start = len(pending)
+        used = 0
+        while tail_start > 0:
+            cost = self.counter.count_message(pending[tail_start - 1])
+            within_turns = len(pending) - tail_start < keep_messages
+            # 最新的一条消息无论多长都保留
+            if tail_start < len(pending) and (not within_turns or used + cost > budget):
+                break
+            used += cost
+            tail_start -= 1
+
+        overflow = pending[:tail_start]
+        # 窗口外的消息不多且总量仍在预算内时暂不更新摘要，避免每轮都多一次LLM调用
+        overflow_tokens = sum(self.counter.count_message(msg) for msg in overflow)
+        if len(overflow) < settings.summary_batch and used + overflow_tokens <= budget:
+            return ContextPlan(tail=pending, fold=[], summary=summary)
+
+        return ContextPlan(tail=pending[tail_start:], fold=overflow, summary=summary)
+
+    def backfill(self, plan: ContextPlan, reserved_tokens: int = 0) -> List[Dict]:
+        """
+        摘要还没有合并plan.fold时使用：在预算内把fold中较新的消息补回tail之前，
+        避免这些消息在后台摘要更新完成之前既不在摘要里也不在请求里
+        """
+        budget = self.settings().budget_for(self.api_config.model) - reserved_tokens \
+            - self.counter.count_text(plan.summary or '')
+        used = sum(self.counter.count_message(msg) for msg in plan.tail)
+        start = len(plan.fold)
+        while start > 0:
+            cost = self.counter.count_message(plan.fold[start - 1])
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 1
+        return plan.fold[start:] + plan.tail
+
+    def render(self, summary: Optional[str], tail: List[Dict]) -> List[Dict]:
+        """生成发送给模型的消息列表，只包含role和content"""
+        messages = []
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"以下是本次对话较早部分的摘要，请结合它理解后续对话:\n{summary}"
+            })
+        messages.extend({"role": msg["role"], "content": msg["content"]} for msg in tail)
+        return messages
+
+    def _build_summary_payload(self, summary: Optional[str], fold: List[Dict]) -> Dict:
+        """构建增量摘要请求载荷"""
+        transcript = "\n".join(
+            f"{'用户' if msg['role'] == 'user' else 'AI助手'}: {msg['content']}" for msg in fold)
+        previous = summary or "（暂无）"
+        return self.api_config.get_request_payload([
+            {
+                "role": "system",
+                "content": "你负责为英语学习对话维护一份滚动摘要。请把新增的对话内容合并进已有摘要，"
+                           "保留话题、用户提到的个人信息和偏好、尚未结束的问题以及双方的约定，"
+                           "删除寒暄和重复内容。只输出更新后的摘要正文。"
+            },
+            {
+                "role": "user",
+                "content": f"已有摘要:\n{previous}\n\n新增对话:\n{transcript}"
+            }
+        ], max_tokens=self.settings().summary_max_tokens, temperature=0.2)
+
+    def summarize(self, summary: Optional[str], fold: List[Dict]) -> str:
+        """把fold中的消息合并进摘要，失败时抛出异常"""
+        return self.ai_client.complete(self._build_summary_payload(summary, fold), timeout=30)
@@ -1,33 +1,105 @@
 from src.models import db
 from src.models.conversation import Conversation, Message
+from sqlalchemy import and_, or_, func, case, select, update
 from datetime import datetime
 
+# 会话列表中最后一条消息预览的长度（字符）
+PREVIEW_LENGTH = 50
+
 
 class ConversationService:
+    # 数据库是否对message外键执行级联删除，首次删除会话时检测
+    _cascade_supported = None
+
     @staticmethod
-    def get_conversations_by_user_id(user_id):
-        """根据用户ID获取会话列表，并附带最后一条消息预览。"""
-        conversations = Conversation.query.filter_by(
-            user_id=user_id).order_by(Conversation.created_at.desc()).all()
+    def get_conversations_by_user_id(user_id, limit=None, before=None):
+        """
+        根据用户ID获取会话列表，并附带最后一条消息预览和消息数。
+        预览和消息数读取会话表上随写入维护的冗余字段，只扫描conversation表，不访问message表。
 
-        conversations_data = []
-        for conv in conversations:
-            last_message = Message.query.filter_by(
-                conversation_id=conv.id, is_deleted=False).order_by(Message.created_at.desc()).first()
-            last_message_content = ""
-            if last_message:
-                last_message_content = last_message.content[:50] + "..." if len(
-                    last_message.content) > 50 else last_message.content
+        Args:
+            limit: 每页数量，为空时返回全部会话
+            before: 游标，上一页最后一个会话的ID，只返回排在它之后（更早创建）的会话
+        """
+        query = db.session.query(
+            Conversation.id, Conversation.title, Conversation.created_at,
+            Conversation.last_message_preview, Conversation.message_count
+        ).filter(Conversation.user_id == user_id)
+        if before is not None:
+            cursor = db.session.query(Conversation.created_at).filter(
+                Conversation.id == before, Conversation.user_id == user_id).scalar_subquery()
+            query = query.filter(or_(
+                Conversation.created_at < cursor,
+                and_(Conversation.created_at == cursor, Conversation.id < before)
+            ))
+        query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
 
-            conversations_data.append({
-                'id': conv.id,
-                'title': conv.title,
-                'created_at': conv.created_at.isoformat(),
-                'last_message': last_message_content,
-                'message_count': Message.query.filter_by(conversation_id=conv.id, is_deleted=False).count()
-            })
+        return [{
+            'id': conv_id,
+            'title': title,
+            'created_at': created_at.isoformat(),
+            'last_message': last_message_preview or "",
+            'message_count': message_count or 0
+        } for conv_id, title, created_at, last_message_preview, message_count in query.all()]
 
-        return conversations_data
+    @staticmethod
+    def message_preview(content):
+        """会话列表中显示的最后一条消息预览，与_stats_values中的SQL表达式保持一致。"""
+        if content is None:
+            return None
+        return content[:PREVIEW_LENGTH] + "..." if len(content) > PREVIEW_LENGTH else content
+
+    @staticmethod
+    def _stats_values():
+        """按message表重新计算会话冗余统计的关联子查询，用于UPDATE和一致性检查。"""
+        live = and_(Message.conversation_id == Conversation.id, Message.is_deleted == False)
+        last_content = select(Message.content).where(live) \
+            .order_by(Message.created_at.desc(), Message.id.desc()).limit(1).scalar_subquery()
+        return {
+            'message_count': select(func.count(Message.id)).where(live).scalar_subquery(),
+            'last_message_preview': case(
+                (func.length(last_content) > PREVIEW_LENGTH,
+                 func.substr(last_content, 1, PREVIEW_LENGTH).concat('...')),
+                else_=last_content),
+            'last_message_at': select(func.max(Message.created_at)).where(live).scalar_subquery()
+        }
+
+    @staticmethod
+    def refresh_conversation_stats(conversation_ids=None):
+        """
+        按message表重新计算会话的冗余统计（单条UPDATE），不提交，返回更新的会话数。
+        conversation_ids为空时更新全部会话（用于回填）。
+        """
+        db.session.flush()
+        statement = update(Conversation).values(**ConversationService._stats_values())
+        if conversation_ids is not None:
+            statement = statement.where(Conversation.id.in_(conversation_ids))
+        return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+    @staticmethod
+    def find_inconsistent_stats(limit=100):
+        """一致性检查：返回冗余统计与message表不一致的会话。"""
+        expected = ConversationService._stats_values()
+        expected_count = expected['message_count'].label('expected_message_count')
+        expected_preview = expected['last_message_preview'].label('expected_last_message_preview')
+        expected_at = expected['last_message_at'].label('expected_last_message_at')
+        rows = db.session.query(
+            Conversation.id, Conversation.message_count, expected_count,
+            Conversation.last_message_preview, expected_preview,
+            Conversation.last_message_at, expected_at
+        ).filter(or_(
+            Conversation.message_count.is_distinct_from(expected['message_count']),
+            Conversation.last_message_preview.is_distinct_from(expected['last_message_preview']),
+            Conversation.last_message_at.is_distinct_from(expected['last_message_at'])
+        )).order_by(Conversation.id).limit(limit).all()
+        return [{
+            'conversation_id': row[0],
+            'message_count': (row[1], row[2]),
+            'last_message_preview': (row[3], row[4]),
+            'last_message_at': (row[5], row[6])
+        } for row in rows]
 
     @staticmethod
     def get_messages_by_conversation_id(conversation_id, user_id):
@@ -42,20 +114,92 @@ class ConversationService:
         return messages, None
 
     @staticmethod
-    def delete_conversation(conversation_id, user_id):
-        """删除一个会话，并验证所有权。"""
+    def get_message_page(conversation_id, user_id, limit, before_id=None):
+        """
+        按游标分页获取会话消息，验证所有权。
+        按(created_at, id)倒序取最新的limit条，before_id为上一页最早一条消息的ID，
+        每页的代价只与limit有关，与会话长度无关。
+
+        Returns:
+            (会话, 按时间正序排列的消息列表, 是否还有更早的消息, 错误信息)
+        """
         conversation = Conversation.query.filter_by(
             id=conversation_id, user_id=user_id).first()
         if not conversation:
+            return None, None, False, "Conversation not found or access denied."
+
+        query = Message.query.filter(
+            Message.conversation_id == conversation_id,
+            Message.is_deleted == False
+        )
+        if before_id is not None:
+            cursor = db.session.query(Message.created_at).filter(
+                Message.id == before_id, Message.conversation_id == conversation_id).scalar_subquery()
+            query = query.filter(or_(
+                Message.created_at < cursor,
+                and_(Message.created_at == cursor, Message.id < before_id)
+            ))
+        # 多取一条用于判断是否还有更早的消息
+        messages = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        messages.reverse()
+        return conversation, messages, has_more, None
+
+    @staticmethod
+    def delete_conversation(conversation_id, user_id):
+        """删除一个会话，并验证所有权。"""
+        deleted, error = ConversationService.delete_conversations([conversation_id], user_id)
+        if error:
+            return False, f"Failed to delete conversation: {error}"
+        if not deleted:
             return False, "Conversation not found or access denied."
+        return True, "Conversation deleted successfully."
 
+    @classmethod
+    def _database_cascades(cls):
+        """message表的外键是否由数据库执行ON DELETE CASCADE（检查一次后缓存）。"""
+        if cls._cascade_supported is None:
+            if db.engine.dialect.name == 'sqlite':
+                # SQLite默认不启用外键约束，级联不会生效
+                cls._cascade_supported = False
+            else:
+                foreign_keys = db.inspect(db.engine).get_foreign_keys('message')
+                cls._cascade_supported = any(
+                    fk['referred_table'] == 'conversation' and
+                    (fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE'
+                    for fk in foreign_keys)
+        return cls._cascade_supported
+
+    @staticmethod
+    def delete_conversations(conversation_ids, user_id):
+        """
+        批量删除会话，只删除属于该用户的会话，返回(实际删除的会话ID列表, 错误信息)。
+        使用集合DELETE语句，不把会话和消息加载为ORM对象；数据库支持ON DELETE CASCADE时消息由外键级联删除，
+        否则先用一条DELETE删除这些会话的消息。
+        """
+        if not conversation_ids:
+            return [], None
         try:
-            db.session.delete(conversation)
+            owned = [row[0] for row in db.session.query(Conversation.id).filter(
+                Conversation.id.in_(conversation_ids),
+                Conversation.user_id == user_id
+            ).all()]
+            if not owned:
+                return [], None
+
+            if not ConversationService._database_cascades():
+                Message.query.filter(Message.conversation_id.in_(owned)) \
+                    .delete(synchronize_session=False)
+            Conversation.query.filter(
+                Conversation.id.in_(owned),
+                Conversation.user_id == user_id
+            ).delete(synchronize_session=False)
             db.session.commit()
-            return True, "Conversation deleted successfully."
+            return owned, None
         except Exception as e:
             db.session.rollback()
-            return False, f"Failed to delete conversation: {str(e)}"
+            return [], str(e)
 
     @staticmethod
     def create_or_get_conversation(user_id, conversation_id=None, first_message="", mode='free_chat', mode_config=None):
@@ -81,19 +225,116 @@ class ConversationService:
         return new_conversation
 
     @staticmethod
-    def add_message(conversation_id, role, content, corrections=None, optimization=None):
-        """向会话中添加一条新消息。"""
+    def add_message(conversation_id, role, content, corrections=None, optimization=None, feedback_status=None):
+        """向会话中添加一条新消息，并在同一事务中更新会话的冗余统计。"""
+        now = datetime.utcnow()
         message = Message(
             conversation_id=conversation_id,
             role=role,
             content=content,
             corrections=corrections,
-            optimization=optimization
+            optimization=optimization,
+            feedback_status=feedback_status,
+            created_at=now
         )
         db.session.add(message)
+        # 计数在数据库中自增，并发写入同一会话时不会丢失更新
+        Conversation.query.filter_by(id=conversation_id).update({
+            Conversation.message_count: Conversation.message_count + 1,
+            Conversation.last_message_preview: ConversationService.message_preview(content),
+            Conversation.last_message_at: now
+        }, synchronize_session=False)
+        db.session.commit()
+        return message
+
+    @staticmethod
+    def update_message_feedback(message_id, corrections=None, optimization=None, feedback_status='complete'):
+        """写入消息的纠错和优化结果。"""
+        message = Message.query.get(message_id)
+        if not message:
+            return None
+        message.corrections = corrections
+        message.optimization = optimization
+        message.feedback_status = feedback_status
         db.session.commit()
         return message
 
+    @staticmethod
+    def get_message_feedback(message_ids, user_id):
+        """批量获取消息的纠错状态和结果，只返回属于该用户的消息。"""
+        if not message_ids:
+            return []
+        messages = Message.query.join(Conversation).filter(
+            Message.id.in_(message_ids),
+            Conversation.user_id == user_id
+        ).all()
+        return [{
+            'user_message_id': message.id,
+            'feedback_status': message.feedback_status,
+            'grammar_corrections': message.corrections,
+            'optimization': message.optimization
+        } for message in messages]
+
+    @staticmethod
+    def get_feedback_updates(user_id, since):
+        """获取某时间之后完成反馈的用户消息（SSE连接用于接收其他进程产生的结果）。"""
+        messages = Message.query.join(Conversation).filter(
+            Conversation.user_id == user_id,
+            Message.role == 'user',
+            Message.feedback_status.in_(('complete', 'failed')),
+            Message.updated_at >= since
+        ).order_by(Message.updated_at.asc()).limit(100).all()
+        return [{
+            'user_message_id': message.id,
+            'feedback_status': message.feedback_status,
+            'grammar_corrections': message.corrections,
+            'optimization': message.optimization,
+            'updated_at': message.updated_at
+        } for message in messages]
+
+    @staticmethod
+    def get_summary_state(conversation_id):
+        """
+        读取会话的滚动摘要和摘要之后的消息，供后台刷新摘要使用。
+
+        Returns:
+            (摘要, 摘要覆盖到的最后一条消息ID, 之后按时间排序的消息列表)；会话不存在时返回None
+        """
+        conversation = Conversation.query.get(conversation_id)
+        if not conversation:
+            return None
+
+        query = Message.query.filter(
+            Message.conversation_id == conversation_id, Message.is_deleted == False)
+        if conversation.context_summary and conversation.summary_message_id:
+            query = query.filter(Message.id > conversation.summary_message_id)
+        messages = query.order_by(Message.created_at.asc()).all()
+        history = [{"id": msg.id, "role": msg.role, "content": msg.content} for msg in messages]
+        return conversation.context_summary, conversation.summary_message_id, history
+
+    @staticmethod
+    def update_context_summary(conversation_id, summary, summary_message_id, previous_message_id):
+        """
+        保存会话的滚动摘要及其覆盖到的最后一条消息ID。
+        只有摘要仍停留在previous_message_id、且新摘要覆盖到的消息没有被删除时才写入，
+        生成摘要期间会话被编辑截断或已被其他任务更新时放弃本次结果。返回是否写入。
+        """
+        if previous_message_id is None:
+            unchanged = Conversation.summary_message_id.is_(None)
+        else:
+            unchanged = Conversation.summary_message_id == previous_message_id
+        covered_alive = Message.query.filter(
+            Message.id == summary_message_id, Message.is_deleted == False).exists()
+
+        updated = Conversation.query.filter(
+            Conversation.id == conversation_id, unchanged, covered_alive
+        ).update({
+            Conversation.context_summary: summary,
+            Conversation.summary_message_id: summary_message_id
+        }, synchronize_session=False)
+        db.session.commit()
+        return updated > 0
+
     @staticmethod
     def update_message(message_id, user_id, new_content):
         """编辑用户消息内容。"""
@@ -113,6 +354,8 @@ class ConversationService:
         try:
             message.content = new_content
             message.updated_at = datetime.utcnow()
+            # 编辑的可能是最后一条消息，预览需要同步
+            ConversationService.refresh_conversation_stats([message.conversation_id])
             db.session.commit()
             return message, None
         except Exception as e:
@@ -138,6 +381,7 @@ class ConversationService:
         try:
             message.is_deleted = True
             message.updated_at = datetime.utcnow()
+            ConversationService.refresh_conversation_stats([message.conversation_id])
             db.session.commit()
             return True, "Message deleted successfully."
         except Exception as e:
@@ -157,6 +401,18 @@ class ConversationService:
             
         return message, None
 
+    @staticmethod
+    def _soft_delete_after(message, now):
+        """把同一会话中晚于指定消息的所有消息标记为已删除（单条UPDATE），不提交，返回影响的行数。"""
+        return Message.query.filter(
+            Message.conversation_id == message.conversation_id,
+            Message.created_at > message.created_at,
+            Message.is_deleted == False
+        ).update({
+            Message.is_deleted: True,
+            Message.updated_at: now
+        }, synchronize_session=False)
+
     @staticmethod
     def delete_messages_after(message_id, user_id):
         """删除指定消息之后的所有消息。"""
@@ -170,22 +426,65 @@ class ConversationService:
             if not message:
                 return False, "Message not found or access denied."
             
-            conversation_id = message.conversation_id
-            
-            # 删除该消息之后创建的所有消息
-            messages_to_delete = Message.query.filter(
-                Message.conversation_id == conversation_id,
-                Message.created_at > message.created_at,
-                Message.is_deleted == False
-            ).all()
-            
-            for msg in messages_to_delete:
-                msg.is_deleted = True
-                msg.updated_at = datetime.utcnow()
-            
+            deleted = ConversationService._soft_delete_after(message, datetime.utcnow())
+            ConversationService.refresh_conversation_stats([message.conversation_id])
             db.session.commit()
-            return True, f"Deleted {len(messages_to_delete)} messages after the specified message."
+            return True, f"Deleted {deleted} messages after the specified message."
             
         except Exception as e:
             db.session.rollback()
             return False, f"Failed to delete messages: {str(e)}"
+
+    @staticmethod
+    def edit_and_truncate(message_id, user_id, new_content):
+        """
+        编辑用户消息并删除其后的所有消息，在同一个事务中完成并只提交一次。
+        返回重新生成所需的会话信息和截断后的历史（已包含编辑后的内容），调用方无需再次查询。
+        摘要覆盖到被删除的消息时一并清空，下一次请求会按截断后的历史重新生成。
+        """
+        row = db.session.query(Message, Conversation).join(Conversation).filter(
+            Message.id == message_id,
+            Conversation.user_id == user_id,
+            Message.role == 'user'  # 只允许编辑用户消息
+        ).first()
+        if not row:
+            return None, "Message not found or access denied."
+
+        message, conversation = row
+        if message.is_deleted:
+            return None, "Cannot edit a deleted message."
+
+        try:
+            now = datetime.utcnow()
+            message.content = new_content
+            message.updated_at = now
+
+            # 保留下来的历史就是该消息及其之前的消息，在删除之前一次读出
+            kept = Message.query.filter(
+                Message.conversation_id == conversation.id,
+                Message.created_at <= message.created_at,
+                Message.is_deleted == False
+            ).order_by(Message.created_at.asc()).all()
+            history = [{"id": msg.id, "role": msg.role, "content": msg.content} for msg in kept]
+
+            ConversationService._soft_delete_after(message, now)
+            ConversationService.refresh_conversation_stats([conversation.id])
+
+            if conversation.summary_message_id and conversation.summary_message_id >= message.id:
+                conversation.context_summary = None
+                conversation.summary_message_id = None
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return None, f"Failed to update message: {str(e)}"
+
+        return {
+            "message": message.to_dict(),
+            "conversation_id": conversation.id,
+            "mode": conversation.mode,
+            "mode_config": conversation.mode_config,
+            "history": history,
+            "context_summary": conversation.context_summary,
+            "summary_message_id": conversation.summary_message_id
+        }, None
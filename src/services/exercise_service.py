@@ -1,11 +1,12 @@
 import requests
-import json
 import re
-import time
 import logging
 from typing import List, Dict
 
 from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.resilience import CircuitOpenError
+from ..utils.json_extractor import JsonExtractionError
 
 logger = logging.getLogger(__name__)
 
@@ -15,13 +16,12 @@ class ExerciseService:
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
 
     def generate_exercises(self, grammar_point: Dict, count: int = 10, difficulty: str = "medium") -> List[Dict]:
         """使用AI生成语法练习题"""
         print(f"[DEBUG] 开始AI生成练习题，语法点: {grammar_point.get('name')}")
 
-        headers = self.api_config.get_headers()
-
         # 构建生成练习题的系统提示
         difficulty_map = {
             'easy': '简单',
@@ -98,88 +98,26 @@ class ExerciseService:
             "temperature": 0.3   # 降低随机性以提高稳定性
         }
 
-        max_retries = 3
-        retry_delay = 2
-
-        for attempt in range(max_retries):
-            try:
-                print(
-                    f"[DEBUG] 发送生成练习题请求到: {self.api_config.chat_completions_url} (尝试 {attempt + 1})")
-                response = requests.post(
-                    self.api_config.chat_completions_url, headers=headers, json=payload, timeout=30)
-
-                if response.status_code == 429:
-                    print(f"[WARN] 收到 429 速率限制错误。将在 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
-                elif response.status_code == 503:
-                    print(f"[WARN] 收到 503 服务不可用错误。尝试降级请求参数...")
-                    # 降级策略：减少token数量和简化请求
-                    if payload["max_tokens"] > 800000:
-                        payload["max_tokens"] = 800000
-                        payload["temperature"] = 0.1
-                        if attempt < max_retries - 1:
-                            time.sleep(retry_delay * 2)  # 更长的重试间隔
-                            continue
-
-                print(f"[DEBUG] 练习题生成API响应状态码: {response.status_code}")
-                response.raise_for_status()
-
-                if not response.text.strip():
-                    print("[ERROR] API响应内容为空")
-                    raise Exception("API响应内容为空")
-
-                result = response.json()
-                content = result["choices"][0]["message"]["content"].strip()
-                print(f"[DEBUG] AI练习题生成原始响应: {content}")
-
-                # 尝试直接解析JSON
-                try:
-                    exercises = json.loads(content)
-                    if isinstance(exercises, list) and len(exercises) > 0:
-                        print(f"[DEBUG] 成功生成 {len(exercises)} 道练习题")
-                        return exercises
-                    else:
-                        print("[ERROR] AI返回的不是有效的练习题数组")
-                        raise Exception("AI返回的不是有效的练习题数组")
-                except json.JSONDecodeError:
-                    # 如果直接解析失败，尝试提取JSON代码块
-                    json_match = re.search(
-                        r"```json\s*([\s\S]*?)\s*```", content)
-                    if json_match:
-                        json_str = json_match.group(1).strip()
-                        exercises = json.loads(json_str)
-                        if isinstance(exercises, list) and len(exercises) > 0:
-                            print(f"[DEBUG] 从代码块中成功解析 {len(exercises)} 道练习题")
-                            return exercises
-
-                    # 如果还是失败，尝试提取数组部分
-                    array_match = re.search(r'\[([\s\S]*)\]', content)
-                    if array_match:
-                        array_str = '[' + array_match.group(1) + ']'
-                        exercises = json.loads(array_str)
-                        if isinstance(exercises, list) and len(exercises) > 0:
-                            print(f"[DEBUG] 从数组匹配中成功解析 {len(exercises)} 道练习题")
-                            return exercises
-
-                    print(f"[ERROR] 无法解析AI返回的JSON: {content}")
-                    raise Exception(f"无法解析AI返回的练习题JSON: {content}")
-
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] 练习题生成API请求失败: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    raise Exception(f"练习题生成API请求失败: {e}")
-            except Exception as e:
-                print(f"[ERROR] 练习题生成发生未知错误: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    raise Exception(f"练习题生成失败: {e}")
-
-        print("[ERROR] 所有重试尝试均失败")
-        raise Exception("所有重试尝试均失败")
+        try:
+            print(f"[DEBUG] 发送生成练习题请求到: {self.api_config.chat_completions_url}")
+            # 传输层重试（429/5xx/网络错误）由AIApiClient的熔断与退避策略处理，
+            # 只有输出无法解析为练习题数组时才会重新请求
+            exercises = self.ai_client.complete_json(
+                payload, timeout=30, max_retries=3, coalesce=True, expect=list, parse_retries=2,
+                label='exercises')
+        except JsonExtractionError as e:
+            print(f"[ERROR] 无法解析AI返回的JSON: {e.content}")
+            raise Exception(f"无法解析AI返回的练习题JSON: {e.content}")
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            print(f"[ERROR] 练习题生成API请求失败: {e}")
+            raise Exception(f"练习题生成API请求失败: {e}")
+
+        if not exercises:
+            print("[ERROR] AI返回的不是有效的练习题数组")
+            raise Exception("AI返回的不是有效的练习题数组")
+
+        print(f"[DEBUG] 成功生成 {len(exercises)} 道练习题")
+        return exercises
 
     @staticmethod
     def verify_answer(user_answer: str, correct_answer: str) -> bool:
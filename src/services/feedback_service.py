@@ -0,0 +1,90 @@
+"""
+延迟反馈服务 - 聊天回复先返回，纠错和CET4优化在后台生成
+结果写入Message.corrections/optimization，并通过UserEventBus推送给该用户的SSE连接；
+CHAT_FEEDBACK_BACKEND=queue时，使用服务器默认配置的任务写入持久化队列，由worker.py执行
+"""
+
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from src.services.conversation_service import ConversationService
+from src.services.translation_client import TranslationClient
+from src.services.job_queue import JobQueue
+from ..config.api_config import ApiConfig, ApiConfigFactory
+from ..utils.event_bus import UserEventBus
+
+logger = logging.getLogger(__name__)
+
+# 后台任务的执行方式：thread在当前进程的线程池中执行，queue写入持久化任务队列
+CHAT_FEEDBACK_BACKEND = os.getenv('CHAT_FEEDBACK_BACKEND', 'thread').lower()
+
+# 持久化队列中反馈任务的优先级，高于摘要、预生成等批量任务
+FEEDBACK_JOB_PRIORITY = 10
+
+
+class DeferredFeedback:
+    """后台执行纠错和优化任务的共享线程池"""
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=int(os.getenv('CHAT_FEEDBACK_WORKERS', 8)),
+                        thread_name_prefix='chat-feedback')
+        return cls._executor
+
+    @classmethod
+    def submit(cls, app, api_config: ApiConfig, user_id: int, message_id: int, user_message: str, history: List[Dict]) -> None:
+        """
+        提交后台任务；任务在新的线程上下文中执行，不继承请求的截止时间
+
+        Args:
+            app: Flask应用，任务写数据库时推入其应用上下文
+            history: 保存用户消息之前的对话历史
+        """
+        if CHAT_FEEDBACK_BACKEND == 'queue' and ApiConfigFactory.is_server_config(api_config):
+            # 队列中只保存消息数据，worker使用服务器默认配置，用户自带的API密钥不落库
+            JobQueue.enqueue('chat_feedback', {
+                "user_id": user_id,
+                "message_id": message_id,
+                "user_message": user_message,
+                "history": history
+            }, priority=FEEDBACK_JOB_PRIORITY)
+            return
+        cls.executor().submit(cls._run, app, api_config, user_id, message_id, user_message, history)
+
+    @classmethod
+    def _run(cls, app, api_config: ApiConfig, user_id: int, message_id: int, user_message: str, history: List[Dict]) -> None:
+        feedback_status = "complete"
+        try:
+            _, corrections, optimization = TranslationClient(api_config).process_user_input_strict(user_message, history)
+        except Exception as e:
+            logger.error(f"Deferred feedback for message {message_id} failed: {e}")
+            corrections, optimization, feedback_status = None, None, "failed"
+
+        try:
+            with app.app_context():
+                cls.save_result(user_id, message_id, corrections, optimization, feedback_status)
+        except Exception as e:
+            logger.error(f"Failed to save deferred feedback for message {message_id}: {e}")
+
+    @staticmethod
+    def save_result(user_id: int, message_id: int, corrections: Optional[Dict], optimization: Optional[Dict], feedback_status: str) -> None:
+        """写入反馈结果并推送给当前进程内该用户的SSE连接（需要应用上下文）"""
+        ConversationService.update_message_feedback(
+            message_id, corrections=corrections, optimization=optimization,
+            feedback_status=feedback_status)
+        UserEventBus.publish(user_id, 'feedback', {
+            "user_message_id": message_id,
+            "feedback_status": feedback_status,
+            "grammar_corrections": corrections,
+            "optimization": optimization
+        })
@@ -1,11 +1,11 @@
 import requests
-import json
-import re
-import time
 import logging
 from typing import Optional, Dict
 
 from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.async_ai_client import AsyncAIApiClient
+from ..utils.json_extractor import JsonExtractionError
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +15,11 @@ class GrammarCorrection:
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.async_client = AsyncAIApiClient(api_config)
 
-    def get_detailed_corrections(self, text: str) -> Optional[Dict]:
-        """
-        分析用户输入的翻译和语法错误，
-        返回详细的修正说明。
-        """
-        print(f"[DEBUG] 开始详细语法检查和翻译，文本: {text}")
-
-        headers = self.api_config.get_headers()
-
+    def _build_detailed_payload(self, text: str) -> Dict:
+        """构建详细纠错请求载荷"""
         system_prompt = """你是一位顶级的英语语法和翻译专家。你的任务是精确分析用户提供的句子，并始终返回一个结构化、详细的JSON对象。
 
 **JSON结构要求:**
@@ -61,7 +56,7 @@ class GrammarCorrection:
 }
 ```"""
 
-        payload = self.api_config.get_request_payload([
+        return self.api_config.get_request_payload([
                 {
                     "role": "system",
                     "content": system_prompt
@@ -72,91 +67,53 @@ class GrammarCorrection:
                 }
         ], max_tokens=1000000, temperature=0.1)
 
-        max_retries = 3
-        retry_delay = 2
-
-        for attempt in range(max_retries):
-            try:
-                print(
-                    f"[DEBUG] 发送详细修正请求到: {self.api_config.chat_completions_url} (尝试 {attempt + 1})")
-                response = requests.post(
-                    self.api_config.chat_completions_url, headers=headers, json=payload, timeout=40)
-
-                if response.status_code == 429:
-                    print(f"[WARN] 收到 429 速率限制错误。将在 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
-
-                print(f"[DEBUG] 详细修正API响应状态码: {response.status_code}")
-                response.raise_for_status()
-
-                # 检查响应内容是否为空
-                if not response.text.strip():
-                    print("[ERROR] API响应内容为空")
-                    raise Exception("API响应内容为空")
-
-                result = response.json()
-                content = result["choices"][0]["message"]["content"].strip()
-                print(f"[DEBUG] 详细修正原始响应: {content}")
-
-                # 使用正则表达式从响应中提取JSON
-                json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-
-                if not json_match:
-                    print(f"[DEBUG] AI响应中未找到有效的JSON代码块。响应内容: '{content}'")
-                    # 如果没有找到JSON，那么可能AI认为这句话不需要修正
-                    return None
-
-                json_str = json_match.group(1).strip()
-
-                try:
-                    # 解析提取出的JSON字符串
-                    correction_data = json.loads(json_str)
-                except json.JSONDecodeError as e:
-                    print(f"[ERROR] 从提取的字符串中解析JSON失败: {e}")
-                    print(f"[ERROR] 无法解析的JSON字符串: '{json_str}'")
-                    raise Exception(f"JSON解析错误: {json_str}")
-
-                if "original_sentence" in correction_data and "corrected_sentence" in correction_data and "corrections" in correction_data:
-                    original = correction_data.get("original_sentence")
-                    corrected = correction_data.get("corrected_sentence")
-                    has_no_corrections = not correction_data.get("corrections")
-
-                    if has_no_corrections and original == corrected:
-                        print("[DEBUG] AI返回无错误且句子无变化")
-                        return None
-
-                    print(f"[DEBUG] 解析后的详细修正数据: {correction_data}")
-                    return correction_data
-                else:
-                    print("[DEBUG] AI返回的JSON结构不符合预期")
-                    raise Exception("AI返回的JSON结构不符合预期")
-
-            except json.JSONDecodeError as e:
-                print(f"[ERROR] JSON解析错误: {e}")
-                print(f"[ERROR] 无法解析的原始AI响应内容: '{content}'")
-                raise Exception(f"JSON解析错误: {content}")
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] 详细修正API请求失败: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    raise Exception(f"详细修正API请求失败: {e}")
-            except Exception as e:
-                print(f"[ERROR] 详细修正发生未知错误: {e}")
-                raise Exception(f"详细修正发生未知错误: {e}")
-
-        print("[ERROR] 所有重试尝试均失败")
-        raise Exception("所有重试尝试均失败")
+    def _interpret_detailed(self, correction_data: Dict) -> Optional[Dict]:
+        """检查详细纠错结果的结构，无需修正时返回None，结构异常时抛出异常"""
+        if "original_sentence" in correction_data and "corrected_sentence" in correction_data and "corrections" in correction_data:
+            original = correction_data.get("original_sentence")
+            corrected = correction_data.get("corrected_sentence")
+            has_no_corrections = not correction_data.get("corrections")
 
-    def get_context_aware_corrections(self, text: str, context_info: str) -> Optional[Dict]:
+            if has_no_corrections and original == corrected:
+                print("[DEBUG] AI返回无错误且句子无变化")
+                return None
+
+            print(f"[DEBUG] 解析后的详细修正数据: {correction_data}")
+            return correction_data
+        else:
+            print("[DEBUG] AI返回的JSON结构不符合预期")
+            raise Exception("AI返回的JSON结构不符合预期")
+
+    def get_detailed_corrections(self, text: str) -> Optional[Dict]:
         """
-        根据上下文进行语法纠错
+        分析用户输入的翻译和语法错误，
+        返回详细的修正说明。
         """
-        print(f"[DEBUG] 开始上下文感知语法检查，文本: {text}")
+        print(f"[DEBUG] 开始详细语法检查和翻译，文本: {text}")
 
-        headers = self.api_config.get_headers()
+        payload = self._build_detailed_payload(text)
 
+        try:
+            print(f"[DEBUG] 发送详细修正请求到: {self.api_config.chat_completions_url}")
+            # 传输层重试（429/5xx/网络错误）由AIApiClient的熔断与退避策略处理，
+            # 只有输出无法解析时才会重新请求
+            correction_data = self.ai_client.complete_json(
+                payload, timeout=40, cache=True, max_retries=3, coalesce=True,
+                label='grammar_detailed')
+            return self._interpret_detailed(correction_data)
+
+        except JsonExtractionError as e:
+            print(f"[ERROR] 无法解析的原始AI响应内容: '{e.content}'")
+            raise Exception(f"JSON解析错误: {e.content}")
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] 详细修正API请求失败: {e}")
+            raise Exception(f"详细修正API请求失败: {e}")
+        except Exception as e:
+            print(f"[ERROR] 详细修正发生未知错误: {e}")
+            raise Exception(f"详细修正发生未知错误: {e}")
+
+    def _build_context_aware_payload(self, text: str, context_info: str) -> Dict:
+        """构建上下文感知纠错请求载荷"""
         system_prompt = f"""你是一位顶级的英语语法和翻译专家。你的任务是根据对话上下文，精确分析用户提供的句子，并返回结构化的JSON对象。
 
 **对话上下文信息:**
@@ -185,7 +142,7 @@ class GrammarCorrection:
 *   **无错误处理:** 如果句子在上下文中被视为合适，`corrected_sentence` 应与 `original_sentence` 相同，`corrections` 列表必须为空 `[]`。
 *   **严禁额外文本:** 绝对不要在JSON对象之外返回任何文本、注释或解释。"""
 
-        payload = self.api_config.get_request_payload([
+        return self.api_config.get_request_payload([
                 {
                     "role": "system",
                     "content": system_prompt
@@ -196,20 +153,45 @@ class GrammarCorrection:
                 }
         ], max_tokens=1000000, temperature=0.1)
 
+    def get_context_aware_corrections(self, text: str, context_info: str) -> Optional[Dict]:
+        """
+        根据上下文进行语法纠错
+        """
+        print(f"[DEBUG] 开始上下文感知语法检查，文本: {text}")
+
+        payload = self._build_context_aware_payload(text, context_info)
+
         try:
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=40)
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip()
-
-            # 解析JSON结果
-            json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-            if json_match:
-                json_str = json_match.group(1).strip()
-                return json.loads(json_str)
+            return self.ai_client.complete_json(
+                payload, timeout=40, cache=True, coalesce=True, label='grammar_context')
+        except Exception as e:
+            print(f"[ERROR] 上下文感知语法纠错失败: {e}")
             return None
 
+    async def get_detailed_corrections_async(self, text: str) -> Optional[Dict]:
+        """详细纠错（异步版本），请求失败或结构异常时抛出异常"""
+        print(f"[DEBUG] 开始详细语法检查和翻译(async)，文本: {text}")
+
+        payload = self._build_detailed_payload(text)
+
+        try:
+            correction_data = await self.async_client.complete_json(
+                payload, timeout=40, cache=True, max_retries=3, coalesce=True,
+                label='grammar_detailed')
+        except JsonExtractionError as e:
+            print(f"[ERROR] 无法解析的原始AI响应内容: '{e.content}'")
+            raise Exception(f"JSON解析错误: {e.content}")
+        return self._interpret_detailed(correction_data)
+
+    async def get_context_aware_corrections_async(self, text: str, context_info: str) -> Optional[Dict]:
+        """上下文感知纠错（异步版本）"""
+        print(f"[DEBUG] 开始上下文感知语法检查(async)，文本: {text}")
+
+        payload = self._build_context_aware_payload(text, context_info)
+
+        try:
+            return await self.async_client.complete_json(
+                payload, timeout=40, cache=True, coalesce=True, label='grammar_context')
         except Exception as e:
             print(f"[ERROR] 上下文感知语法纠错失败: {e}")
-            return None
\ No newline at end of file
+            return None
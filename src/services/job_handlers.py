@@ -0,0 +1,46 @@
+"""
+持久化队列的任务处理函数 - worker.py导入本模块完成注册
+处理函数在应用上下文中执行，抛出异常时任务按退避策略重试
+"""
+
+import logging
+
+from src.models.job import Job
+from src.services.job_queue import JobRegistry
+from src.services.feedback_service import DeferredFeedback
+from src.services.summary_service import ConversationSummarizer, SUMMARY_JOB_VISIBILITY_TIMEOUT
+from src.services.translation_client import TranslationClient
+from ..config.api_config import ApiConfigFactory
+
+logger = logging.getLogger(__name__)
+
+
+@JobRegistry.register('chat_feedback', concurrency=8, visibility_timeout=180)
+def process_chat_feedback(job: Job) -> None:
+    """延迟反馈：为用户消息生成纠错和CET4优化结果"""
+    payload = job.payload
+    api_config = ApiConfigFactory.get_env_config_safe()
+    if api_config is None:
+        raise RuntimeError("服务器未配置默认AI设置，无法执行反馈任务")
+
+    _, corrections, optimization = TranslationClient(api_config).process_user_input_strict(
+        payload["user_message"], payload.get("history") or [])
+    DeferredFeedback.save_result(payload["user_id"], payload["message_id"], corrections, optimization, "complete")
+
+
+@JobRegistry.on_failed('chat_feedback')
+def chat_feedback_failed(job: Job) -> None:
+    """重试次数用完或可见性超时被回收时更新消息状态，避免一直停留在pending"""
+    payload = job.payload
+    DeferredFeedback.save_result(payload["user_id"], payload["message_id"], None, None, "failed")
+
+
+@JobRegistry.register('context_summary', concurrency=2, visibility_timeout=SUMMARY_JOB_VISIBILITY_TIMEOUT)
+def process_context_summary(job: Job) -> None:
+    """会话摘要：把移出上下文窗口的消息合并进滚动摘要"""
+    payload = job.payload
+    api_config = ApiConfigFactory.get_env_config_safe()
+    if api_config is None:
+        raise RuntimeError("服务器未配置默认AI设置，无法执行摘要任务")
+
+    ConversationSummarizer.refresh(api_config, payload["conversation_id"], payload.get("reserved_tokens", 0))
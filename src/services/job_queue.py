@@ -0,0 +1,273 @@
+"""
+持久化任务队列 - 使用现有数据库保存后台任务，不依赖外部消息中间件
+支持优先级、带退避的重试、可见性超时和按任务类型的并发上限；
+PostgreSQL上用 FOR UPDATE SKIP LOCKED 领取任务，SQLite上用带条件的UPDATE抢占
+（SQLite同一时刻只允许一个写事务，条件UPDATE本身就是原子的）
+"""
+
+import json
+import os
+import random
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, or_, func
+
+from src.models import db
+from src.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobSpec:
+    """任务类型的处理函数和执行限制"""
+
+    job_type: str
+    handler: Callable[[Job], None]
+    concurrency: Optional[int] = None    # 所有worker合计同时执行的上限，None表示不限
+    visibility_timeout: int = 300        # 领取后多久未完成视为worker失联（秒）
+    max_attempts: int = 3
+    on_failed: Optional[Callable[[Job], None]] = None  # 任务最终失败（含可见性超时被回收）时调用
+
+
+class JobRegistry:
+    """任务类型注册表，处理函数在worker进程中通过register装饰器注册"""
+
+    _specs: Dict[str, JobSpec] = {}
+
+    @classmethod
+    def register(cls, job_type: str, concurrency: Optional[int] = None, visibility_timeout: int = 300, max_attempts: int = 3):
+        def decorator(handler: Callable[[Job], None]) -> Callable[[Job], None]:
+            cls._specs[job_type] = JobSpec(
+                job_type=job_type,
+                handler=handler,
+                concurrency=cls._concurrency_override(job_type, concurrency),
+                visibility_timeout=visibility_timeout,
+                max_attempts=max_attempts
+            )
+            return handler
+        return decorator
+
+    @classmethod
+    def on_failed(cls, job_type: str):
+        """注册任务最终失败时的回调，用于把关联数据更新为终态；需在register之后使用"""
+        def decorator(callback: Callable[[Job], None]) -> Callable[[Job], None]:
+            cls._specs[job_type].on_failed = callback
+            return callback
+        return decorator
+
+    @staticmethod
+    def _concurrency_override(job_type: str, default: Optional[int]) -> Optional[int]:
+        """JOB_TYPE_CONCURRENCY（JSON对象）可以覆盖代码中的并发上限"""
+        raw = os.getenv('JOB_TYPE_CONCURRENCY', '').strip()
+        if not raw:
+            return default
+        try:
+            overrides = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.error(f"JOB_TYPE_CONCURRENCY不是有效的JSON，已忽略: {e}")
+            return default
+        value = overrides.get(job_type, default)
+        return int(value) if value is not None else None
+
+    @classmethod
+    def get(cls, job_type: str) -> Optional[JobSpec]:
+        return cls._specs.get(job_type)
+
+    @classmethod
+    def job_types(cls) -> List[str]:
+        return list(cls._specs)
+
+
+class JobQueue:
+    """任务的入队、领取和结果回写，所有方法都需要在Flask应用上下文中调用"""
+
+    retry_base_seconds = float(os.getenv('JOB_RETRY_BASE_SECONDS', 5))
+    retry_max_seconds = float(os.getenv('JOB_RETRY_MAX_SECONDS', 300))
+
+    @staticmethod
+    def enqueue(job_type: str, payload: Dict[str, Any], priority: int = 0, delay: float = 0, max_attempts: Optional[int] = None) -> Job:
+        """新增任务；max_attempts未指定时使用该任务类型注册的默认值"""
+        spec = JobRegistry.get(job_type)
+        job = Job(
+            job_type=job_type,
+            payload=payload,
+            priority=priority,
+            max_attempts=max_attempts or (spec.max_attempts if spec else 3),
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def _claimable_condition(now: datetime):
+        """排队且到达执行时间的任务，或可见性超时且仍有重试次数的任务"""
+        return or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_until < now, Job.attempts < Job.max_attempts)
+        )
+
+    @classmethod
+    def _claimable_types(cls, job_types: Iterable[str], now: datetime) -> List[str]:
+        """排除已达到并发上限的任务类型"""
+        job_types = list(job_types)
+        capped = [t for t in job_types if JobRegistry.get(t) and JobRegistry.get(t).concurrency]
+        if not capped:
+            return job_types
+
+        running = dict(
+            db.session.query(Job.job_type, func.count(Job.id))
+            .filter(Job.job_type.in_(capped), Job.status == 'running', Job.locked_until >= now)
+            .group_by(Job.job_type)
+            .all()
+        )
+        return [t for t in job_types
+                if t not in capped or running.get(t, 0) < JobRegistry.get(t).concurrency]
+
+    @classmethod
+    def claim(cls, worker_id: str, job_types: Optional[Iterable[str]] = None) -> Optional[Job]:
+        """
+        按优先级领取一个任务并标记为running，没有可执行的任务时返回None
+        并发上限按领取时的计数判断，多个worker同时领取时可能短暂超出
+        """
+        now = datetime.utcnow()
+        types = cls._claimable_types(job_types or JobRegistry.job_types(), now)
+        if not types:
+            return None
+
+        query = Job.query.filter(Job.job_type.in_(types), cls._claimable_condition(now)) \
+            .order_by(Job.priority.desc(), Job.run_at.asc(), Job.id.asc())
+
+        if db.engine.dialect.name == 'postgresql':
+            job = query.with_for_update(skip_locked=True).first()
+            if job is None:
+                db.session.rollback()
+                return None
+            cls._mark_claimed(job, worker_id, now)
+            db.session.commit()
+            return job
+
+        # 其他数据库：取若干候选，用条件UPDATE抢占，失败说明已被其他worker领取
+        candidates = query.with_entities(Job.id, Job.job_type).limit(10).all()
+        db.session.commit()
+        for job_id, job_type in candidates:
+            updated = Job.query.filter(Job.id == job_id, cls._claimable_condition(now)).update({
+                Job.status: 'running',
+                Job.attempts: Job.attempts + 1,
+                Job.locked_by: worker_id,
+                Job.locked_until: now + timedelta(seconds=cls._visibility_timeout(job_type)),
+                Job.updated_at: now
+            }, synchronize_session=False)
+            db.session.commit()
+            if updated:
+                return Job.query.get(job_id)
+        return None
+
+    @staticmethod
+    def _visibility_timeout(job_type: str) -> int:
+        spec = JobRegistry.get(job_type)
+        return spec.visibility_timeout if spec else 300
+
+    @classmethod
+    def _mark_claimed(cls, job: Job, worker_id: str, now: datetime) -> None:
+        job.status = 'running'
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=cls._visibility_timeout(job.job_type))
+
+    @staticmethod
+    def complete(job_id: int, worker_id: str) -> bool:
+        """
+        标记任务完成；只在任务仍由该worker持有时生效，
+        租约过期后被其他worker重新领取的任务不会被旧worker标记为完成
+        """
+        updated = Job.query.filter_by(id=job_id, locked_by=worker_id).update({
+            Job.status: 'done',
+            Job.locked_by: None,
+            Job.locked_until: None,
+            Job.last_error: None,
+            Job.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            logger.warning(f"Job {job_id} is no longer held by {worker_id}, result discarded")
+        return bool(updated)
+
+    @classmethod
+    def fail(cls, job_id: int, error: str, worker_id: str) -> None:
+        """记录失败；还有重试次数时按指数退避（带抖动）重新排队，否则标记为failed。只处理该worker仍持有的任务"""
+        job = Job.query.filter_by(id=job_id, locked_by=worker_id).first()
+        if not job:
+            logger.warning(f"Job {job_id} is no longer held by {worker_id}, failure discarded")
+            return
+        job.last_error = (error or '')[:2000]
+        job.locked_by = None
+        job.locked_until = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            logger.error(f"Job {job.id} ({job.job_type}) failed after {job.attempts} attempts: {error}")
+        else:
+            delay = min(cls.retry_max_seconds, cls.retry_base_seconds * (2 ** (job.attempts - 1)))
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=random.uniform(delay / 2, delay))
+            logger.warning(f"Job {job.id} ({job.job_type}) attempt {job.attempts} failed, retrying: {error}")
+        db.session.commit()
+        if job.status == 'failed':
+            cls._notify_failed(job)
+
+    @staticmethod
+    def _notify_failed(job: Job) -> None:
+        spec = JobRegistry.get(job.job_type)
+        if spec is None or spec.on_failed is None:
+            return
+        try:
+            spec.on_failed(job)
+        except Exception as e:
+            logger.error(f"Failure callback for job {job.id} ({job.job_type}) failed: {e}")
+            db.session.rollback()
+
+    @classmethod
+    def reap_expired(cls) -> int:
+        """可见性超时且已用完重试次数的任务直接标记为failed并调用失败回调，返回处理的数量"""
+        now = datetime.utcnow()
+        expired = Job.query.filter(
+            Job.status == 'running', Job.locked_until < now, Job.attempts >= Job.max_attempts
+        ).all()
+        if not expired:
+            return 0
+        Job.query.filter(
+            Job.id.in_([job.id for job in expired]), Job.status == 'running', Job.locked_until < now
+        ).update({
+            Job.status: 'failed',
+            Job.locked_by: None,
+            Job.locked_until: None,
+            Job.last_error: 'visibility timeout expired',
+            Job.updated_at: now
+        }, synchronize_session=False)
+        db.session.commit()
+        for job in expired:
+            cls._notify_failed(job)
+        return len(expired)
+
+    @staticmethod
+    def purge_finished(older_than_hours: float) -> int:
+        """删除早于指定时间的已完成和已失败任务"""
+        cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+        count = Job.query.filter(Job.status.in_(('done', 'failed')), Job.updated_at < cutoff) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def stats() -> Dict[str, Dict[str, int]]:
+        """按任务类型和状态统计任务数（供诊断接口使用）"""
+        rows = db.session.query(Job.job_type, Job.status, func.count(Job.id)) \
+            .group_by(Job.job_type, Job.status).all()
+        result: Dict[str, Dict[str, int]] = {}
+        for job_type, status, count in rows:
+            result.setdefault(job_type, {})[status] = count
+        return result
@@ -0,0 +1,117 @@
+"""
+会话摘要服务 - 在请求路径之外增量更新会话的滚动摘要
+请求只使用已保存的摘要，窗口外累计了足够多的消息时提交后台刷新；刷新完成前，
+请求在预算内补发摘要尚未覆盖的消息（见ContextWindowManager.backfill）。
+CHAT_SUMMARY_BACKEND=queue时，使用服务器默认配置的刷新任务写入持久化队列，由worker执行
+"""
+
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from flask import current_app
+
+from src.services.conversation_service import ConversationService
+from src.services.context_window import ContextWindowManager
+from src.services.job_queue import JobQueue
+from ..config.api_config import ApiConfig, ApiConfigFactory
+
+logger = logging.getLogger(__name__)
+
+# 摘要刷新任务的执行方式，默认与延迟反馈任务相同：thread在当前进程的线程池中执行，queue写入持久化任务队列
+CHAT_SUMMARY_BACKEND = os.getenv('CHAT_SUMMARY_BACKEND', os.getenv('CHAT_FEEDBACK_BACKEND', 'thread')).lower()
+
+# 持久化队列中摘要任务的优先级，低于延迟反馈
+SUMMARY_JOB_PRIORITY = 0
+
+# 写入队列后多长时间内不再为同一会话提交（秒），与摘要任务的可见性超时一致
+SUMMARY_JOB_VISIBILITY_TIMEOUT = 120
+
+
+class ConversationSummarizer:
+    """后台刷新会话摘要；同一进程内同一会话同时只提交一个刷新任务，失败后由之后的请求重新提交"""
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+    # 会话ID -> 标记过期的时间（monotonic），线程池任务结束时提前移除
+    _in_flight: Dict[int, float] = {}
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=int(os.getenv('CHAT_SUMMARY_WORKERS', 2)),
+                        thread_name_prefix='chat-summary')
+        return cls._executor
+
+    @classmethod
+    def submit(cls, api_config: ApiConfig, conversation_id: int, reserved_tokens: int = 0, app=None) -> None:
+        """
+        提交摘要刷新；该会话已有刷新在执行时直接返回，提交失败只记录日志
+
+        Args:
+            reserved_tokens: 系统提示词占用的token数，刷新时按与请求相同的预算划分窗口
+            app: Flask应用，未传入时使用当前应用上下文中的应用
+        """
+        now = time.monotonic()
+        with cls._lock:
+            if cls._in_flight.get(conversation_id, 0) > now:
+                return
+            cls._in_flight[conversation_id] = now + SUMMARY_JOB_VISIBILITY_TIMEOUT
+
+        try:
+            if CHAT_SUMMARY_BACKEND == 'queue' and ApiConfigFactory.is_server_config(api_config):
+                # 队列中只保存会话ID，worker刷新时重新读取摘要和消息
+                JobQueue.enqueue('context_summary', {
+                    "conversation_id": conversation_id,
+                    "reserved_tokens": reserved_tokens
+                }, priority=SUMMARY_JOB_PRIORITY)
+                return
+            app = app or current_app._get_current_object()
+            cls.executor().submit(cls._run, app, api_config, conversation_id, reserved_tokens)
+        except Exception as e:
+            cls._release(conversation_id)
+            logger.error(f"Failed to submit summary refresh for conversation {conversation_id}: {e}")
+
+    @classmethod
+    def _release(cls, conversation_id: int) -> None:
+        with cls._lock:
+            cls._in_flight.pop(conversation_id, None)
+
+    @classmethod
+    def _run(cls, app, api_config: ApiConfig, conversation_id: int, reserved_tokens: int) -> None:
+        try:
+            with app.app_context():
+                cls.refresh(api_config, conversation_id, reserved_tokens)
+        except Exception as e:
+            # 失败时保持原摘要，之后的请求会再次提交刷新
+            logger.error(f"Failed to refresh summary for conversation {conversation_id}: {e}")
+        finally:
+            cls._release(conversation_id)
+
+    @staticmethod
+    def refresh(api_config: ApiConfig, conversation_id: int, reserved_tokens: int = 0) -> bool:
+        """
+        按数据库中的最新状态把窗口外的消息合并进摘要（需要应用上下文），失败时抛出异常
+
+        Returns:
+            是否写入了新摘要；无需更新或期间会话被编辑截断时返回False
+        """
+        state = ConversationService.get_summary_state(conversation_id)
+        if state is None:
+            return False
+        summary, summary_message_id, history = state
+
+        context_window = ContextWindowManager(api_config)
+        plan = context_window.plan(history, summary, summary_message_id, reserved_tokens)
+        if not plan.fold:
+            return False
+
+        new_summary = context_window.summarize(plan.summary, plan.fold)
+        return ConversationService.update_context_summary(
+            conversation_id, new_summary, plan.fold[-1]["id"], summary_message_id)
@@ -1,4 +1,5 @@
 import asyncio
+import os
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Dict, Tuple, List
@@ -6,10 +7,15 @@ from typing import Optional, Dict, Tuple, List
 from .translation_core import TranslationCore
 from .grammar_correction import GrammarCorrection
 from .cet4_optimization import CET4Optimization
+from .combined_analysis import CombinedAnalysis
 from ..config.api_config import ApiConfig
+from ..utils.deadline import run_in_context
 
 logger = logging.getLogger(__name__)
 
+# 启用后翻译/纠错和CET4优化合并为一次LLM调用，失败时回退到分开调用
+COMBINED_ANALYSIS_ENABLED = os.getenv('TRANSLATION_COMBINED_ANALYSIS', 'false').lower() in ('1', 'true', 'yes', 'on')
+
 
 class TranslationClient:
     """
@@ -21,6 +27,7 @@ class TranslationClient:
         self.translation_core = TranslationCore(api_config)
         self.grammar_correction = GrammarCorrection(api_config)
         self.cet4_optimization = CET4Optimization(api_config)
+        self.combined_analysis = CombinedAnalysis(api_config)
 
     def is_chinese_text(self, text: str) -> bool:
         """检测文本是否主要是中文"""
@@ -57,17 +64,17 @@ class TranslationClient:
                     futures = []
                     
                     # 提交语法纠错任务
-                    future_grammar = executor.submit(
+                    future_grammar = executor.submit(run_in_context(
                         self.grammar_correction.get_detailed_corrections, 
                         user_message
-                    )
+                    ))
                     futures.append(("grammar", future_grammar))
                     
                     # 提交CET4优化任务
-                    future_optimization = executor.submit(
+                    future_optimization = executor.submit(run_in_context(
                         self.cet4_optimization.optimize_for_cet4, 
                         user_message
-                    )
+                    ))
                     futures.append(("optimization", future_optimization))
                     
                     # 收集结果
@@ -114,19 +121,7 @@ class TranslationClient:
                 translated_text = self.translation_core.translate_with_context(user_message, context_info)
                 if translated_text and translated_text != user_message:
                     # 包装翻译结果为纠错格式
-                    grammar_correction_result = {
-                        "original_sentence": user_message,
-                        "corrected_sentence": translated_text,
-                        "overall_comment": "中文翻译成功，已根据对话上下文优化",
-                        "corrections": [
-                            {
-                                "type": "translation",
-                                "original": user_message,
-                                "corrected": translated_text,
-                                "explanation": f"将中文句子 '{user_message}' 翻译成适合当前对话语境的英文"
-                            }
-                        ]
-                    }
+                    grammar_correction_result = self._wrap_context_translation(user_message, translated_text)
                     message_for_ai = translated_text
                     
                     # 2. 对翻译后的英文进行上下文感知CET4优化
@@ -140,17 +135,17 @@ class TranslationClient:
                     futures = []
                     
                     # 提交上下文语法纠错任务
-                    future_grammar = executor.submit(
+                    future_grammar = executor.submit(run_in_context(
                         self.grammar_correction.get_context_aware_corrections, 
                         user_message, context_info
-                    )
+                    ))
                     futures.append(("grammar", future_grammar))
                     
                     # 提交上下文感知CET4优化任务
-                    future_optimization = executor.submit(
+                    future_optimization = executor.submit(run_in_context(
                         self.cet4_optimization.optimize_with_context, 
                         user_message, context_info
-                    )
+                    ))
                     futures.append(("optimization", future_optimization))
                     
                     # 收集结果
@@ -182,6 +177,13 @@ class TranslationClient:
         处理用户输入 - 新版本支持上下文感知
         返回: (处理后的消息, 纠错结果, 优化结果)
         """
+        if COMBINED_ANALYSIS_ENABLED:
+            try:
+                return self.combined_analysis.analyze(
+                    user_message, self.is_chinese_text(user_message), self._combined_context(conversation_history))
+            except Exception as e:
+                logger.warning(f"合并分析失败，回退到分开调用: {e}")
+
         # 如果有对话历史，使用上下文感知版本
         if conversation_history and len(conversation_history) > 0:
             return self.process_user_input_with_context(user_message, conversation_history)
@@ -189,6 +191,152 @@ class TranslationClient:
             # 对话开始时使用原版本
             return self.process_user_input_parallel(user_message)
 
+    def process_user_input_strict(self, user_message: str, conversation_history: List[Dict] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """
+        后台反馈任务使用的版本：纠错和优化都没有结果时抛出异常
+        process_user_input会吞掉异常并返回空结果，后台任务需要据此重试或标记失败
+        """
+        processed_message, corrections, optimization = self.process_user_input(user_message, conversation_history)
+        if corrections is None and optimization is None:
+            raise RuntimeError("语法纠错和表达优化均未生成结果")
+        return processed_message, corrections, optimization
+
+    async def process_user_input_parallel_async(self, user_message: str) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """
+        process_user_input_parallel的异步版本，英文输入的纠错和优化在同一事件循环上并发执行
+        返回: (处理后的消息, 纠错结果, 优化结果)
+        """
+        grammar_correction_result = None
+        optimization_result = None
+        message_for_ai = user_message
+
+        try:
+            if self.is_chinese_text(user_message):
+                # 中文输入：先翻译，再优化翻译结果
+                translation_result = await self.translation_core.get_translation_from_chinese_async(user_message)
+                if translation_result:
+                    grammar_correction_result = translation_result
+                    translated_text = translation_result.get("corrected_sentence", user_message)
+                    message_for_ai = translated_text
+                    optimization_result = await self.cet4_optimization.optimize_for_cet4_async(translated_text)
+                else:
+                    optimization_result = await self.cet4_optimization.optimize_for_cet4_async(user_message)
+            else:
+                grammar_result, optimization = await asyncio.gather(
+                    self.grammar_correction.get_detailed_corrections_async(user_message),
+                    self.cet4_optimization.optimize_for_cet4_async(user_message),
+                    return_exceptions=True
+                )
+                message_for_ai, grammar_correction_result, optimization_result = self._merge_english_results(
+                    user_message, grammar_result, optimization)
+
+            return message_for_ai, grammar_correction_result, optimization_result
+
+        except Exception as e:
+            print(f"[ERROR] 异步并行处理失败: {e}")
+            return user_message, None, None
+
+    async def process_user_input_with_context_async(self, user_message: str, conversation_history: List[Dict] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """
+        process_user_input_with_context的异步版本
+        返回: (处理后的消息, 纠错结果, 优化结果)
+        """
+        grammar_correction_result = None
+        optimization_result = None
+        message_for_ai = user_message
+
+        context_info = self._build_context_info(conversation_history)
+
+        try:
+            if self.is_chinese_text(user_message):
+                translated_text = await self.translation_core.translate_with_context_async(user_message, context_info)
+                if translated_text and translated_text != user_message:
+                    grammar_correction_result = self._wrap_context_translation(user_message, translated_text)
+                    message_for_ai = translated_text
+                    optimization_result = await self.cet4_optimization.optimize_with_context_async(
+                        translated_text, context_info)
+                else:
+                    optimization_result = await self.cet4_optimization.optimize_with_context_async(
+                        user_message, context_info)
+            else:
+                grammar_result, optimization = await asyncio.gather(
+                    self.grammar_correction.get_context_aware_corrections_async(user_message, context_info),
+                    self.cet4_optimization.optimize_with_context_async(user_message, context_info),
+                    return_exceptions=True
+                )
+                message_for_ai, grammar_correction_result, optimization_result = self._merge_english_results(
+                    user_message, grammar_result, optimization)
+
+            return message_for_ai, grammar_correction_result, optimization_result
+
+        except Exception as e:
+            print(f"[ERROR] 异步上下文感知处理失败: {e}")
+            return user_message, None, None
+
+    async def process_user_input_async(self, user_message: str, conversation_history: List[Dict] = None) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """
+        process_user_input的异步版本
+        返回: (处理后的消息, 纠错结果, 优化结果)
+        """
+        if COMBINED_ANALYSIS_ENABLED:
+            try:
+                return await self.combined_analysis.analyze_async(
+                    user_message, self.is_chinese_text(user_message), self._combined_context(conversation_history))
+            except Exception as e:
+                logger.warning(f"合并分析失败，回退到分开调用: {e}")
+
+        if conversation_history and len(conversation_history) > 0:
+            return await self.process_user_input_with_context_async(user_message, conversation_history)
+        else:
+            return await self.process_user_input_parallel_async(user_message)
+
+    def _combined_context(self, conversation_history: List[Dict] = None) -> Optional[str]:
+        """合并分析使用的上下文，没有历史时返回None，对应分开调用时的无上下文版本"""
+        if conversation_history and len(conversation_history) > 0:
+            return self._build_context_info(conversation_history)
+        return None
+
+    @staticmethod
+    def _wrap_context_translation(user_message: str, translated_text: str) -> Dict:
+        """将上下文翻译结果包装为纠错格式"""
+        return {
+            "original_sentence": user_message,
+            "corrected_sentence": translated_text,
+            "overall_comment": "中文翻译成功，已根据对话上下文优化",
+            "corrections": [
+                {
+                    "type": "translation",
+                    "original": user_message,
+                    "corrected": translated_text,
+                    "explanation": f"将中文句子 '{user_message}' 翻译成适合当前对话语境的英文"
+                }
+            ]
+        }
+
+    @staticmethod
+    def _merge_english_results(user_message: str, grammar_result, optimization) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+        """合并英文输入并发任务的结果，任务异常时对应结果为None"""
+        message_for_ai = user_message
+        grammar_correction_result = None
+        optimization_result = None
+
+        if isinstance(grammar_result, Exception):
+            print(f"[ERROR] grammar 任务执行失败: {grammar_result}")
+        elif grammar_result:
+            grammar_correction_result = grammar_result
+            corrected = grammar_result.get("corrected_sentence", user_message)
+            original = grammar_result.get("original_sentence", user_message)
+            if corrected != original:
+                message_for_ai = corrected
+
+        if isinstance(optimization, Exception):
+            print(f"[ERROR] optimization 任务执行失败: {optimization}")
+        elif optimization:
+            # 不修改 message_for_ai，保持用户原始输入发送给AI
+            optimization_result = optimization
+
+        return message_for_ai, grammar_correction_result, optimization_result
+
     def get_detailed_corrections(self, text: str) -> Optional[Dict]:
         """获取详细的语法纠错结果"""
         return self.grammar_correction.get_detailed_corrections(text)
@@ -1,9 +1,10 @@
-import requests
 import re
 import logging
 from typing import Optional, Dict
 
 from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.async_ai_client import AsyncAIApiClient
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,8 @@ class TranslationCore:
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
+        self.async_client = AsyncAIApiClient(api_config)
 
     @staticmethod
     def is_chinese_text(text: str) -> bool:
@@ -30,12 +33,8 @@ class TranslationCore:
         # 如果中文字符占大多数，判定为中文文本
         return chinese_chars > english_chars
 
-    def get_translation_from_chinese(self, chinese_text: str) -> Optional[Dict]:
-        """将中文翻译成英文"""
-        print(f"[DEBUG] 开始中文翻译，文本: {chinese_text}")
-
-        headers = self.api_config.get_headers()
-
+    def _build_translation_payload(self, chinese_text: str) -> Dict:
+        """构建中文翻译请求载荷"""
         system_prompt = """你是一位专业的中英翻译专家。请将用户提供的中文句子翻译成地道的英文。
 
 **翻译要求:**
@@ -48,7 +47,7 @@ class TranslationCore:
 * 不要使用引号或其他标记包裹翻译结果
 * 确保翻译的准确性和自然度"""
 
-        payload = self.api_config.get_request_payload([
+        return self.api_config.get_request_payload([
             {
                 "role": "system",
                 "content": system_prompt
@@ -59,38 +58,56 @@ class TranslationCore:
             }
         ], max_tokens=1000, temperature=0.1)
 
+    @staticmethod
+    def _wrap_translation(chinese_text: str, translation: str) -> Optional[Dict]:
+        """将翻译结果包装为纠错格式，翻译无变化时返回None"""
+        print(f"[DEBUG] 翻译结果: {translation}")
+
+        # 如果翻译结果与原文不同，返回翻译数据
+        if translation and translation != chinese_text:
+            return {
+                "original_sentence": chinese_text,
+                "corrected_sentence": translation,
+                "overall_comment": "中文翻译成功",
+                "corrections": [
+                    {
+                        "type": "translation",
+                        "original": chinese_text,
+                        "corrected": translation,
+                        "explanation": f"将中文句子 '{chinese_text}' 翻译成英文"
+                    }
+                ]
+            }
+        return None
+
+    def get_translation_from_chinese(self, chinese_text: str) -> Optional[Dict]:
+        """将中文翻译成英文"""
+        print(f"[DEBUG] 开始中文翻译，文本: {chinese_text}")
+
+        payload = self._build_translation_payload(chinese_text)
+
         try:
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=15)
-            response.raise_for_status()
-            result = response.json()
-            translation = result["choices"][0]["message"]["content"].strip()
-            print(f"[DEBUG] 翻译结果: {translation}")
-
-            # 如果翻译结果与原文不同，返回翻译数据
-            if translation and translation != chinese_text:
-                return {
-                    "original_sentence": chinese_text,
-                    "corrected_sentence": translation,
-                    "overall_comment": "中文翻译成功",
-                    "corrections": [
-                        {
-                            "type": "translation",
-                            "original": chinese_text,
-                            "corrected": translation,
-                            "explanation": f"将中文句子 '{chinese_text}' 翻译成英文"
-                        }
-                    ]
-                }
-            return None
+            translation = self.ai_client.complete(payload, timeout=15, cache=True)
+            return self._wrap_translation(chinese_text, translation)
         except Exception as e:
             print(f"[ERROR] 中文翻译失败: {e}")
             return None
 
-    def translate_with_context(self, text: str, context_info: str = None) -> str:
-        """根据上下文进行翻译优化"""
-        headers = self.api_config.get_headers()
+    async def get_translation_from_chinese_async(self, chinese_text: str) -> Optional[Dict]:
+        """将中文翻译成英文（异步版本）"""
+        print(f"[DEBUG] 开始中文翻译(async)，文本: {chinese_text}")
+
+        payload = self._build_translation_payload(chinese_text)
+
+        try:
+            translation = await self.async_client.complete(payload, timeout=15, cache=True)
+            return self._wrap_translation(chinese_text, translation)
+        except Exception as e:
+            print(f"[ERROR] 中文翻译失败: {e}")
+            return None
 
+    def _build_context_translation_payload(self, text: str, context_info: str = None) -> Dict:
+        """构建上下文翻译请求载荷"""
         context_prompt = f"""
 **对话上下文信息:**
 {context_info or "当前是对话开始，没有历史上下文。"}
@@ -111,7 +128,7 @@ class TranslationCore:
 * 不要使用引号或其他标记包裹翻译结果
 * 确保翻译在当前语境下自然且准确"""
 
-        payload = self.api_config.get_request_payload([
+        return self.api_config.get_request_payload([
             {
                 "role": "system",
                 "content": system_prompt
@@ -122,13 +139,22 @@ class TranslationCore:
             }
         ], max_tokens=1000, temperature=0.1)
 
+    def translate_with_context(self, text: str, context_info: str = None) -> str:
+        """根据上下文进行翻译优化"""
+        payload = self._build_context_translation_payload(text, context_info)
+
+        try:
+            return self.ai_client.complete(payload, timeout=15, cache=True, hedge=True)
+        except Exception as e:
+            print(f"[ERROR] 上下文翻译失败: {e}")
+            return text
+
+    async def translate_with_context_async(self, text: str, context_info: str = None) -> str:
+        """根据上下文进行翻译优化（异步版本）"""
+        payload = self._build_context_translation_payload(text, context_info)
+
         try:
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=15)
-            response.raise_for_status()
-            result = response.json()
-            translation = result["choices"][0]["message"]["content"].strip()
-            return translation
+            return await self.async_client.complete(payload, timeout=15, cache=True, hedge=True)
         except Exception as e:
             print(f"[ERROR] 上下文翻译失败: {e}")
-            return text
\ No newline at end of file
+            return text
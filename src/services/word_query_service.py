@@ -3,12 +3,12 @@
 """
 
 import os
-import requests
-import json
 import logging
 from typing import Optional, Dict, List
 
 from ..config.api_config import ApiConfig
+from ..utils.ai_client import AIApiClient
+from ..utils.json_extractor import JsonExtractionError
 
 logger = logging.getLogger(__name__)
 
@@ -108,6 +108,7 @@ class WordQueryService:
 
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.ai_client = AIApiClient(api_config)
 
     def query_with_ai(self, text: str, context: str, query_type: str = 'word-query', selected_vocab: Optional[List[str]] = None) -> Optional[Dict]:
         """使用AI进行词汇查询"""
@@ -117,7 +118,6 @@ class WordQueryService:
             else:
                 system_prompt = WordQueryPrompts.build_word_query_prompt(text, context)
 
-            headers = self.api_config.get_headers()
             payload = self.api_config.get_request_payload([
                 {
                     "role": "system",
@@ -129,25 +129,13 @@ class WordQueryService:
                 }
             ], max_tokens=2000, temperature=0.1)
 
-            response = requests.post(
-                self.api_config.chat_completions_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip()
-            
-            # 尝试解析JSON响应
             try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # 如果不是有效JSON，尝试提取JSON代码块
-                import re
-                json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-                if json_match:
-                    return json.loads(json_match.group(1).strip())
-                else:
-                    logger.warning(f"无法解析AI响应为JSON: {content}")
-                    return {"error": "AI响应格式错误", "raw_response": content}
+                # 解析成功后才写入缓存
+                return self.ai_client.complete_json(
+                    payload, timeout=30, cache=True, hedge=True, coalesce=True, label='word_query')
+            except JsonExtractionError as e:
+                logger.warning(f"无法解析AI响应为JSON: {e.content}")
+                return {"error": "AI响应格式错误", "raw_response": e.content}
 
         except Exception as e:
             logger.error(f"词汇查询失败: {e}")
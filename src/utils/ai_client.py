@@ -2,22 +2,412 @@
 统一HTTP客户端工具 - 减少重复的HTTP请求代码
 """
 
+import hashlib
 import requests
 import json
 import logging
+import os
 import time
-from typing import Dict, Any, Optional
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Iterator, Set
 
 from ..config.api_config import ApiConfig
+from .http_transport import HttpTransport
+from .response_cache import ResponseCache, get_response_cache
+from .resilience import (
+    ResilienceRegistry, CircuitOpenError, RETRYABLE_STATUS_CODES, backoff_delay, parse_retry_after
+)
+from .deadline import current_deadline, run_in_context
+from .hedging import HedgeRegistry
+from .singleflight import SingleFlight
+from .provider_router import ProviderRouter
+from .rate_limiter import RateLimiter, RateLimitTimeout
+from .json_extractor import extract_json, JsonExtractionError, JsonExtractionStats
 
 logger = logging.getLogger(__name__)
 
+# 支持 response_format={"type": "json_object"} 的提供商（见ApiProviderService.detect_api_provider）
+JSON_MODE_PROVIDERS = {'openai', 'azure_openai', 'deepseek', 'moonshot', 'zhipu'}
+# auto: 按提供商判断；on: 总是请求JSON模式；off: 只依赖提示词和本地提取
+LLM_JSON_MODE = os.environ.get('LLM_JSON_MODE', 'auto').lower()
+
 
 class AIApiClient:
     """AI API统一客户端"""
 
+    # 曾经以400拒绝response_format的api_base，之后不再请求JSON模式
+    _json_mode_rejected: Set[str] = set()
+
     def __init__(self, api_config: ApiConfig):
         self.api_config = api_config
+        self.session = HttpTransport.get_session(api_config.api_base)
+        # 使用服务器默认配置且配置了多个后端时，请求在后端池中路由和故障转移
+        self.router = ProviderRouter.for_config(api_config)
+
+    def post_chat_completion(
+        self,
+        payload: Dict[str, Any],
+        timeout: int = 15,
+        api_config: Optional[ApiConfig] = None,
+        **kwargs
+    ) -> requests.Response:
+        """
+        通过共享连接池发送一次chat completions请求（不做重试和解析）
+
+        Args:
+            payload: 请求载荷
+            timeout: 超时时间
+            api_config: 目标后端，默认为客户端自身的配置
+            **kwargs: 透传给requests的其他参数（如stream）
+
+        Returns:
+            原始响应对象
+        """
+        api_config = api_config or self.api_config
+        session = self.session if api_config is self.api_config else HttpTransport.get_session(api_config.api_base)
+        return session.post(
+            api_config.chat_completions_url,
+            headers=api_config.get_headers(),
+            json=payload,
+            timeout=timeout,
+            **kwargs
+        )
+
+    def send_chat_completion(
+        self,
+        payload: Dict[str, Any],
+        timeout: int = 15,
+        max_retries: int = 1,
+        stream: bool = False
+    ) -> requests.Response:
+        """
+        经过熔断器、带抖动的指数退避和全局重试预算发送请求
+
+        只对网络错误、429和5xx进行重试，429/503优先遵循Retry-After；
+        其他状态码直接返回，由调用方raise_for_status处理。
+        服务器默认配置启用了多提供商路由时，失败的请求会转移到后端池中的其他后端。
+
+        Args:
+            payload: 请求载荷
+            timeout: 单次请求超时时间
+            max_retries: 最大尝试次数（含首次请求）
+            stream: 是否以流式方式读取响应
+
+        Returns:
+            最后一次请求的响应对象
+
+        Raises:
+            CircuitOpenError: 该提供商的熔断器处于打开状态
+            DeadlineExceeded: 当前请求的时间预算已经用完
+            RateLimitTimeout: 排队等待出站配额超时
+            requests.exceptions.RequestException: 所有尝试都发生网络错误
+        """
+        if self.router is None:
+            return self._send_to_backend(self.api_config, payload, timeout, max_retries, stream)
+        return self._send_with_failover(payload, timeout, max_retries, stream)
+
+    def _send_with_failover(
+        self,
+        payload: Dict[str, Any],
+        timeout: int,
+        max_retries: int,
+        stream: bool
+    ) -> requests.Response:
+        """
+        在后端池中依次尝试：首选后端失败（网络错误、熔断、429或5xx）时立即转移到下一个后端，
+        只有最后一个后端才在本后端上做退避重试
+        """
+        candidates = self.router.candidates()
+        response = None
+        error = None
+        for index, backend in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            body = {**payload, "model": backend.config.model}
+            started = time.monotonic()
+            try:
+                new_response = self._send_to_backend(
+                    backend.config, body, timeout, max_retries if is_last else 1, stream)
+            except (requests.exceptions.RequestException, CircuitOpenError, RateLimitTimeout) as e:
+                backend.record(time.monotonic() - started, ok=False)
+                logger.warning(f"Provider {backend.name} failed: {e}")
+                error = e
+                continue
+
+            ok = new_response.status_code not in RETRYABLE_STATUS_CODES
+            backend.record(time.monotonic() - started, ok=ok)
+            if response is not None:
+                response.close()
+            response = new_response
+            if ok:
+                return response
+            logger.warning(f"Provider {backend.name} returned {response.status_code}, failing over")
+
+        if response is not None:
+            return response
+        raise error
+
+    def _send_to_backend(
+        self,
+        api_config: ApiConfig,
+        payload: Dict[str, Any],
+        timeout: int,
+        max_retries: int,
+        stream: bool
+    ) -> requests.Response:
+        """在单个后端上执行带熔断、退避和重试预算的请求"""
+        settings = ResilienceRegistry.settings()
+        breaker = ResilienceRegistry.breaker(api_config.api_base)
+        budget = ResilienceRegistry.retry_budget()
+        budget.record_request()
+        deadline = current_deadline()
+        payload = self.payload_for_backend(payload, api_config.api_base)
+
+        response = None
+        error = None
+        for attempt in range(max_retries):
+            # 先检查熔断器，熔断打开时不占用其他调用方共享的出站配额
+            if not breaker.allow_request():
+                raise CircuitOpenError(breaker.name, breaker.retry_in())
+            # 按API Key排队获取出站配额，排队时间同样计入截止时间
+            try:
+                RateLimiter.acquire(api_config.api_key, payload, max_wait=deadline.remaining() if deadline else None)
+            except Exception:
+                # 没有发出请求，归还半开状态下的探测名额
+                breaker.record_throttled()
+                raise
+            # 单次超时不能超过整个请求剩余的时间预算
+            attempt_timeout = deadline.cap(timeout) if deadline else timeout
+
+            retry_after = None
+            try:
+                logger.debug(f"Making API request (attempt {attempt + 1}/{max_retries})")
+                response = self.post_chat_completion(
+                    payload, timeout=attempt_timeout, api_config=api_config, stream=stream)
+                error = None
+            except requests.exceptions.RequestException as e:
+                logger.error(f"API request failed (attempt {attempt + 1}): {e}")
+                breaker.record_failure()
+                response, error = None, e
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    breaker.record_success()
+                    if response.status_code == 400 and "response_format" in payload:
+                        # 记录到实际返回400的后端上，而不是首选后端
+                        self.reject_json_mode(api_config.api_base)
+                    return response
+
+                if response.status_code == 429:
+                    # 限流说明服务仍然可达，不计入熔断失败
+                    breaker.record_throttled()
+                    RateLimiter.drain(api_config.api_key)
+                else:
+                    breaker.record_failure()
+                if response.status_code in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                logger.warning(f"API returned {response.status_code} (attempt {attempt + 1})")
+
+            if attempt == max_retries - 1:
+                break
+
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, settings)
+            if delay > settings.max_retry_after:
+                logger.warning(f"Retry-After {delay:.0f}s exceeds limit, giving up")
+                break
+            if deadline and delay >= deadline.remaining():
+                logger.warning("Request deadline leaves no time for a retry, giving up")
+                break
+            if not budget.try_acquire():
+                logger.warning("Retry budget exhausted, giving up")
+                break
+
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        if response is not None:
+            return response
+        logger.error("All retry attempts failed")
+        raise error
+
+    def complete(
+        self,
+        payload: Dict[str, Any],
+        timeout: int = 15,
+        cache: bool = False,
+        max_retries: int = 1,
+        hedge: bool = False,
+        coalesce: bool = False
+    ) -> str:
+        """
+        发送请求并返回第一条回复的文本内容
+
+        Args:
+            payload: 请求载荷
+            timeout: 超时时间
+            cache: 是否使用确定性响应缓存（仅用于低温度、固定系统提示的辅助调用）
+            max_retries: 最大尝试次数（含首次请求）
+            hedge: 是否允许对冲请求（仅用于短小且幂等的调用，需启用LLM_HEDGE_ENABLED）
+            coalesce: 是否与同时在途的相同请求合并（仅用于结果与调用方无关的确定性调用）
+
+        Returns:
+            回复文本
+        """
+        if cache:
+            cached = self.get_cached_content(payload)
+            if cached is not None:
+                return cached
+
+        def fetch() -> str:
+            if hedge and HedgeRegistry.enabled():
+                return self._fetch_content_hedged(payload, timeout, max_retries)
+            return self._fetch_content(payload, timeout, max_retries)
+
+        if coalesce:
+            content = SingleFlight.do(
+                self.coalesce_key(payload, self.api_config), fetch,
+                metric_key=HedgeRegistry.key(self.api_config.api_base, payload.get("model")))
+        else:
+            content = fetch()
+
+        if cache and content:
+            self.store_cached_content(payload, content)
+        return content
+
+    def _fetch_content(self, payload: Dict[str, Any], timeout: int, max_retries: int) -> str:
+        """发送请求并解析出回复文本"""
+        response = self.send_chat_completion(payload, timeout=timeout, max_retries=max_retries)
+        response.raise_for_status()
+        if not response.text.strip():
+            raise ValueError("API响应内容为空")
+        result = response.json()
+        return result["choices"][0]["message"]["content"].strip()
+
+    def _fetch_content_hedged(self, payload: Dict[str, Any], timeout: int, max_retries: int) -> str:
+        """
+        主请求超过历史延迟分位数仍未返回时，再发送一份相同的请求，取先成功的结果。
+        落后的请求如果还未开始会被取消，已在途的请求结果直接丢弃。
+        """
+        key = HedgeRegistry.key(self.api_config.api_base, payload.get("model"))
+        HedgeRegistry.record_eligible()
+        delay = HedgeRegistry.hedge_delay(key)
+
+        def timed_fetch() -> str:
+            started = time.monotonic()
+            content = self._fetch_content(payload, timeout, max_retries)
+            HedgeRegistry.record_latency(key, time.monotonic() - started)
+            return content
+
+        executor = HedgeRegistry.executor()
+        primary = executor.submit(run_in_context(timed_fetch))
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        deadline = current_deadline()
+        if (deadline and deadline.remaining() <= delay) or not HedgeRegistry.try_acquire():
+            return primary.result()
+
+        logger.debug(f"Primary request slower than {delay:.2f}s, sending hedged request")
+        hedged = executor.submit(run_in_context(timed_fetch))
+        pending = {primary, hedged}
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = future.exception()
+                        continue
+                    if future is hedged:
+                        HedgeRegistry.record_hedge_win()
+                    return future.result()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def cache_key(payload: Dict[str, Any], api_base: str = '') -> str:
+        """根据请求载荷生成缓存键：模型 + 系统提示指纹 + 规范化输入 + 采样参数"""
+        messages = payload.get("messages", [])
+        system_prompt = "\n".join(
+            m.get("content", "") for m in messages if m.get("role") == "system")
+        user_input = "\n".join(
+            f"{m.get('role')}: {m.get('content', '')}" for m in messages if m.get("role") != "system")
+        params = {k: payload[k] for k in ("temperature", "max_tokens", "response_format") if k in payload}
+        model = f"{api_base.rstrip('/')}|{payload.get('model', '')}"
+        return ResponseCache.make_key(model, system_prompt, user_input, params)
+
+    @classmethod
+    def coalesce_key(cls, payload: Dict[str, Any], api_config: ApiConfig) -> str:
+        """
+        请求合并使用的键：在缓存键之外加入API Key的指纹，
+        使用不同密钥的用户不会共享同一个上游请求（以及它的401/403/429错误）
+        """
+        key_fingerprint = hashlib.sha256((api_config.api_key or '').encode('utf-8')).hexdigest()[:16]
+        return f"{cls.cache_key(payload, api_config.api_base)}|{key_fingerprint}"
+
+    def get_cached_content(self, payload: Dict[str, Any]) -> Optional[str]:
+        """查询缓存，未启用缓存或未命中时返回None"""
+        response_cache = get_response_cache()
+        if response_cache is None:
+            return None
+        content = response_cache.get(self.cache_key(payload, self.api_config.api_base))
+        if content is not None:
+            logger.debug("LLM response cache hit")
+        return content
+
+    def store_cached_content(self, payload: Dict[str, Any], content: str) -> None:
+        """写入缓存（调用方应在确认内容可用后再写入）"""
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            response_cache.set(self.cache_key(payload, self.api_config.api_base), content)
+
+    def stream_chat_completion(self, payload: Dict[str, Any], timeout: int = 30) -> Iterator[str]:
+        """
+        以流式方式发送chat completions请求，逐个产出模型返回的增量文本
+
+        Args:
+            payload: 请求载荷（会自动加上stream=True）
+            timeout: 连接和两次数据块之间的超时时间
+
+        Yields:
+            增量文本片段
+        """
+        stream_payload = {**payload, "stream": True}
+        response = self.send_chat_completion(stream_payload, timeout=timeout, stream=True)
+        try:
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+                    continue
+
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            response.close()
+
+    @staticmethod
+    def get_url(api_base: str, url: str, headers: Dict[str, str], timeout: int = 10) -> requests.Response:
+        """通过api_base对应的共享连接池发送GET请求（用于模型列表等非对话接口）"""
+        session = HttpTransport.get_session(api_base)
+        return session.get(url, headers=headers, timeout=timeout)
 
     def make_chat_request(
         self, 
@@ -26,8 +416,7 @@ class AIApiClient:
         max_tokens: int = 1000,
         temperature: float = 0.1,
         timeout: int = 15,
-        max_retries: int = 3,
-        retry_delay: int = 2
+        max_retries: int = 3
     ) -> Optional[str]:
         """
         统一的聊天API请求方法
@@ -38,14 +427,11 @@ class AIApiClient:
             max_tokens: 最大token数
             temperature: 温度参数
             timeout: 超时时间
-            max_retries: 最大重试次数
-            retry_delay: 重试延迟
+            max_retries: 最大尝试次数，重试间隔由弹性策略决定
             
         Returns:
-            API响应内容或None
+            API响应内容
         """
-        headers = self.api_config.get_headers()
-        
         # 构建消息列表
         request_messages = []
         if system_prompt:
@@ -61,52 +447,113 @@ class AIApiClient:
             temperature=temperature
         )
 
-        for attempt in range(max_retries):
-            try:
-                logger.debug(f"Making API request (attempt {attempt + 1}/{max_retries})")
-                
-                response = requests.post(
-                    self.api_config.chat_completions_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
-                )
+        content = self.complete(payload, timeout=timeout, max_retries=max_retries)
+        logger.debug(f"API request successful, content length: {len(content)}")
+        return content
 
-                if response.status_code == 429:
-                    logger.warning(f"Rate limit reached, retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    continue
+    @classmethod
+    def json_mode_payload(cls, payload: Dict[str, Any], api_base: str, expect: type) -> Dict[str, Any]:
+        """期望JSON对象且提供商支持时，在载荷中加入response_format"""
+        if expect is not dict or LLM_JSON_MODE == 'off' or "response_format" in payload:
+            return payload
+        if LLM_JSON_MODE != 'on':
+            # 延迟导入，避免services -> ai_client的循环依赖
+            from ..services.api_provider_service import ApiProviderService
+            if ApiProviderService.detect_api_provider(api_base) not in JSON_MODE_PROVIDERS:
+                return payload
+        return {**payload, "response_format": {"type": "json_object"}}
 
-                response.raise_for_status()
-                
-                # 检查响应内容
-                if not response.text.strip():
-                    logger.error("API response is empty")
-                    continue
+    @classmethod
+    def payload_for_backend(cls, payload: Dict[str, Any], api_base: str) -> Dict[str, Any]:
+        """按实际发送的后端去掉它不支持的response_format（多提供商路由时每个后端分别记录）"""
+        if "response_format" in payload and api_base in cls._json_mode_rejected:
+            return {k: v for k, v in payload.items() if k != "response_format"}
+        return payload
 
-                result = response.json()
-                content = result["choices"][0]["message"]["content"].strip()
-                
-                logger.debug(f"API request successful, content length: {len(content)}")
-                return content
+    @classmethod
+    def reject_json_mode(cls, api_base: str) -> None:
+        logger.warning(f"{api_base} rejected response_format, falling back to prompt-only JSON")
+        cls._json_mode_rejected.add(api_base)
 
-            except requests.exceptions.RequestException as e:
-                logger.error(f"API request failed (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    logger.error("All retry attempts failed")
-                    raise
+    @staticmethod
+    def parse_json_content(content: str, expect: type, label: str) -> Any:
+        """提取JSON并记录统计，失败时抛出JsonExtractionError"""
+        try:
+            value, strategy = extract_json(content, expect)
+        except JsonExtractionError:
+            JsonExtractionStats.record(label, "failures")
+            logger.warning(f"[{label}] Could not extract JSON from response: {content[:500]}")
+            raise
+        JsonExtractionStats.record(label, strategy)
+        return value
 
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.error(f"Failed to parse API response: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    logger.error("All retry attempts failed")
+    def complete_json(
+        self,
+        payload: Dict[str, Any],
+        timeout: int = 15,
+        cache: bool = False,
+        max_retries: int = 1,
+        hedge: bool = False,
+        coalesce: bool = False,
+        expect: type = dict,
+        parse_retries: int = 1,
+        label: str = 'default'
+    ) -> Any:
+        """
+        发送请求并从回复中提取JSON
+
+        期望JSON对象且提供商支持时使用JSON模式（response_format），否则依赖本地提取；
+        只有输出确实无法解析时才重新请求，最多parse_retries次。
+
+        Args:
+            payload: 请求载荷
+            timeout/cache/max_retries/hedge/coalesce: 与complete相同
+            expect: 期望的顶层类型（dict或list）
+            parse_retries: 输出无法解析时重新请求的次数
+            label: 解析统计中使用的调用方名称
+
+        Returns:
+            解析后的JSON值
+
+        Raises:
+            JsonExtractionError: 所有尝试的输出都无法解析
+        """
+        payload = self.json_mode_payload(payload, self.api_config.api_base, expect)
+
+        if cache:
+            cached = self.get_cached_content(payload)
+            if cached is not None:
+                try:
+                    return extract_json(cached, expect)[0]
+                except JsonExtractionError:
+                    pass
+
+        error = None
+        for attempt in range(parse_retries + 1):
+            if attempt > 0:
+                JsonExtractionStats.record(label, "retries")
+            try:
+                content = self.complete(payload, timeout=timeout, max_retries=max_retries, hedge=hedge,
+                                        coalesce=coalesce)
+            except requests.exceptions.HTTPError as e:
+                if "response_format" not in payload or e.response is None or e.response.status_code != 400:
                     raise
+                # 拒绝已由_send_to_backend记录在实际应答的后端上
+                payload = {k: v for k, v in payload.items() if k != "response_format"}
+                content = self.complete(payload, timeout=timeout, max_retries=max_retries, hedge=hedge,
+                                        coalesce=coalesce)
+
+            try:
+                value = self.parse_json_content(content, expect, label)
+            except JsonExtractionError as e:
+                error = e
+                continue
 
-        return None
+            if cache:
+                self.store_cached_content(payload, content)
+            return value
+
+        raise error
 
     def extract_json_from_response(self, content: str) -> Optional[Dict[str, Any]]:
         """
@@ -118,29 +565,7 @@ class AIApiClient:
         Returns:
             解析后的JSON字典或None
         """
-        import re
-        
-        # 首先尝试直接解析
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            pass
-        
-        # 尝试从代码块中提取JSON
-        json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1).strip())
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON from code block: {e}")
-        
-        # 尝试查找花括号包围的内容
-        brace_match = re.search(r'\{[\s\S]*\}', content)
-        if brace_match:
-            try:
-                return json.loads(brace_match.group(0))
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON from braces: {e}")
-        
-        logger.warning(f"Could not extract JSON from response: {content}")
-        return None
\ No newline at end of file
+            return self.parse_json_content(content, dict, 'default')
+        except JsonExtractionError:
+            return None
@@ -0,0 +1,400 @@
+"""
+异步AI API客户端 - AIApiClient的asyncio版本
+所有会话共享按api_base划分的aiohttp连接池
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Any, Optional, Tuple
+
+import aiohttp
+
+from ..config.api_config import ApiConfig
+from .http_transport import HttpTransport
+from .ai_client import AIApiClient
+from .response_cache import get_response_cache
+from .resilience import (
+    ResilienceRegistry, CircuitOpenError, RETRYABLE_STATUS_CODES, backoff_delay, parse_retry_after
+)
+from .deadline import current_deadline, DeadlineExceeded
+from .hedging import HedgeRegistry
+from .singleflight import SingleFlight
+from .provider_router import ProviderRouter
+from .rate_limiter import RateLimiter, RateLimitTimeout
+from .json_extractor import extract_json, JsonExtractionError, JsonExtractionStats
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHttpTransport:
+    """异步传输层，每个(事件循环, api_base)对应一个aiohttp.ClientSession"""
+
+    _sessions: Dict[Tuple[int, str], aiohttp.ClientSession] = {}
+
+    @classmethod
+    def get_session(cls, api_base: str) -> aiohttp.ClientSession:
+        """获取当前事件循环上api_base对应的共享Session（必须在协程中调用）"""
+        loop = asyncio.get_running_loop()
+        key = (id(loop), (api_base or '').rstrip('/'))
+        session = cls._sessions.get(key)
+        if session is None or session.closed:
+            settings = HttpTransport.settings()
+            connector = aiohttp.TCPConnector(
+                limit=int(os.getenv('LLM_ASYNC_POOL_LIMIT', 200)),
+                limit_per_host=settings.pool_maxsize,
+                keepalive_timeout=60
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            cls._sessions[key] = session
+            logger.info(f"为 {key[1]} 创建异步HTTP连接池")
+        return session
+
+    @classmethod
+    async def close_all(cls) -> None:
+        """关闭当前事件循环上的所有Session"""
+        loop_id = id(asyncio.get_running_loop())
+        for key in [k for k in cls._sessions if k[0] == loop_id]:
+            session = cls._sessions.pop(key)
+            await session.close()
+
+
+class AsyncAIApiClient:
+    """AI API统一异步客户端"""
+
+    def __init__(self, api_config: ApiConfig):
+        self.api_config = api_config
+        self.router = ProviderRouter.for_config(api_config)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return AsyncHttpTransport.get_session(self.api_config.api_base)
+
+    async def post_chat_completion(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = 15,
+        api_config: Optional[ApiConfig] = None
+    ) -> Dict[str, Any]:
+        """
+        发送一次chat completions请求并返回解析后的JSON，api_config默认为客户端自身的配置
+
+        Raises:
+            aiohttp.ClientResponseError: 响应状态码非2xx
+            ValueError: 响应内容为空或不是JSON
+        """
+        api_config = api_config or self.api_config
+        async with AsyncHttpTransport.get_session(api_config.api_base).post(
+            api_config.chat_completions_url,
+            headers=api_config.get_headers(),
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            response.raise_for_status()
+            text = await response.text()
+            if not text.strip():
+                raise ValueError("API响应内容为空")
+            return json.loads(text)
+
+    async def send_chat_completion(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = 15,
+        max_retries: int = 1
+    ) -> Dict[str, Any]:
+        """
+        经过熔断器、退避重试和重试预算发送请求，策略（包括多提供商故障转移）与AIApiClient.send_chat_completion一致
+
+        Raises:
+            CircuitOpenError: 该提供商的熔断器处于打开状态
+            DeadlineExceeded: 当前请求的时间预算已经用完
+            RateLimitTimeout: 排队等待出站配额超时
+            aiohttp.ClientResponseError / aiohttp.ClientError / asyncio.TimeoutError: 最后一次失败的异常
+        """
+        if self.router is None:
+            return await self._send_to_backend(self.api_config, payload, timeout, max_retries)
+        return await self._send_with_failover(payload, timeout, max_retries)
+
+    async def _send_with_failover(self, payload: Dict[str, Any], timeout: float, max_retries: int) -> Dict[str, Any]:
+        """在后端池中依次尝试，策略与AIApiClient._send_with_failover一致"""
+        loop = asyncio.get_running_loop()
+        candidates = self.router.candidates()
+        error = None
+        for index, backend in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            body = {**payload, "model": backend.config.model}
+            started = loop.time()
+            try:
+                result = await self._send_to_backend(
+                    backend.config, body, timeout, max_retries if is_last else 1)
+            except aiohttp.ClientResponseError as e:
+                retryable = e.status in RETRYABLE_STATUS_CODES
+                backend.record(loop.time() - started, ok=not retryable)
+                if not retryable:
+                    raise
+                logger.warning(f"Provider {backend.name} returned {e.status}, failing over")
+                error = e
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError, RateLimitTimeout) as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                backend.record(loop.time() - started, ok=False)
+                logger.warning(f"Provider {backend.name} failed: {e}")
+                error = e
+                continue
+
+            backend.record(loop.time() - started, ok=True)
+            return result
+
+        raise error
+
+    async def _send_to_backend(
+        self,
+        api_config: ApiConfig,
+        payload: Dict[str, Any],
+        timeout: float,
+        max_retries: int
+    ) -> Dict[str, Any]:
+        """在单个后端上执行带熔断、退避和重试预算的请求"""
+        settings = ResilienceRegistry.settings()
+        breaker = ResilienceRegistry.breaker(api_config.api_base)
+        budget = ResilienceRegistry.retry_budget()
+        budget.record_request()
+        deadline = current_deadline()
+        payload = AIApiClient.payload_for_backend(payload, api_config.api_base)
+
+        for attempt in range(max_retries):
+            # 先检查熔断器，熔断打开时不占用其他调用方共享的出站配额
+            if not breaker.allow_request():
+                raise CircuitOpenError(breaker.name, breaker.retry_in())
+            # 按API Key排队获取出站配额，排队时间同样计入截止时间
+            try:
+                await RateLimiter.acquire_async(
+                    api_config.api_key, payload, max_wait=deadline.remaining() if deadline else None)
+            except BaseException:
+                # 没有发出请求（排队超时或被取消），归还半开状态下的探测名额
+                breaker.record_throttled()
+                raise
+            # 单次超时不能超过整个请求剩余的时间预算
+            attempt_timeout = deadline.cap(timeout) if deadline else timeout
+
+            retry_after = None
+            try:
+                logger.debug(f"Making async API request (attempt {attempt + 1}/{max_retries})")
+                result = await self.post_chat_completion(payload, timeout=attempt_timeout, api_config=api_config)
+                breaker.record_success()
+                return result
+
+            except aiohttp.ClientResponseError as e:
+                last_error = e
+                if e.status not in RETRYABLE_STATUS_CODES:
+                    breaker.record_success()
+                    if e.status == 400 and "response_format" in payload:
+                        # 记录到实际返回400的后端上，而不是首选后端
+                        AIApiClient.reject_json_mode(api_config.api_base)
+                    raise
+                if e.status == 429:
+                    breaker.record_throttled()
+                    await RateLimiter.drain_async(api_config.api_key)
+                else:
+                    breaker.record_failure()
+                if e.status in (429, 503) and e.headers:
+                    retry_after = parse_retry_after(e.headers.get('Retry-After'))
+                logger.warning(f"Async API returned {e.status} (attempt {attempt + 1})")
+                if attempt == max_retries - 1:
+                    raise
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = e
+                logger.error(f"Async API request failed (attempt {attempt + 1}): {e}")
+                breaker.record_failure()
+                if attempt == max_retries - 1:
+                    logger.error("All retry attempts failed")
+                    raise
+
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, settings)
+            if delay > settings.max_retry_after:
+                logger.warning(f"Retry-After {delay:.0f}s exceeds limit, giving up")
+                raise last_error
+            if deadline and delay >= deadline.remaining():
+                logger.warning("Request deadline leaves no time for a retry, giving up")
+                raise last_error
+            if not budget.try_acquire():
+                logger.warning("Retry budget exhausted, giving up")
+                raise last_error
+            await asyncio.sleep(delay)
+
+    async def complete(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = 15,
+        cache: bool = False,
+        max_retries: int = 1,
+        hedge: bool = False,
+        coalesce: bool = False
+    ) -> str:
+        """发送请求并返回第一条回复的文本内容，参数含义与AIApiClient.complete一致"""
+        response_cache = get_response_cache() if cache else None
+        key = AIApiClient.cache_key(payload, self.api_config.api_base) if response_cache else None
+        if response_cache:
+            # 共享后端可能涉及磁盘或网络IO，放到线程中执行以免阻塞事件循环
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                return cached
+
+        async def fetch() -> str:
+            if hedge and HedgeRegistry.enabled():
+                return await self._fetch_content_hedged(payload, timeout, max_retries)
+            return await self._fetch_content(payload, timeout, max_retries)
+
+        if coalesce:
+            content = await SingleFlight.do_async(
+                AIApiClient.coalesce_key(payload, self.api_config), fetch,
+                metric_key=HedgeRegistry.key(self.api_config.api_base, payload.get("model")))
+        else:
+            content = await fetch()
+
+        if response_cache and content:
+            await asyncio.to_thread(response_cache.set, key, content)
+        return content
+
+    async def _fetch_content(self, payload: Dict[str, Any], timeout: float, max_retries: int) -> str:
+        """发送请求并解析出回复文本"""
+        result = await self.send_chat_completion(payload, timeout=timeout, max_retries=max_retries)
+        return result["choices"][0]["message"]["content"].strip()
+
+    async def _fetch_content_hedged(self, payload: Dict[str, Any], timeout: float, max_retries: int) -> str:
+        """对冲版本的_fetch_content，策略与AIApiClient一致，落后的请求会被真正取消"""
+        hedge_key = HedgeRegistry.key(self.api_config.api_base, payload.get("model"))
+        HedgeRegistry.record_eligible()
+        delay = HedgeRegistry.hedge_delay(hedge_key)
+
+        async def timed_fetch() -> str:
+            started = loop.time()
+            content = await self._fetch_content(payload, timeout, max_retries)
+            HedgeRegistry.record_latency(hedge_key, loop.time() - started)
+            return content
+
+        loop = asyncio.get_running_loop()
+        primary = asyncio.ensure_future(timed_fetch())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            deadline = current_deadline()
+            if (deadline and deadline.remaining() <= delay) or not HedgeRegistry.try_acquire():
+                return await primary
+
+            logger.debug(f"Primary request slower than {delay:.2f}s, sending hedged request")
+            hedged = asyncio.ensure_future(timed_fetch())
+            pending = {primary, hedged}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedged:
+                        HedgeRegistry.record_hedge_win()
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+
+    async def complete_json(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = 15,
+        cache: bool = False,
+        max_retries: int = 1,
+        hedge: bool = False,
+        coalesce: bool = False,
+        expect: type = dict,
+        parse_retries: int = 1,
+        label: str = 'default'
+    ) -> Any:
+        """发送请求并从回复中提取JSON，参数含义与AIApiClient.complete_json一致"""
+        payload = AIApiClient.json_mode_payload(payload, self.api_config.api_base, expect)
+
+        response_cache = get_response_cache() if cache else None
+        key = AIApiClient.cache_key(payload, self.api_config.api_base) if response_cache else None
+        if response_cache:
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                try:
+                    return extract_json(cached, expect)[0]
+                except JsonExtractionError:
+                    pass
+
+        error = None
+        for attempt in range(parse_retries + 1):
+            if attempt > 0:
+                JsonExtractionStats.record(label, "retries")
+            try:
+                content = await self.complete(payload, timeout=timeout, max_retries=max_retries, hedge=hedge,
+                                              coalesce=coalesce)
+            except aiohttp.ClientResponseError as e:
+                if "response_format" not in payload or e.status != 400:
+                    raise
+                # 拒绝已由_send_to_backend记录在实际应答的后端上
+                payload = {k: v for k, v in payload.items() if k != "response_format"}
+                key = AIApiClient.cache_key(payload, self.api_config.api_base) if response_cache else None
+                content = await self.complete(payload, timeout=timeout, max_retries=max_retries, hedge=hedge,
+                                              coalesce=coalesce)
+
+            try:
+                value = AIApiClient.parse_json_content(content, expect, label)
+            except JsonExtractionError as e:
+                error = e
+                continue
+
+            if response_cache:
+                await asyncio.to_thread(response_cache.set, key, content)
+            return value
+
+        raise error
+
+    async def make_chat_request(
+        self,
+        messages: list,
+        system_prompt: str = None,
+        max_tokens: int = 1000,
+        temperature: float = 0.1,
+        timeout: float = 15,
+        max_retries: int = 3
+    ) -> Optional[str]:
+        """
+        统一的异步聊天API请求方法，参数含义与AIApiClient.make_chat_request一致
+        """
+        request_messages = []
+        if system_prompt:
+            request_messages.append({
+                "role": "system",
+                "content": system_prompt
+            })
+        request_messages.extend(messages)
+
+        payload = self.api_config.get_request_payload(
+            request_messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+
+        return await self.complete_with_retries(payload, timeout=timeout, max_retries=max_retries)
+
+    async def complete_with_retries(
+        self,
+        payload: Dict[str, Any],
+        timeout: float = 15,
+        max_retries: int = 3
+    ) -> Optional[str]:
+        """带重试的异步请求，返回回复文本；所有重试失败时抛出最后一次异常"""
+        content = await self.complete(payload, timeout=timeout, max_retries=max_retries)
+        logger.debug(f"Async API request successful, content length: {len(content)}")
+        return content
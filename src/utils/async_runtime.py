@@ -0,0 +1,56 @@
+"""
+进程级共享事件循环 - 在后台线程中运行所有异步LLM调用
+同步的Flask视图通过run_coroutine把协程提交到这个循环上执行
+"""
+
+import asyncio
+import threading
+import logging
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）后台事件循环"""
+    global _loop, _thread
+    if _loop is not None and _thread is not None and _thread.is_alive():
+        return _loop
+
+    with _lock:
+        if _loop is None or _thread is None or not _thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_run_loop, args=(_loop,), name='llm-event-loop', daemon=True)
+            _thread.start()
+            logger.info("后台LLM事件循环已启动")
+        return _loop
+
+
+def run_coroutine(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    在后台事件循环上执行协程并阻塞等待结果
+
+    Args:
+        coro: 要执行的协程
+        timeout: 最长等待时间（秒），超时后会取消协程
+
+    Returns:
+        协程的返回值
+    """
+    loop = get_event_loop()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        future.cancel()
+        raise
@@ -0,0 +1,79 @@
+"""
+端到端截止时间 - 为一次聊天请求设置总时间预算，并把剩余预算传递给所有下游LLM调用
+截止时间保存在contextvar中，asyncio任务和asyncio.to_thread会自动继承；
+提交到线程池时需要通过run_in_context显式复制上下文
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+_current_deadline: contextvars.ContextVar[Optional['Deadline']] = contextvars.ContextVar(
+    'llm_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求的总时间预算已经用完"""
+
+
+class Deadline:
+    """基于单调时钟的截止时间"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, timeout: float) -> float:
+        """把单次调用的超时时间限制在剩余预算内，预算用完时抛出DeadlineExceeded"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"请求已超过 {self.seconds:.0f} 秒的时间预算")
+        return min(timeout, remaining)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """获取当前上下文的截止时间，未设置时返回None"""
+    return _current_deadline.get()
+
+
+def cap_timeout(timeout: float) -> float:
+    """按当前上下文的截止时间限制超时时间，没有截止时间时原样返回"""
+    deadline = _current_deadline.get()
+    return deadline.cap(timeout) if deadline else timeout
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """
+    在代码块内设置截止时间；seconds为空或不大于0时不设置。
+    嵌套时取更早的截止时间，内层不能延长外层预算。
+    """
+    outer = _current_deadline.get()
+    if not seconds or seconds <= 0:
+        yield outer
+        return
+
+    deadline = Deadline(seconds)
+    if outer and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def run_in_context(func: Callable, *args, **kwargs):
+    """
+    返回绑定了当前上下文（包括截止时间）的可调用对象，用于提交到线程池：
+    executor.submit(run_in_context(func, arg))
+    """
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args, **kwargs)
@@ -0,0 +1,64 @@
+"""
+进程内事件总线 - 按用户分发后台任务产生的事件（如延迟生成的纠错结果）
+每个SSE连接订阅一个独立队列；事件只在当前进程内分发，
+连接在其他工作进程上的客户端需要使用轮询接口获取结果
+"""
+
+import queue
+import threading
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UserEventBus:
+    """按用户ID分组的订阅队列"""
+
+    _subscribers: Dict[int, List[queue.Queue]] = {}
+    _lock = threading.Lock()
+    # 单个订阅队列积压的事件上限，客户端读取过慢时丢弃新事件（可通过轮询接口补齐）
+    max_queue_size = 100
+
+    @classmethod
+    def subscribe(cls, user_id: int) -> queue.Queue:
+        subscription: queue.Queue = queue.Queue(maxsize=cls.max_queue_size)
+        with cls._lock:
+            cls._subscribers.setdefault(user_id, []).append(subscription)
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, user_id: int, subscription: queue.Queue) -> None:
+        with cls._lock:
+            subscriptions = cls._subscribers.get(user_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                cls._subscribers.pop(user_id, None)
+
+    @classmethod
+    def publish(cls, user_id: int, event: str, data: Any) -> int:
+        """向用户的所有订阅发送事件，返回送达的订阅数"""
+        with cls._lock:
+            subscriptions = list(cls._subscribers.get(user_id, []))
+        delivered = 0
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait((event, data))
+                delivered += 1
+            except queue.Full:
+                logger.warning(f"用户 {user_id} 的事件队列已满，丢弃事件 {event}")
+        return delivered
+
+    @staticmethod
+    def next_event(subscription: queue.Queue, timeout: float) -> Tuple[str, Any]:
+        """等待下一个事件，超时抛出queue.Empty"""
+        return subscription.get(timeout=timeout)
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, int]:
+        with cls._lock:
+            return {
+                "users": len(cls._subscribers),
+                "subscriptions": sum(len(subs) for subs in cls._subscribers.values())
+            }
@@ -0,0 +1,166 @@
+"""
+对冲请求 - 针对短小且幂等的LLM调用（翻译、CET4改写、单词查询）降低尾延迟
+主请求在延迟分位数时间内没有返回时，再发送一份相同的请求，取先完成的结果；
+对冲次数不超过合格请求数的固定比例，保证额外开销有上限
+"""
+
+import os
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HedgingSettings:
+    """对冲策略配置"""
+
+    enabled: bool = False
+    percentile: float = 95.0        # 使用历史延迟的哪个分位数作为对冲等待时间
+    min_delay: float = 0.3          # 对冲等待时间下限（秒）
+    default_delay: float = 2.0      # 延迟样本不足时使用的等待时间（秒）
+    max_ratio: float = 0.1          # 对冲请求数占合格请求数的上限
+    window: int = 200               # 每个模型保留的延迟样本数
+    min_samples: int = 20           # 样本数达到该值后才使用分位数
+
+    @classmethod
+    def from_env(cls) -> 'HedgingSettings':
+        def env_float(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, default))
+            except (TypeError, ValueError):
+                return default
+
+        return cls(
+            enabled=os.getenv('LLM_HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on'),
+            percentile=env_float('LLM_HEDGE_PERCENTILE', cls.percentile),
+            min_delay=env_float('LLM_HEDGE_MIN_DELAY_MS', cls.min_delay * 1000) / 1000,
+            default_delay=env_float('LLM_HEDGE_DEFAULT_DELAY_MS', cls.default_delay * 1000) / 1000,
+            max_ratio=env_float('LLM_HEDGE_MAX_RATIO', cls.max_ratio),
+            window=int(env_float('LLM_HEDGE_WINDOW', cls.window)),
+            min_samples=int(env_float('LLM_HEDGE_MIN_SAMPLES', cls.min_samples))
+        )
+
+
+class LatencyTracker:
+    """单个模型最近若干次成功请求的延迟"""
+
+    def __init__(self, window: int):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        """返回指定分位数的延迟，样本不足时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class HedgeRegistry:
+    """进程级共享的延迟统计和对冲计数"""
+
+    _settings: Optional[HedgingSettings] = None
+    _trackers: Dict[str, LatencyTracker] = {}
+    _counters = {"eligible": 0, "hedged": 0, "hedge_wins": 0, "suppressed": 0}
+    _executor: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def settings(cls) -> HedgingSettings:
+        if cls._settings is None:
+            cls._settings = HedgingSettings.from_env()
+        return cls._settings
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls.settings().enabled
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        """同步客户端执行主请求和对冲请求的共享线程池"""
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=int(os.getenv('LLM_HEDGE_WORKERS', 64)),
+                        thread_name_prefix='llm-hedge')
+        return cls._executor
+
+    @staticmethod
+    def key(api_base: str, model: str) -> str:
+        return f"{(api_base or '').rstrip('/')}|{model or ''}"
+
+    @classmethod
+    def _tracker(cls, key: str) -> LatencyTracker:
+        tracker = cls._trackers.get(key)
+        if tracker is None:
+            with cls._lock:
+                tracker = cls._trackers.get(key)
+                if tracker is None:
+                    tracker = LatencyTracker(cls.settings().window)
+                    cls._trackers[key] = tracker
+        return tracker
+
+    @classmethod
+    def record_latency(cls, key: str, seconds: float) -> None:
+        cls._tracker(key).record(seconds)
+
+    @classmethod
+    def hedge_delay(cls, key: str) -> float:
+        """主请求等待多久后发送对冲请求"""
+        settings = cls.settings()
+        delay = cls._tracker(key).percentile(settings.percentile, settings.min_samples)
+        if delay is None:
+            delay = settings.default_delay
+        return max(settings.min_delay, delay)
+
+    @classmethod
+    def record_eligible(cls) -> None:
+        with cls._lock:
+            cls._counters["eligible"] += 1
+
+    @classmethod
+    def try_acquire(cls) -> bool:
+        """对冲请求数不超过合格请求数 * max_ratio"""
+        with cls._lock:
+            allowed = cls._counters["eligible"] * cls.settings().max_ratio
+            if cls._counters["hedged"] + 1 <= allowed:
+                cls._counters["hedged"] += 1
+                return True
+            cls._counters["suppressed"] += 1
+            return False
+
+    @classmethod
+    def record_hedge_win(cls) -> None:
+        with cls._lock:
+            cls._counters["hedge_wins"] += 1
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        """对冲计数和各模型当前的对冲等待时间（供诊断接口使用）"""
+        settings = cls.settings()
+        with cls._lock:
+            counters = dict(cls._counters)
+        return {
+            "enabled": settings.enabled,
+            "hedge_rate": round(counters["hedged"] / counters["eligible"], 4) if counters["eligible"] else 0.0,
+            **counters,
+            "delays": {
+                key: {"samples": len(tracker), "delay_seconds": round(cls.hedge_delay(key), 3)}
+                for key, tracker in list(cls._trackers.items())
+            }
+        }
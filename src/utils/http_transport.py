@@ -0,0 +1,129 @@
+"""
+共享HTTP传输层 - 按api_base复用keep-alive连接池
+避免每次LLM调用都重新建立TCP+TLS连接
+"""
+
+import os
+import threading
+import logging
+from dataclasses import dataclass
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"环境变量 {name} 不是有效整数，使用默认值 {default}")
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@dataclass
+class TransportSettings:
+    """连接池配置"""
+
+    pool_connections: int = 4   # 每个Session缓存的主机连接池数量
+    pool_maxsize: int = 16      # 单个主机的最大连接数
+    pool_block: bool = True     # 达到单主机上限时排队等待，而不是额外新建连接
+
+    @classmethod
+    def from_env(cls) -> 'TransportSettings':
+        """从环境变量读取连接池配置"""
+        return cls(
+            pool_connections=_env_int('LLM_HTTP_POOL_CONNECTIONS', cls.pool_connections),
+            pool_maxsize=_env_int('LLM_HTTP_POOL_MAXSIZE', cls.pool_maxsize),
+            pool_block=_env_bool('LLM_HTTP_POOL_BLOCK', cls.pool_block)
+        )
+
+
+class HttpTransport:
+    """进程级共享的HTTP传输层，每个api_base对应一个带连接池的Session"""
+
+    _sessions: Dict[str, requests.Session] = {}
+    _lock = threading.Lock()
+    _settings: TransportSettings = None
+
+    @classmethod
+    def settings(cls) -> TransportSettings:
+        if cls._settings is None:
+            cls._settings = TransportSettings.from_env()
+        return cls._settings
+
+    @classmethod
+    def configure(cls, settings: TransportSettings) -> None:
+        """替换连接池配置，已创建的Session会被关闭并按新配置重建"""
+        with cls._lock:
+            cls._settings = settings
+            cls._close_sessions_locked()
+
+    @staticmethod
+    def _normalize_key(api_base: str) -> str:
+        return (api_base or '').rstrip('/')
+
+    @classmethod
+    def get_session(cls, api_base: str) -> requests.Session:
+        """获取指定api_base的共享Session"""
+        key = cls._normalize_key(api_base)
+        session = cls._sessions.get(key)
+        if session is not None:
+            return session
+
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                session = cls._create_session(cls.settings())
+                cls._sessions[key] = session
+                logger.info(f"为 {key} 创建共享HTTP连接池")
+            return session
+
+    @staticmethod
+    def _create_session(settings: TransportSettings) -> requests.Session:
+        session = requests.Session()
+        # 不同用户可能共享同一个api_base，禁止在Session间携带Cookie
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        # 重试由上层统一处理，这里不做传输层重试
+        adapter = HTTPAdapter(
+            pool_connections=settings.pool_connections,
+            pool_maxsize=settings.pool_maxsize,
+            pool_block=settings.pool_block,
+            max_retries=0
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @classmethod
+    def _close_sessions_locked(cls) -> None:
+        for session in cls._sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning(f"关闭HTTP Session失败: {e}")
+        cls._sessions.clear()
+
+    @classmethod
+    def close_all(cls) -> None:
+        """关闭所有共享Session（进程退出或测试时使用）"""
+        with cls._lock:
+            cls._close_sessions_locked()
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """返回当前持有的连接池数量"""
+        return {
+            "sessions": len(cls._sessions),
+            "pool_maxsize": cls.settings().pool_maxsize
+        }
@@ -0,0 +1,199 @@
+"""
+幂等请求 - 客户端在重试时携带相同的Idempotency-Key，服务端重放首次响应而不是重复执行
+首次请求执行期间到达的重复请求会等待其完成；记录保存在数据库中，过期后清理
+"""
+
+import hashlib
+import os
+import random
+import time
+import logging
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import Response, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from src.models import db
+from src.models.idempotency import IdempotencyRecord
+from src.utils.auth import get_current_user, get_user_from_token
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# 记录的保存时间（秒）
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))
+# 重复请求等待首次请求完成的最长时间（秒），超时返回409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 60))
+# 执行中的记录超过该时间未完成视为进程已退出，允许重新执行（秒）
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 300))
+# 每次新建记录时顺带清理过期记录的概率
+_PURGE_PROBABILITY = 0.01
+
+
+class IdempotencyStore:
+    """幂等记录的占用、完成和清理，需要在应用上下文中调用"""
+
+    @staticmethod
+    def _find(scope: str, endpoint: str, key: str):
+        """
+        只读取需要的列，返回普通的行元组而不是ORM对象：
+        轮询时每次读取后都会提交，ORM对象会过期，再次访问属性时若记录已被删除会抛出ObjectDeletedError
+        """
+        return IdempotencyRecord.query.with_entities(
+            IdempotencyRecord.id, IdempotencyRecord.status, IdempotencyRecord.request_hash,
+            IdempotencyRecord.created_at, IdempotencyRecord.expires_at,
+            IdempotencyRecord.response_status, IdempotencyRecord.response_body
+        ).filter_by(scope=scope, endpoint=endpoint, key=key).first()
+
+    @classmethod
+    def _try_insert(cls, scope: str, endpoint: str, key: str, request_hash: str) -> Optional[int]:
+        """插入执行中的记录，键已被占用时返回None"""
+        now = datetime.utcnow()
+        record = IdempotencyRecord(
+            scope=scope, endpoint=endpoint, key=key, request_hash=request_hash,
+            status='in_progress', created_at=now,
+            expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        if random.random() < _PURGE_PROBABILITY:
+            cls.purge_expired()
+        return record.id
+
+    @classmethod
+    def begin(cls, scope: str, endpoint: str, key: str, request_hash: str) -> Tuple[Optional[int], Optional[Response]]:
+        """
+        占用幂等键；键已被占用时只插入一次，之后用SELECT轮询已有记录直到完成或等待超时
+
+        Returns:
+            (记录ID, None) 表示由当前请求执行；(None, 响应) 表示直接返回该响应（重放或错误）
+        """
+        wait_until = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record_id = cls._try_insert(scope, endpoint, key, request_hash)
+            if record_id is not None:
+                return record_id, None
+
+            while True:
+                existing = cls._find(scope, endpoint, key)
+                # 读取后结束事务，下一轮轮询时才能看到首次请求提交的结果
+                db.session.commit()
+                if existing is None:
+                    # 记录已被删除（首次请求失败或过期清理），重新尝试占用
+                    break
+
+                now = datetime.utcnow()
+                abandoned = existing.status == 'in_progress' and \
+                    existing.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+                if existing.expires_at < now or abandoned:
+                    IdempotencyRecord.query.filter_by(id=existing.id).delete(synchronize_session=False)
+                    db.session.commit()
+                    break
+
+                if existing.request_hash != request_hash:
+                    return None, (jsonify({
+                        "success": False,
+                        "error": "Idempotency-Key was already used with a different request."
+                    }), 422)
+
+                if existing.status == 'completed':
+                    response = Response(existing.response_body, status=existing.response_status,
+                                        mimetype='application/json')
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return None, response
+
+                if time.monotonic() >= wait_until:
+                    return None, (jsonify({
+                        "success": False,
+                        "error": "A request with this Idempotency-Key is still in progress."
+                    }), 409)
+                time.sleep(0.25)
+
+    @staticmethod
+    def finish(record_id: int, response: Response) -> None:
+        IdempotencyRecord.query.filter_by(id=record_id).update({
+            IdempotencyRecord.status: 'completed',
+            IdempotencyRecord.response_status: response.status_code,
+            IdempotencyRecord.response_body: response.get_data(as_text=True)
+        }, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def abandon(record_id: int) -> None:
+        """首次请求失败时删除记录，让客户端的重试可以重新执行"""
+        db.session.rollback()
+        IdempotencyRecord.query.filter_by(id=record_id).delete(synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def purge_expired() -> int:
+        count = IdempotencyRecord.query.filter(IdempotencyRecord.expires_at < datetime.utcnow()) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+
+def _request_scope() -> Optional[str]:
+    """幂等键按用户隔离；无法识别用户时返回None"""
+    user = get_current_user() or get_user_from_token()
+    return str(user.id) if user else None
+
+
+def _request_hash() -> str:
+    """请求指纹包含方法、路径、查询参数和请求体，同一个键用在不同URL（如另一条消息的重新生成）时不会重放错误的响应"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\0')
+    digest.update(request.full_path.encode())
+    digest.update(b'\0')
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def idempotent(endpoint: str):
+    """
+    幂等装饰器，放在auth_required之后使用。
+    请求未携带Idempotency-Key或无法识别用户时不做任何处理（匿名客户端之间无法可靠区分，
+    共用作用域会互相重放对方的响应）；5xx响应和异常不会被保存，客户端可以重试
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return f(*args, **kwargs)
+            if len(key) > 255:
+                return jsonify({"success": False, "error": "Idempotency-Key is too long."}), 400
+
+            scope = _request_scope()
+            if scope is None:
+                return f(*args, **kwargs)
+
+            request_hash = _request_hash()
+            record_id, early_response = IdempotencyStore.begin(scope, endpoint, key, request_hash)
+            if early_response is not None:
+                return early_response
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                IdempotencyStore.abandon(record_id)
+                raise
+
+            try:
+                if response.status_code >= 500 or response.is_streamed:
+                    IdempotencyStore.abandon(record_id)
+                else:
+                    IdempotencyStore.finish(record_id, response)
+            except Exception as e:
+                # 保存失败不影响本次响应，只是后续重试无法重放
+                logger.error(f"Failed to store idempotent response for key {key}: {e}")
+            return response
+
+        return decorated_function
+    return decorator
@@ -0,0 +1,154 @@
+"""
+模型输出的JSON提取 - 所有需要结构化结果的调用共用同一条解析路径
+依次尝试：整体直接解析 -> ```json代码块 -> 括号配对扫描出的第一个完整JSON值，
+并按调用方统计解析失败率
+"""
+
+import json
+import threading
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_OPENERS = {'{': '}', '[': ']'}
+
+
+class JsonExtractionError(ValueError):
+    """模型输出中没有符合要求的JSON"""
+
+    def __init__(self, message: str, content: str):
+        super().__init__(message)
+        self.content = content
+
+
+def _fenced_block(content: str) -> Optional[str]:
+    """返回第一个```json（或不带语言标记的```）代码块的内容"""
+    start = content.find('```')
+    if start == -1:
+        return None
+    body_start = content.find('\n', start)
+    if body_start == -1:
+        return None
+    end = content.find('```', body_start)
+    if end == -1:
+        # 输出被截断时代码块没有闭合，交给括号扫描处理剩余部分
+        return None
+    return content[body_start + 1:end].strip()
+
+
+def _balanced_spans(content: str, opener_chars: str):
+    """
+    按括号配对逐个产出完整的候选JSON片段的起止位置，
+    字符串内部的括号和转义字符不参与计数
+    """
+    index = 0
+    length = len(content)
+    while index < length:
+        if content[index] not in opener_chars:
+            index += 1
+            continue
+
+        start = index
+        stack = [_OPENERS[content[index]]]
+        in_string = False
+        escaped = False
+        index += 1
+        while index < length and stack:
+            char = content[index]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in _OPENERS:
+                stack.append(_OPENERS[char])
+            elif char == stack[-1]:
+                stack.pop()
+            elif char in '}]':
+                # 括号不匹配，从下一个候选起点重新开始
+                break
+            index += 1
+
+        if not stack:
+            yield start, index
+        elif index >= length:
+            # 直到文本结尾都没有闭合（输出被截断），后面的内容都只是它内部的片段
+            return
+        # 解析失败或括号不匹配时，从下一个字符继续寻找候选起点
+        index = start + 1
+
+
+def extract_json(content: str, expect: type = None) -> Tuple[Any, str]:
+    """
+    从模型输出中提取JSON值
+
+    Args:
+        content: 模型输出的文本
+        expect: 期望的顶层类型（dict或list），None表示不限
+
+    Returns:
+        (解析结果, 使用的策略: direct / fenced / scanned)
+
+    Raises:
+        JsonExtractionError: 没有找到符合要求的JSON
+    """
+    text = (content or '').strip()
+
+    def accept(value: Any) -> bool:
+        return expect is None or isinstance(value, expect)
+
+    try:
+        value = json.loads(text)
+        if accept(value):
+            return value, 'direct'
+    except json.JSONDecodeError:
+        pass
+
+    block = _fenced_block(text)
+    if block:
+        try:
+            value = json.loads(block)
+            if accept(value):
+                return value, 'fenced'
+        except json.JSONDecodeError:
+            pass
+
+    opener_chars = {dict: '{', list: '['}.get(expect, '{[')
+    for start, end in _balanced_spans(text, opener_chars):
+        try:
+            value = json.loads(text[start:end])
+        except json.JSONDecodeError:
+            continue
+        if accept(value):
+            return value, 'scanned'
+
+    raise JsonExtractionError("模型输出中没有找到有效的JSON", content)
+
+
+class JsonExtractionStats:
+    """按调用方统计JSON提取结果（供诊断接口使用）"""
+
+    _counters: Dict[str, Dict[str, int]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, label: str, outcome: str) -> None:
+        with cls._lock:
+            counters = cls._counters.setdefault(
+                label, {"attempts": 0, "direct": 0, "fenced": 0, "scanned": 0, "failures": 0, "retries": 0})
+            if outcome != 'retries':
+                counters["attempts"] += 1
+            counters[outcome] += 1
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        with cls._lock:
+            counters = {label: dict(values) for label, values in cls._counters.items()}
+        for values in counters.values():
+            values["failure_rate"] = round(values["failures"] / values["attempts"], 4) if values["attempts"] else 0.0
+        return counters
@@ -0,0 +1,161 @@
+"""
+多提供商路由 - 在多个ApiConfig后端之间按观测到的延迟和错误率分配流量，并自动故障转移
+只用于服务器默认配置（环境变量）；用户在前端自带的API配置仍然直连各自的提供商
+"""
+
+import json
+import os
+import random
+import threading
+import logging
+from typing import Dict, Any, List, Optional
+
+from ..config.api_config import ApiConfig, ApiConfigFactory
+from .resilience import ResilienceRegistry, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderBackend:
+    """路由池中的一个后端，记录延迟和错误率的指数加权移动平均"""
+
+    def __init__(self, name: str, config: ApiConfig, alpha: float):
+        self.name = name
+        self.config = config
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return ResilienceRegistry.breaker(self.config.api_base)
+
+    def available(self) -> bool:
+        """熔断器打开且尚未到恢复时间的后端暂不参与路由"""
+        breaker = self.breaker
+        return breaker.state != breaker.OPEN or breaker.retry_in() <= 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.failures += 1
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            # 失败请求的耗时不代表正常延迟，只用成功请求更新延迟
+            if ok:
+                self.latency = latency if self.latency is None else \
+                    self.latency + self.alpha * (latency - self.latency)
+
+    def weight(self, default_latency: float) -> float:
+        """延迟越低、错误率越低，权重越高"""
+        latency = self.latency if self.latency is not None else default_latency
+        return (1.0 - self.error_rate) ** 2 / max(latency, 0.05)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "api_base": self.config.api_base,
+            "model": self.config.model,
+            "latency_ewma": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate_ewma": round(self.error_rate, 4),
+            "requests": self.requests,
+            "failures": self.failures,
+            "available": self.available()
+        }
+
+
+class ProviderRouter:
+    """
+    服务器默认配置的后端池。
+    第一个后端来自DEFAULT_API_BASE等原有环境变量，其余来自LLM_PROVIDER_POOL（JSON数组）
+    """
+
+    _default: Optional['ProviderRouter'] = None
+    _initialized = False
+    _lock = threading.Lock()
+
+    def __init__(self, backends: List[ProviderBackend]):
+        self.backends = backends
+
+    @classmethod
+    def default(cls) -> Optional['ProviderRouter']:
+        """进程级共享的路由器，后端池只有一个后端时返回None"""
+        if not cls._initialized:
+            with cls._lock:
+                if not cls._initialized:
+                    cls._default = cls._load_from_env()
+                    cls._initialized = True
+        return cls._default
+
+    @classmethod
+    def for_config(cls, api_config: ApiConfig) -> Optional['ProviderRouter']:
+        """api_config是服务器默认配置时返回路由器，否则返回None"""
+        router = cls.default()
+        if router is None:
+            return None
+        primary = router.backends[0].config
+        if (api_config.api_base, api_config.api_key, api_config.model) == \
+                (primary.api_base, primary.api_key, primary.model):
+            return router
+        return None
+
+    @classmethod
+    def _load_from_env(cls) -> Optional['ProviderRouter']:
+        # 延迟导入，避免services -> ai_client -> provider_router的循环依赖
+        from ..services.api_provider_service import ApiProviderService
+
+        primary = ApiConfigFactory.get_env_config_safe()
+        raw_pool = os.getenv('LLM_PROVIDER_POOL', '').strip()
+        if primary is None or not raw_pool:
+            return None
+
+        try:
+            entries = json.loads(raw_pool)
+        except json.JSONDecodeError as e:
+            logger.error(f"LLM_PROVIDER_POOL不是有效的JSON，已忽略: {e}")
+            return None
+
+        configs = [primary]
+        for entry in entries:
+            try:
+                configs.append(ApiConfigFactory.from_dict(entry))
+            except (ValueError, AttributeError) as e:
+                logger.error(f"LLM_PROVIDER_POOL中的后端配置无效，已跳过: {e}")
+
+        if len(configs) < 2:
+            return None
+
+        alpha = float(os.getenv('LLM_PROVIDER_EWMA_ALPHA', 0.2))
+        backends = []
+        for index, config in enumerate(configs):
+            provider = ApiProviderService.detect_api_provider(config.api_base)
+            backends.append(ProviderBackend(f"{provider}#{index}", config, alpha))
+        logger.info(f"LLM多提供商路由已启用: {[b.name for b in backends]}")
+        return cls(backends)
+
+    def candidates(self) -> List[ProviderBackend]:
+        """
+        返回本次请求依次尝试的后端：首选后端按权重随机选出，
+        其余按权重从高到低排列作为故障转移顺序，熔断中的后端排在最后
+        """
+        available = [b for b in self.backends if b.available()]
+        unavailable = [b for b in self.backends if not b.available()]
+        if not available:
+            return unavailable
+
+        known = [b.latency for b in available if b.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        weights = {b.name: b.weight(default_latency) for b in available}
+
+        if sum(weights.values()) > 0:
+            first = random.choices(available, weights=[weights[b.name] for b in available])[0]
+        else:
+            first = available[0]
+        rest = sorted((b for b in available if b is not first), key=lambda b: weights[b.name], reverse=True)
+        return [first, *rest, *unavailable]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [backend.snapshot() for backend in self.backends]
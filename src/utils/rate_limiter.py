@@ -0,0 +1,415 @@
+"""
+出站LLM请求限流 - 按API Key划分的令牌桶（每分钟请求数 + 每分钟token数）
+等待的请求按先来先服务排队，避免限流时各个服务各自睡眠重试、集中冲击提供商。
+默认使用本地SQLite文件保存桶和队列，同一台机器上的所有gunicorn worker共享同一份限额
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 排队请求超过该时间没有心跳（进程崩溃等）时从队列中移除
+_STALE_TICKET_SECONDS = 10.0
+# 不是队首时的轮询间隔
+_POLL_INTERVAL = 0.05
+
+
+class RateLimitTimeout(Exception):
+    """在允许的等待时间内没有获得出站配额"""
+
+
+@dataclass
+class RateLimitSettings:
+    """限流配置，rpm/tpm为0表示不限制该维度"""
+
+    rpm: float = 0
+    tpm: float = 0
+    backend: str = 'sqlite'
+    sqlite_path: str = ''
+    max_wait: float = 30.0
+    completion_estimate: int = 512   # 估算token时为回复预留的token数
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    @classmethod
+    def from_env(cls) -> 'RateLimitSettings':
+        def env_float(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, default))
+            except (TypeError, ValueError):
+                return default
+
+        return cls(
+            rpm=env_float('LLM_RATE_LIMIT_RPM', 0),
+            tpm=env_float('LLM_RATE_LIMIT_TPM', 0),
+            backend=os.getenv('LLM_RATE_LIMIT_BACKEND', 'sqlite').strip().lower(),
+            sqlite_path=os.getenv('LLM_RATE_LIMIT_SQLITE_PATH') or os.path.join(
+                tempfile.gettempdir(), 'eg-llm', 'rate_limit.sqlite3'),
+            max_wait=env_float('LLM_RATE_LIMIT_MAX_WAIT', cls.max_wait),
+            completion_estimate=int(env_float('LLM_RATE_LIMIT_COMPLETION_ESTIMATE', cls.completion_estimate))
+        )
+
+
+def estimate_tokens(payload: Dict[str, Any], completion_estimate: int) -> int:
+    """
+    根据载荷大小粗略估算本次请求消耗的token：
+    中英文混合文本大约每2个字符1个token，再加上为回复预留的部分
+    """
+    chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+    completion = min(int(payload.get("max_tokens") or completion_estimate), completion_estimate)
+    return chars // 2 + completion
+
+
+class _Bucket:
+    """令牌桶状态的纯计算逻辑，存储后端负责持久化"""
+
+    @staticmethod
+    def refill(level: float, capacity: float, elapsed: float) -> float:
+        return min(capacity, level + elapsed * capacity / 60.0)
+
+    @staticmethod
+    def wait_time(level: float, need: float, capacity: float) -> float:
+        """桶里的令牌攒够need还需要多久"""
+        if level >= need:
+            return 0.0
+        return (need - level) * 60.0 / capacity
+
+
+class RateLimitStore:
+    """限流状态存储接口：排队号 + 两个令牌桶"""
+
+    name = 'base'
+
+    def enqueue(self, key: str) -> int:
+        raise NotImplementedError
+
+    def poll(self, key: str, ticket: int, tokens: float, settings: RateLimitSettings) -> float:
+        """尝试获取配额，成功返回0并出队，否则返回建议的等待秒数"""
+        raise NotImplementedError
+
+    def cancel(self, ticket: int) -> None:
+        raise NotImplementedError
+
+    def drain(self, key: str) -> None:
+        """提供商返回429时清空请求桶，让所有等待者一起退让"""
+        raise NotImplementedError
+
+    def _take(self, state: Dict[str, float], tokens: float, settings: RateLimitSettings, now: float) -> float:
+        """在state上补充令牌并尝试扣减，返回需要等待的秒数（0表示已扣减）"""
+        elapsed = max(0.0, now - state["updated_at"])
+        state["updated_at"] = now
+        wait = 0.0
+        if settings.rpm > 0:
+            state["requests"] = _Bucket.refill(state["requests"], settings.rpm, elapsed)
+            wait = max(wait, _Bucket.wait_time(state["requests"], 1, settings.rpm))
+        if settings.tpm > 0:
+            state["tokens"] = _Bucket.refill(state["tokens"], settings.tpm, elapsed)
+            wait = max(wait, _Bucket.wait_time(state["tokens"], tokens, settings.tpm))
+        if wait > 0:
+            return wait
+        state["requests"] -= 1
+        state["tokens"] -= tokens
+        return 0.0
+
+    @staticmethod
+    def _initial_state(settings: RateLimitSettings, now: float) -> Dict[str, float]:
+        return {"requests": settings.rpm, "tokens": settings.tpm, "updated_at": now}
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """进程内存储，只在单进程部署时使用"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        self._queues: Dict[str, deque] = {}
+        self._ticket_keys: Dict[int, str] = {}
+        self._next_ticket = 0
+
+    def enqueue(self, key: str) -> int:
+        with self._lock:
+            self._next_ticket += 1
+            ticket = self._next_ticket
+            self._queues.setdefault(key, deque()).append(ticket)
+            self._ticket_keys[ticket] = key
+            return ticket
+
+    def poll(self, key: str, ticket: int, tokens: float, settings: RateLimitSettings) -> float:
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue or queue[0] != ticket:
+                return _POLL_INTERVAL
+            now = time.time()
+            state = self._buckets.setdefault(key, self._initial_state(settings, now))
+            wait = self._take(state, tokens, settings, now)
+            if wait == 0:
+                queue.popleft()
+                self._ticket_keys.pop(ticket, None)
+            return wait
+
+    def cancel(self, ticket: int) -> None:
+        with self._lock:
+            key = self._ticket_keys.pop(ticket, None)
+            if key is not None and ticket in self._queues.get(key, ()):
+                self._queues[key].remove(ticket)
+
+    def drain(self, key: str) -> None:
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is not None:
+                state["requests"] = min(state["requests"], 0)
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """基于本地SQLite文件的存储，同一台机器上的所有worker进程共享桶和队列"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_rate_buckets ("
+            "key TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_rate_queue ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, heartbeat REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_rate_queue_key ON llm_rate_queue(key, id)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, key: str) -> int:
+        cursor = self._connection().execute(
+            "INSERT INTO llm_rate_queue (key, heartbeat) VALUES (?, ?)", (key, time.time()))
+        return cursor.lastrowid
+
+    def poll(self, key: str, ticket: int, tokens: float, settings: RateLimitSettings) -> float:
+        conn = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE 在多个进程之间串行化"检查队首 + 扣减令牌"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM llm_rate_queue WHERE heartbeat < ?", (now - _STALE_TICKET_SECONDS,))
+            updated = conn.execute(
+                "UPDATE llm_rate_queue SET heartbeat = ? WHERE id = ?", (now, ticket)).rowcount
+            if updated == 0:
+                # 自己的排队号被当作过期清理掉了（例如进程长时间停顿），按原排队号重新入队
+                conn.execute(
+                    "INSERT INTO llm_rate_queue (id, key, heartbeat) VALUES (?, ?, ?)", (ticket, key, now))
+            head = conn.execute(
+                "SELECT id FROM llm_rate_queue WHERE key = ? ORDER BY id LIMIT 1", (key,)).fetchone()
+            if head[0] != ticket:
+                conn.execute("COMMIT")
+                return _POLL_INTERVAL
+
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at FROM llm_rate_buckets WHERE key = ?", (key,)).fetchone()
+            state = dict(zip(("requests", "tokens", "updated_at"), row)) if row else \
+                self._initial_state(settings, now)
+            wait = self._take(state, tokens, settings, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_rate_buckets (key, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                (key, state["requests"], state["tokens"], state["updated_at"]))
+            if wait == 0:
+                conn.execute("DELETE FROM llm_rate_queue WHERE id = ?", (ticket,))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def cancel(self, ticket: int) -> None:
+        self._connection().execute("DELETE FROM llm_rate_queue WHERE id = ?", (ticket,))
+
+    def drain(self, key: str) -> None:
+        self._connection().execute(
+            "UPDATE llm_rate_buckets SET requests = MIN(requests, 0), updated_at = ? WHERE key = ?",
+            (time.time(), key))
+
+
+class RateLimiter:
+    """进程级共享的出站限流器"""
+
+    _settings: Optional[RateLimitSettings] = None
+    _store: Optional[RateLimitStore] = None
+    _lock = threading.Lock()
+    _counters = {"acquired": 0, "waited": 0, "timeouts": 0, "store_errors": 0, "wait_seconds": 0.0}
+
+    @classmethod
+    def settings(cls) -> RateLimitSettings:
+        if cls._settings is None:
+            cls._settings = RateLimitSettings.from_env()
+        return cls._settings
+
+    @classmethod
+    def store(cls) -> RateLimitStore:
+        if cls._store is None:
+            with cls._lock:
+                if cls._store is None:
+                    settings = cls.settings()
+                    if settings.backend == 'memory':
+                        cls._store = MemoryRateLimitStore()
+                    else:
+                        cls._store = SQLiteRateLimitStore(settings.sqlite_path)
+                    logger.info(f"LLM出站限流已启用，后端: {cls._store.name}")
+        return cls._store
+
+    @staticmethod
+    def key_for(api_key: str) -> str:
+        """限流按API Key划分，存储中只保存它的哈希"""
+        return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def _prepare(cls, api_key: str, payload: Dict[str, Any]):
+        settings = cls.settings()
+        tokens = estimate_tokens(payload, settings.completion_estimate)
+        if settings.tpm > 0:
+            # 单个请求估算值超过桶容量时按容量计算，否则永远拿不到配额
+            tokens = min(tokens, settings.tpm)
+        return settings, cls.key_for(api_key), tokens
+
+    @classmethod
+    def _record(cls, name: str, waited: float = 0.0) -> None:
+        with cls._lock:
+            cls._counters[name] += 1
+            if waited > _POLL_INTERVAL:
+                cls._counters["waited"] += 1
+                cls._counters["wait_seconds"] += waited
+
+    @classmethod
+    def _fail_open(cls, error: Exception, started: float) -> float:
+        """限流存储出错（如SQLite被锁）时放行请求，限流只是保护手段，不能让它导致LLM调用失败"""
+        logger.warning(f"限流存储出错，本次请求不限流: {error}")
+        cls._record("store_errors")
+        return time.monotonic() - started
+
+    @staticmethod
+    def _cancel(store: RateLimitStore, ticket: int) -> None:
+        try:
+            store.cancel(ticket)
+        except Exception as e:
+            logger.warning(f"释放限流排队位置失败: {e}")
+
+    @classmethod
+    def acquire(cls, api_key: str, payload: Dict[str, Any], max_wait: Optional[float] = None) -> float:
+        """
+        阻塞直到获得一次请求的配额，返回等待的秒数
+
+        Raises:
+            RateLimitTimeout: 超过max_wait（默认LLM_RATE_LIMIT_MAX_WAIT）仍未获得配额；
+                存储本身出错时不抛出，直接放行并计入store_errors
+        """
+        settings = cls.settings()
+        if not settings.enabled:
+            return 0.0
+        settings, key, tokens = cls._prepare(api_key, payload)
+        max_wait = settings.max_wait if max_wait is None else min(max_wait, settings.max_wait)
+
+        started = time.monotonic()
+        store, ticket = None, None
+        try:
+            store = cls.store()
+            ticket = store.enqueue(key)
+            while True:
+                wait = store.poll(key, ticket, tokens, settings)
+                waited = time.monotonic() - started
+                if wait == 0:
+                    cls._record("acquired", waited)
+                    return waited
+                if waited + min(wait, _POLL_INTERVAL) > max_wait:
+                    cls._record("timeouts")
+                    raise RateLimitTimeout(f"等待LLM出站配额超过 {max_wait:.0f} 秒")
+                time.sleep(min(wait, 0.25))
+        except RateLimitTimeout:
+            raise
+        except Exception as e:
+            return cls._fail_open(e, started)
+        finally:
+            if ticket is not None:
+                cls._cancel(store, ticket)
+
+    @classmethod
+    async def acquire_async(cls, api_key: str, payload: Dict[str, Any], max_wait: Optional[float] = None) -> float:
+        """acquire的异步版本，等待期间不阻塞事件循环"""
+        settings = cls.settings()
+        if not settings.enabled:
+            return 0.0
+        settings, key, tokens = cls._prepare(api_key, payload)
+        max_wait = settings.max_wait if max_wait is None else min(max_wait, settings.max_wait)
+
+        started = time.monotonic()
+        store, ticket = None, None
+        try:
+            store = cls.store()
+            ticket = await asyncio.to_thread(store.enqueue, key)
+            while True:
+                wait = await asyncio.to_thread(store.poll, key, ticket, tokens, settings)
+                waited = time.monotonic() - started
+                if wait == 0:
+                    cls._record("acquired", waited)
+                    return waited
+                if waited + min(wait, _POLL_INTERVAL) > max_wait:
+                    cls._record("timeouts")
+                    raise RateLimitTimeout(f"等待LLM出站配额超过 {max_wait:.0f} 秒")
+                await asyncio.sleep(min(wait, 0.25))
+        except RateLimitTimeout:
+            raise
+        except Exception as e:
+            return cls._fail_open(e, started)
+        finally:
+            if ticket is not None:
+                await asyncio.to_thread(cls._cancel, store, ticket)
+
+    @classmethod
+    def drain(cls, api_key: str) -> None:
+        """提供商返回429时调用，让共享该Key的所有请求一起退让"""
+        if not cls.settings().enabled:
+            return
+        try:
+            cls.store().drain(cls.key_for(api_key))
+        except Exception as e:
+            logger.warning(f"更新限流状态失败: {e}")
+
+    @classmethod
+    async def drain_async(cls, api_key: str) -> None:
+        """drain的异步版本，共享存储的写入在线程中执行，不阻塞事件循环"""
+        if not cls.settings().enabled:
+            return
+        await asyncio.to_thread(cls.drain, api_key)
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        settings = cls.settings()
+        with cls._lock:
+            counters = dict(cls._counters)
+        counters["wait_seconds"] = round(counters["wait_seconds"], 3)
+        return {
+            "enabled": settings.enabled,
+            "backend": settings.backend if settings.enabled else None,
+            "rpm": settings.rpm,
+            "tpm": settings.tpm,
+            **counters
+        }
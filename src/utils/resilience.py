@@ -0,0 +1,261 @@
+"""
+LLM调用弹性策略 - 熔断器、带抖动的指数退避、Retry-After解析和全局重试预算
+所有LLM请求（同步和异步）共享同一套熔断器和重试预算
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# 这些状态码说明服务端暂时不可用，可以重试
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, provider: str, retry_in: float):
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(f"LLM服务 {provider} 暂时不可用（熔断中），请在 {retry_in:.0f} 秒后重试")
+
+
+@dataclass
+class ResilienceSettings:
+    """弹性策略配置"""
+
+    failure_threshold: int = 5          # 连续失败多少次后打开熔断器
+    recovery_timeout: float = 30.0      # 熔断器打开后多久进入半开状态
+    half_open_max_calls: int = 1        # 半开状态下允许的探测请求数
+    base_delay: float = 0.5             # 指数退避的初始延迟
+    max_delay: float = 8.0              # 单次退避的最大延迟
+    max_retry_after: float = 30.0       # 超过该值的Retry-After不再等待，直接失败
+    retry_budget_ratio: float = 0.2     # 每个请求为重试预算存入的令牌数
+    retry_budget_min_per_second: float = 1.0  # 低流量时每秒至少允许的重试次数
+
+    @classmethod
+    def from_env(cls) -> 'ResilienceSettings':
+        def env_float(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, default))
+            except (TypeError, ValueError):
+                return default
+
+        return cls(
+            failure_threshold=int(env_float('LLM_BREAKER_FAILURE_THRESHOLD', cls.failure_threshold)),
+            recovery_timeout=env_float('LLM_BREAKER_RECOVERY_SECONDS', cls.recovery_timeout),
+            half_open_max_calls=int(env_float('LLM_BREAKER_HALF_OPEN_CALLS', cls.half_open_max_calls)),
+            base_delay=env_float('LLM_RETRY_BASE_DELAY', cls.base_delay),
+            max_delay=env_float('LLM_RETRY_MAX_DELAY', cls.max_delay),
+            max_retry_after=env_float('LLM_RETRY_AFTER_MAX', cls.max_retry_after),
+            retry_budget_ratio=env_float('LLM_RETRY_BUDGET_RATIO', cls.retry_budget_ratio),
+            retry_budget_min_per_second=env_float('LLM_RETRY_BUDGET_MIN_PER_SECOND', cls.retry_budget_min_per_second)
+        )
+
+
+class CircuitBreaker:
+    """单个LLM提供商的熔断器：closed -> open -> half_open -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, settings: ResilienceSettings):
+        self.name = name
+        self.settings = settings
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """判断是否放行请求；打开状态超时后放行有限的探测请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.settings.recovery_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.half_open_in_flight = 0
+                logger.info(f"熔断器 {self.name} 进入半开状态，开始探测")
+
+            if self.half_open_in_flight < self.settings.half_open_max_calls:
+                self.half_open_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.settings.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"熔断器 {self.name} 探测成功，恢复关闭状态")
+            self.state = self.CLOSED
+            self.half_open_in_flight = 0
+
+    def record_throttled(self) -> None:
+        """请求被限流：释放半开探测名额，但不改变失败计数"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.half_open_in_flight > 0:
+                self.half_open_in_flight -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.settings.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        f"熔断器 {self.name} 打开（连续失败 {self.consecutive_failures} 次）")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.half_open_in_flight = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = self.retry_in()
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "rejected": self.rejected,
+                "retry_in_seconds": round(retry_in, 1)
+            }
+
+
+class RetryBudget:
+    """
+    全局重试预算：每个请求存入固定比例的令牌，每次重试消耗一个令牌，
+    故障期间重试流量最多放大到正常流量的(1 + ratio)倍
+    """
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max(10.0, min_per_second * 10)
+        self.tokens = self.max_tokens
+        self.last_refill = time.monotonic()
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.last_refill) * self.min_per_second)
+        self.last_refill = now
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._refill()
+            self.requests += 1
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            return {
+                "tokens": round(self.tokens, 2),
+                "requests": self.requests,
+                "retries": self.retries,
+                "exhausted": self.exhausted
+            }
+
+
+def backoff_delay(attempt: int, settings: ResilienceSettings) -> float:
+    """带完全抖动的指数退避（attempt从0开始）"""
+    ceiling = min(settings.max_delay, settings.base_delay * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilienceRegistry:
+    """进程级共享的熔断器和重试预算"""
+
+    _settings: Optional[ResilienceSettings] = None
+    _breakers: Dict[str, CircuitBreaker] = {}
+    _budget: Optional[RetryBudget] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def settings(cls) -> ResilienceSettings:
+        if cls._settings is None:
+            cls._settings = ResilienceSettings.from_env()
+        return cls._settings
+
+    @classmethod
+    def breaker(cls, provider: str) -> CircuitBreaker:
+        key = (provider or '').rstrip('/')
+        breaker = cls._breakers.get(key)
+        if breaker is None:
+            with cls._lock:
+                breaker = cls._breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(key, cls.settings())
+                    cls._breakers[key] = breaker
+        return breaker
+
+    @classmethod
+    def retry_budget(cls) -> RetryBudget:
+        if cls._budget is None:
+            with cls._lock:
+                if cls._budget is None:
+                    settings = cls.settings()
+                    cls._budget = RetryBudget(
+                        settings.retry_budget_ratio, settings.retry_budget_min_per_second)
+        return cls._budget
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        """熔断器和重试预算的当前状态（供诊断接口使用）"""
+        return {
+            "breakers": {name: breaker.snapshot() for name, breaker in list(cls._breakers.items())},
+            "retry_budget": cls.retry_budget().snapshot()
+        }
@@ -0,0 +1,296 @@
+"""
+确定性LLM响应缓存 - 用于低温度、固定系统提示的辅助调用
+（语法纠错、CET4优化、中文翻译、单词查询）
+
+缓存键 = 模型 + 系统提示指纹 + 规范化后的用户输入 + 影响输出的请求参数
+支持三种后端：进程内内存、多个gunicorn worker共享的SQLite文件、Redis协议存储
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """缓存后端接口"""
+
+    name = 'base'
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内LRU缓存，带TTL"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._data)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """基于本地SQLite文件的缓存，同一台机器上的所有worker进程共享"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_access "
+            "ON llm_response_cache(last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE llm_response_cache SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_response_cache (key, value, expires_at, last_access) "
+            "VALUES (?, ?, ?, ?)", (key, value, now + ttl, now))
+        self._writes += 1
+        # 每隔一批写入做一次过期清理和LRU淘汰，避免每次写入都扫描全表
+        if self._writes % 100 == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM llm_response_cache WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM llm_response_cache WHERE key IN ("
+            "SELECT key FROM llm_response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM llm_response_cache")
+
+    def size(self) -> Optional[int]:
+        return self._connection().execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis协议存储（Redis/KeyDB/Valkey等），LRU淘汰由服务端maxmemory-policy负责"""
+
+    name = 'redis'
+
+    def __init__(self, url: str, prefix: str = 'llm-cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("使用redis缓存后端需要安装redis包: pip install redis")
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """带命中统计的响应缓存，后端异常不会影响正常请求"""
+
+    def __init__(self, backend: CacheBackend, ttl: int = 86400):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "sets": 0, "errors": 0}
+
+    @staticmethod
+    def normalize_input(text: str) -> str:
+        """规范化用户输入：去掉首尾空白并合并连续空白"""
+        return re.sub(r'\s+', ' ', text or '').strip()
+
+    @classmethod
+    def make_key(cls, model: str, system_prompt: str, user_input: str, params: Dict[str, Any] = None) -> str:
+        """根据模型、系统提示指纹、规范化输入和请求参数生成缓存键"""
+        prompt_fingerprint = hashlib.sha256((system_prompt or '').encode('utf-8')).hexdigest()
+        material = json.dumps({
+            "model": model,
+            "prompt": prompt_fingerprint,
+            "input": cls.normalize_input(user_input),
+            "params": params or {}
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"读取LLM响应缓存失败: {e}")
+            self._count("errors")
+            return None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        try:
+            self.backend.set(key, value, ttl or self.ttl)
+            self._count("sets")
+        except Exception as e:
+            logger.warning(f"写入LLM响应缓存失败: {e}")
+            self._count("errors")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"删除LLM响应缓存失败: {e}")
+            self._count("errors")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回当前进程的命中统计"""
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": self.backend.name,
+            "ttl": self.ttl,
+            "size": size,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            **counters
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_initialized = False
+_response_cache_lock = threading.Lock()
+
+
+def _build_backend_from_env() -> Optional[CacheBackend]:
+    backend_name = os.getenv('LLM_CACHE_BACKEND', 'memory').strip().lower()
+    max_entries = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+
+    if backend_name in ('', 'none', 'off', 'disabled'):
+        return None
+    if backend_name == 'sqlite':
+        path = os.getenv('LLM_CACHE_SQLITE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'eg-llm', 'response_cache.sqlite3')
+        return SQLiteCacheBackend(path, max_entries=max_entries)
+    if backend_name == 'redis':
+        return RedisCacheBackend(os.getenv('LLM_CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    if backend_name != 'memory':
+        logger.warning(f"未知的LLM_CACHE_BACKEND: {backend_name}，使用内存缓存")
+    return MemoryCacheBackend(max_entries=max_entries)
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取进程级共享的响应缓存，未启用时返回None"""
+    global _response_cache, _response_cache_initialized
+    if _response_cache_initialized:
+        return _response_cache
+
+    with _response_cache_lock:
+        if not _response_cache_initialized:
+            try:
+                backend = _build_backend_from_env()
+            except Exception as e:
+                logger.error(f"初始化LLM响应缓存失败，缓存已禁用: {e}")
+                backend = None
+            if backend is not None:
+                _response_cache = ResponseCache(backend, ttl=int(os.getenv('LLM_CACHE_TTL', 86400)))
+                logger.info(f"LLM响应缓存已启用，后端: {backend.name}")
+            _response_cache_initialized = True
+        return _response_cache
@@ -0,0 +1,126 @@
+"""
+请求合并（singleflight）- 相同的LLM请求同时在途时只向上游发送一次，结果分发给所有等待者
+键由模型、系统提示指纹和规范化输入组成（与响应缓存相同），缓存处理已完成的重复请求，
+这里处理尚未完成的重复请求；按模型统计节省的上游调用次数
+"""
+
+import asyncio
+import threading
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .deadline import current_deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class _InFlightCall:
+    """一次在途的上游调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """同步和异步请求共用的合并注册表和统计"""
+
+    _calls: Dict[str, _InFlightCall] = {}
+    _async_calls: Dict[Any, asyncio.Future] = {}
+    _counters: Dict[str, Dict[str, int]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _record(cls, metric_key: str, outcome: str) -> None:
+        with cls._lock:
+            counters = cls._counters.setdefault(metric_key, {"upstream_calls": 0, "coalesced": 0})
+            counters[outcome] += 1
+
+    @classmethod
+    def do(cls, key: str, fn: Callable[[], Any], metric_key: str = 'default') -> Any:
+        """
+        执行fn；相同key的调用在途时等待它的结果而不是重复执行。
+        等待者的截止时间先到时抛出DeadlineExceeded；上游调用因发起者自己的截止时间失败时，
+        等待者改为自行发起请求
+        """
+        with cls._lock:
+            call = cls._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                cls._calls[key] = call
+
+        if leader:
+            cls._record(metric_key, "upstream_calls")
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with cls._lock:
+                    cls._calls.pop(key, None)
+                call.event.set()
+
+        cls._record(metric_key, "coalesced")
+        deadline = current_deadline()
+        if not call.event.wait(timeout=deadline.remaining() if deadline else None):
+            raise DeadlineExceeded("等待合并的LLM请求时超过了时间预算")
+        if isinstance(call.error, DeadlineExceeded):
+            return fn()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    @classmethod
+    async def do_async(cls, key: str, fn: Callable[[], Awaitable[Any]], metric_key: str = 'default') -> Any:
+        """do的异步版本，在途调用按事件循环区分"""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        future = cls._async_calls.get(loop_key)
+
+        if future is None:
+            future = loop.create_future()
+            # 没有等待者时异常不会被读取，避免"exception was never retrieved"警告
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            cls._async_calls[loop_key] = future
+            cls._record(metric_key, "upstream_calls")
+            try:
+                result = await fn()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                cls._async_calls.pop(loop_key, None)
+
+        cls._record(metric_key, "coalesced")
+        deadline = current_deadline()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=deadline.remaining() if deadline else None)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("等待合并的LLM请求时超过了时间预算")
+        except DeadlineExceeded:
+            # 发起者因自己的截止时间失败，等待者自行发起请求
+            return await fn()
+        except asyncio.CancelledError:
+            # 只有发起者被取消时才自行发起请求，等待者自身被取消时照常传播
+            if not future.cancelled():
+                raise
+            return await fn()
+        return result
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        """各模型的上游调用数和被合并的请求数（供诊断接口使用）"""
+        with cls._lock:
+            counters = {key: dict(values) for key, values in cls._counters.items()}
+            in_flight = len(cls._calls) + len(cls._async_calls)
+        total_saved = sum(values["coalesced"] for values in counters.values())
+        return {"in_flight": in_flight, "calls_saved": total_saved, "by_model": counters}
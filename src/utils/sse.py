@@ -0,0 +1,78 @@
+"""
+Server-Sent Events工具 - 事件格式化和双语回复的流式拆分
+"""
+
+import json
+from typing import Any, List, Tuple
+
+# 双语回复中英文正文与中文翻译之间的分隔符
+TRANSLATION_SEPARATOR = '|||'
+
+
+def format_sse(event: str, data: Any) -> str:
+    """将数据格式化为一条SSE消息"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class BilingualStreamSplitter:
+    """
+    把流式返回的 "英文回复 ||| 中文翻译" 拆分为content和translation两个字段
+
+    分隔符可能被拆散在多个增量片段中，因此末尾可能构成分隔符前缀的字符
+    会先暂存，直到能够确定它们属于哪一部分。
+    """
+
+    def __init__(self, separator: str = TRANSLATION_SEPARATOR):
+        self.separator = separator
+        self.field = 'content'
+        self._pending = ''
+        self._content_started = False
+        self._translation_started = False
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        """输入一个增量片段，返回可以立即发送的 (字段, 文本) 列表"""
+        self._pending += delta
+        parts: List[Tuple[str, str]] = []
+
+        if self.field == 'content':
+            index = self._pending.find(self.separator)
+            if index == -1:
+                keep = self._partial_separator_length(self._pending)
+                ready = self._pending[:len(self._pending) - keep]
+                self._pending = self._pending[len(ready):]
+                self._append(parts, 'content', ready)
+                return parts
+
+            self._append(parts, 'content', self._pending[:index].rstrip())
+            self._pending = self._pending[index + len(self.separator):]
+            self.field = 'translation'
+
+        ready, self._pending = self._pending, ''
+        self._append(parts, 'translation', ready)
+        return parts
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """流结束时输出剩余的暂存文本"""
+        parts: List[Tuple[str, str]] = []
+        ready, self._pending = self._pending, ''
+        self._append(parts, self.field, ready)
+        return parts
+
+    def _append(self, parts: List[Tuple[str, str]], field: str, text: str) -> None:
+        # 去掉各部分开头的空白（例如分隔符后面的空格）
+        if field == 'content' and not self._content_started:
+            text = text.lstrip()
+            self._content_started = bool(text)
+        elif field == 'translation' and not self._translation_started:
+            text = text.lstrip()
+            self._translation_started = bool(text)
+        if text:
+            parts.append((field, text))
+
+    def _partial_separator_length(self, text: str) -> int:
+        """返回文本末尾与分隔符前缀重合的长度"""
+        for length in range(min(len(self.separator) - 1, len(text)), 0, -1):
+            if text.endswith(self.separator[:length]):
+                return length
+        return 0
@@ -0,0 +1,88 @@
+"""
+查询次数回归测试：每轮聊天只加载一次会话历史
+在内存SQLite上运行真实的ChatService，LLM调用替换为固定回复，统计发往message表的历史查询
+"""
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from src.models import db
+from src.models.user import User
+from src.models.conversation import Conversation
+from src.config.api_config import ApiConfig
+from src.services.chat_service import ChatService
+from src.services.translation_client import TranslationClient
+
+
+def _is_history_load(statement: str) -> bool:
+    """按会话读取消息列表的查询（区别于按ID读取单条消息）"""
+    sql = " ".join(statement.split()).lower()
+    return sql.startswith("select") and "from message" in sql \
+        and "message.conversation_id =" in sql and "order by" in sql
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def conversation_id(app):
+    user = User(username='tester', email='tester@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    conversation = Conversation(user_id=user.id, title='History queries')
+    db.session.add(conversation)
+    db.session.commit()
+    return conversation.id
+
+
+@pytest.fixture
+def chat_service(monkeypatch):
+    monkeypatch.setattr(ChatService, '_send_chat_request',
+                        lambda self, messages, system_prompt: "Nice to meet you.|||很高兴认识你。")
+    monkeypatch.setattr(TranslationClient, 'process_user_input',
+                        lambda self, user_message, history=None: (user_message, None, None))
+    return ChatService(ApiConfig(api_base='https://llm.example.com/v1', api_key='test-key', model='test-model'))
+
+
+@pytest.fixture
+def history_loads():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if _is_history_load(statement):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_process_chat_message_loads_history_once_per_turn(app, conversation_id, chat_service, history_loads):
+    user = User.query.first()
+    for turn in range(1, 4):
+        before = len(history_loads)
+        result = chat_service.process_chat_message(user.id, f"Hello number {turn}", conversation_id)
+        assert result["conversation_id"] == conversation_id
+        assert len(history_loads) - before == 1
+
+
+def test_prepare_turn_returns_history_before_the_new_message(app, conversation_id, chat_service, history_loads):
+    user = User.query.first()
+    chat_service.process_chat_message(user.id, "First message", conversation_id)
+
+    turn = ChatService._prepare_turn(user.id, "Second message", conversation_id, 'free_chat', None)
+
+    assert len(history_loads) == 2
+    assert [msg["role"] for msg in turn["history"]] == ["user", "assistant"]
+    assert turn["history"][0]["content"] == "First message"
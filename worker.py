@@ -0,0 +1,133 @@
+"""
+后台任务worker - 从数据库任务队列中领取并执行任务
+用法（在项目根目录执行）: python -m worker [--types chat_feedback,...] [--concurrency 4]
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import logging
+
+from main import app
+from src.models import db
+from src.services.job_queue import JobQueue, JobRegistry
+from src.utils.idempotency import IdempotencyStore
+import src.services.job_handlers  # noqa: F401  注册任务处理函数
+
+logger = logging.getLogger('worker')
+
+# 没有可执行任务时的轮询间隔（秒）
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+# 已完成/已失败任务的保留时间（小时）
+JOB_RETENTION_HOURS = float(os.environ.get('JOB_RETENTION_HOURS', 24))
+# 清理过期任务的间隔（秒）
+JOB_MAINTENANCE_INTERVAL = 60
+
+
+class Worker:
+    """多个执行线程各自循环领取任务，进程收到SIGTERM/SIGINT后处理完当前任务再退出"""
+
+    def __init__(self, job_types, concurrency: int):
+        self.job_types = job_types
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        threads = [
+            threading.Thread(target=self._loop, args=(f"{self.worker_id}:{i}",), name=f'job-worker-{i}')
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info(f"Worker {self.worker_id} started with {self.concurrency} threads, job types: {self.job_types}")
+
+        last_maintenance = 0.0
+        while not self.stop_event.is_set():
+            if time.monotonic() - last_maintenance >= JOB_MAINTENANCE_INTERVAL:
+                self._maintenance()
+                last_maintenance = time.monotonic()
+            self.stop_event.wait(1.0)
+
+        for thread in threads:
+            thread.join()
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def stop(self, *_) -> None:
+        logger.info("Shutdown requested, finishing in-flight jobs...")
+        self.stop_event.set()
+
+    def _loop(self, thread_id: str) -> None:
+        while not self.stop_event.is_set():
+            with app.app_context():
+                try:
+                    job = JobQueue.claim(thread_id, self.job_types)
+                except Exception as e:
+                    logger.error(f"Failed to claim job: {e}")
+                    db.session.rollback()
+                    job = None
+
+                if job is None:
+                    db.session.remove()
+                    self.stop_event.wait(JOB_POLL_INTERVAL)
+                    continue
+
+                self._execute(job, thread_id)
+                db.session.remove()
+
+    @staticmethod
+    def _execute(job, worker_id: str) -> None:
+        job_id, job_type = job.id, job.job_type
+        spec = JobRegistry.get(job_type)
+        started = time.monotonic()
+        try:
+            spec.handler(job)
+        except Exception as e:
+            db.session.rollback()
+            JobQueue.fail(job_id, str(e), worker_id)
+            return
+        if not JobQueue.complete(job_id, worker_id):
+            return
+        logger.info(f"Job {job_id} ({job_type}) done in {time.monotonic() - started:.2f}s")
+
+    @staticmethod
+    def _maintenance() -> None:
+        with app.app_context():
+            try:
+                reaped = JobQueue.reap_expired()
+                purged = JobQueue.purge_finished(JOB_RETENTION_HOURS)
+                expired_keys = IdempotencyStore.purge_expired()
+                if reaped or purged or expired_keys:
+                    logger.info(f"Maintenance: {reaped} expired jobs failed, {purged} finished jobs purged, "
+                                f"{expired_keys} idempotency records expired")
+            except Exception as e:
+                logger.error(f"Job maintenance failed: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台任务worker")
+    parser.add_argument('--types', default=os.environ.get('JOB_WORKER_TYPES', ''),
+                        help='只处理指定的任务类型（逗号分隔），默认处理所有已注册的类型')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('JOB_WORKER_CONCURRENCY', 4)),
+                        help='执行线程数')
+    args = parser.parse_args()
+
+    job_types = [t.strip() for t in args.types.split(',') if t.strip()] or JobRegistry.job_types()
+    unknown = [t for t in job_types if JobRegistry.get(t) is None]
+    if unknown:
+        parser.error(f"未注册的任务类型: {', '.join(unknown)}")
+
+    worker = Worker(job_types, max(1, args.concurrency))
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()